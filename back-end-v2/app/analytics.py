@@ -0,0 +1,321 @@
+"""
+Agrégats de l'historique d'exécution (analytics)
+Les rollups horaires et journaliers sont mis à jour à l'écriture de l'historique,
+les requêtes d'analyse ne parcourent jamais prompt_execution_history
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import os
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Précision relative des percentiles de durée (1 % par défaut)
+LATENCY_SKETCH_ACCURACY = float(os.getenv("LATENCY_SKETCH_ACCURACY", "0.01"))
+
+GRANULARITIES = ("hour", "day")
+
+
+def bucket_start(created_at: datetime, granularity: str) -> datetime:
+    """Début de la période horaire ou journalière contenant `created_at`"""
+    if granularity == "hour":
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class LatencySketch:
+    """
+    Sketch de quantiles à précision relative (type DDSketch)
+
+    Chaque durée est rangée dans un seau logarithmique ; deux sketches se
+    fusionnent en additionnant leurs compteurs, ce qui permet de combiner des
+    rollups horaires en percentiles journaliers ou par prompt.
+    """
+
+    MIN_VALUE = 1e-4  # Durées inférieures (secondes) comptées comme nulles
+    ZERO_KEY = "zero"
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None, accuracy: float = LATENCY_SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        counts = dict(counts or {})
+        self.zero_count = counts.pop(self.ZERO_KEY, 0)
+        self.counts: Dict[int, int] = {int(k): v for k, v in counts.items()}
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def merge(self, other: "LatencySketch") -> None:
+        self.zero_count += other.zero_count
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.zero_count + sum(self.counts.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                # Milieu (en erreur relative) du seau ]gamma^(i-1), gamma^i]
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    def to_json(self) -> Dict[str, int]:
+        counts = {str(k): v for k, v in self.counts.items()}
+        if self.zero_count:
+            counts[self.ZERO_KEY] = self.zero_count
+        return counts
+
+
+@dataclass
+class RollupDelta:
+    """Contribution d'un lot d'exécutions à une ligne de rollup"""
+    executions: int = 0
+    errors: int = 0
+    cached: int = 0
+    tokens_used: int = 0
+    cost: float = 0.0
+    execution_time: float = 0.0
+    sketch: LatencySketch = field(default_factory=LatencySketch)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.executions += 1
+        self.errors += row["status"] == "error"
+        self.cached += bool(row.get("cached"))
+        self.tokens_used += row.get("tokens_used") or 0
+        self.cost += row.get("cost") or 0.0
+        self.execution_time += row.get("execution_time") or 0.0
+        self.sketch.add(row.get("execution_time") or 0.0)
+
+    def merge(self, other: "RollupDelta") -> None:
+        self.executions += other.executions
+        self.errors += other.errors
+        self.cached += other.cached
+        self.tokens_used += other.tokens_used
+        self.cost += other.cost
+        self.execution_time += other.execution_time
+        self.sketch.merge(other.sketch)
+
+    @classmethod
+    def from_rollup(cls, rollup: models.ExecutionRollup) -> "RollupDelta":
+        return cls(
+            executions=rollup.executions,
+            errors=rollup.errors,
+            cached=rollup.cached,
+            tokens_used=rollup.tokens_used,
+            cost=rollup.cost,
+            execution_time=rollup.execution_time,
+            sketch=LatencySketch(rollup.latency_sketch)
+        )
+
+
+RollupKey = Tuple[str, datetime, int, int, str, str]
+
+
+def aggregate(rows: Iterable[Dict[str, Any]]) -> Dict[RollupKey, RollupDelta]:
+    """Regrouper des lignes d'historique terminées par période, utilisateur, prompt et modèle"""
+    deltas: Dict[RollupKey, RollupDelta] = {}
+    for row in rows:
+        if row["status"] == "pending":
+            continue
+        for granularity in GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(row["created_at"], granularity),
+                row["user_id"],
+                row["prompt_id"],
+                row["llm_provider"],
+                row["llm_model"]
+            )
+            deltas.setdefault(key, RollupDelta()).add(row)
+    return deltas
+
+
+_KEY_COLUMNS = (
+    models.ExecutionRollup.granularity,
+    models.ExecutionRollup.bucket_start,
+    models.ExecutionRollup.user_id,
+    models.ExecutionRollup.prompt_id,
+    models.ExecutionRollup.llm_provider,
+    models.ExecutionRollup.llm_model,
+)
+
+
+async def record_rollups(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """
+    Ajouter des exécutions aux rollups, dans la transaction de l'appelant
+
+    Les lignes existantes sont verrouillées (FOR UPDATE sous PostgreSQL) puis
+    fusionnées ; une clé créée en parallèle par un autre processus fait échouer
+    la transaction, que l'appelant rejoue.
+    """
+    deltas = aggregate(rows)
+    if not deltas:
+        return
+
+    existing = {
+        (r.granularity, r.bucket_start, r.user_id, r.prompt_id, r.llm_provider, r.llm_model): r
+        for r in (await db.scalars(
+            select(models.ExecutionRollup)
+            .where(tuple_(*_KEY_COLUMNS).in_(list(deltas)))
+            .with_for_update()
+        )).all()
+    }
+
+    for key, delta in deltas.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            granularity, start, user_id, prompt_id, llm_provider, llm_model = key
+            db.add(models.ExecutionRollup(
+                granularity=granularity,
+                bucket_start=start,
+                user_id=user_id,
+                prompt_id=prompt_id,
+                llm_provider=llm_provider,
+                llm_model=llm_model,
+                executions=delta.executions,
+                errors=delta.errors,
+                cached=delta.cached,
+                tokens_used=delta.tokens_used,
+                cost=delta.cost,
+                execution_time=delta.execution_time,
+                latency_sketch=delta.sketch.to_json()
+            ))
+            continue
+
+        merged = RollupDelta.from_rollup(rollup)
+        merged.merge(delta)
+        rollup.executions = merged.executions
+        rollup.errors = merged.errors
+        rollup.cached = merged.cached
+        rollup.tokens_used = merged.tokens_used
+        rollup.cost = merged.cost
+        rollup.execution_time = merged.execution_time
+        # Nouveau dict : la colonne JSON n'est pas suivie en profondeur
+        rollup.latency_sketch = merged.sketch.to_json()
+
+
+GROUP_BY_FIELDS = {
+    "period": "bucket_start",
+    "user": "user_id",
+    "prompt": "prompt_id",
+    "provider": "llm_provider",
+    "model": "llm_model",
+}
+
+
+async def query_rollups(
+    db: AsyncSession,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    group_by: List[str],
+    user_id: Optional[int] = None,
+    prompt_id: Optional[int] = None,
+    llm_provider: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Agréger les rollups de la période [start, end) selon `group_by`
+
+    Seules les lignes de rollup sont lues ; les sketches sont fusionnés par
+    groupe pour calculer les percentiles de durée.
+    """
+    rollup = models.ExecutionRollup
+    query = select(rollup).where(
+        rollup.granularity == granularity,
+        rollup.bucket_start >= bucket_start(start, granularity),
+        rollup.bucket_start < end
+    )
+    if user_id is not None:
+        query = query.where(rollup.user_id == user_id)
+    if prompt_id is not None:
+        query = query.where(rollup.prompt_id == prompt_id)
+    if llm_provider is not None:
+        query = query.where(rollup.llm_provider == llm_provider)
+
+    groups: Dict[tuple, RollupDelta] = {}
+    for row in (await db.scalars(query)).all():
+        key = tuple(getattr(row, GROUP_BY_FIELDS[name]) for name in group_by)
+        groups.setdefault(key, RollupDelta()).merge(RollupDelta.from_rollup(row))
+
+    results = []
+    for key in sorted(groups):
+        delta = groups[key]
+        results.append({
+            **{GROUP_BY_FIELDS[name]: value for name, value in zip(group_by, key)},
+            "executions": delta.executions,
+            "errors": delta.errors,
+            "cached": delta.cached,
+            "tokens_used": delta.tokens_used,
+            "cost": round(delta.cost, 6),
+            "avg_execution_time": delta.execution_time / delta.executions if delta.executions else 0.0,
+            "p50_execution_time": delta.sketch.quantile(0.5),
+            "p95_execution_time": delta.sketch.quantile(0.95),
+            "p99_execution_time": delta.sketch.quantile(0.99),
+        })
+    return results
+
+
+async def rebuild_rollups(chunk_size: int = 10000) -> int:
+    """
+    Recalculer tous les rollups depuis prompt_execution_history
+
+    Pour l'initialisation sur un historique existant ; à lancer application
+    arrêtée, les écritures concurrentes n'étant pas prises en compte.
+    """
+    from .database import AsyncSessionLocal
+
+    history = models.PromptExecutionHistory
+    columns = (
+        history.created_at, history.user_id, history.prompt_id, history.llm_provider,
+        history.llm_model, history.status, history.cached, history.tokens_used,
+        history.cost, history.execution_time
+    )
+    deltas: Dict[RollupKey, RollupDelta] = {}
+    total = 0
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(select(*columns).execution_options(yield_per=chunk_size))
+        async for chunk in result.partitions(chunk_size):
+            for key, delta in aggregate(row._asdict() for row in chunk).items():
+                deltas.setdefault(key, RollupDelta()).merge(delta)
+            total += len(chunk)
+
+        await db.execute(delete(models.ExecutionRollup))
+        rows = [
+            {
+                "granularity": key[0], "bucket_start": key[1], "user_id": key[2],
+                "prompt_id": key[3], "llm_provider": key[4], "llm_model": key[5],
+                "executions": d.executions, "errors": d.errors, "cached": d.cached,
+                "tokens_used": d.tokens_used, "cost": d.cost, "execution_time": d.execution_time,
+                "latency_sketch": d.sketch.to_json()
+            }
+            for key, d in deltas.items()
+        ]
+        for offset in range(0, len(rows), chunk_size):
+            await db.execute(insert(models.ExecutionRollup), rows[offset:offset + chunk_size])
+        await db.commit()
+    logger.info(f"Rebuilt {len(rows)} execution rollups from {total} history rows")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(rebuild_rollups())
@@ -0,0 +1,351 @@
+"""
+Partitions mensuelles et archivage de l'historique d'exécution
+Sous PostgreSQL, prompt_execution_history est partitionnée par mois sur created_at
+(migration 006) ; les mois anciens sont exportés en JSONL compressé (zstd) puis
+leurs partitions supprimées. Les routes d'historique lisent aussi l'archive.
+"""
+
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+
+import zstandard
+from sqlalchemy import text
+
+from . import models
+from .compression import history_codec
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "./data/history-archive")
+# Mois conservés en base (mois courant inclus) avant archivage
+HISTORY_ARCHIVE_AFTER_MONTHS = int(os.getenv("HISTORY_ARCHIVE_AFTER_MONTHS", "6"))
+# Partitions créées à l'avance (mois suivants)
+HISTORY_PARTITIONS_AHEAD = int(os.getenv("HISTORY_PARTITIONS_AHEAD", "2"))
+HISTORY_ARCHIVE_ZSTD_LEVEL = int(os.getenv("HISTORY_ARCHIVE_ZSTD_LEVEL", "9"))
+# Trames décompressées gardées en mémoire (une trame = un utilisateur sur un mois)
+HISTORY_ARCHIVE_CACHE_FRAMES = int(os.getenv("HISTORY_ARCHIVE_CACHE_FRAMES", "64"))
+
+TABLE = models.PromptExecutionHistory.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+MANIFEST = "manifest.json"
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def _month_key(month: date) -> str:
+    return f"{month.year:04d}-{month.month:02d}"
+
+
+# --- Partitions (PostgreSQL) ---
+
+def _is_partitioned(connection) -> bool:
+    return connection.dialect.name == "postgresql" and bool(connection.scalar(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": TABLE}))
+
+
+def list_partitions(connection) -> List[date]:
+    """Mois ayant une partition attachée (hors partition par défaut)"""
+    names = connection.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": TABLE}).all()
+    prefix = f"{TABLE}_y"
+    months = []
+    for name in names:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split("m")
+            months.append(date(int(year), int(month), 1))
+    return sorted(months)
+
+
+def _create_partition(connection, month: date) -> None:
+    """
+    Créer la partition d'un mois
+
+    PostgreSQL refuse de créer une partition si la partition par défaut contient
+    déjà des lignes de sa plage (démarrage après un changement de mois, par
+    exemple) : ces lignes sont déplacées dans une table créée à part, qui est
+    ensuite attachée, le tout dans la transaction de l'appelant.
+    """
+    name = partition_name(month)
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    if connection.scalar(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}) is None:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} {bounds}"))
+        return
+
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": month, "end": _add_months(month, 1)}).rowcount
+    connection.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} {bounds}"))
+    if moved:
+        logger.warning(f"Moved {moved} execution history rows from the default partition to {name}")
+
+
+def ensure_partitions(engine, today: Optional[date] = None) -> None:
+    """Créer les partitions du mois courant et des HISTORY_PARTITIONS_AHEAD mois suivants"""
+    with engine.begin() as connection:
+        if not _is_partitioned(connection):
+            return
+        # Plusieurs workers démarrent en même temps : sérialiser la création
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": TABLE})
+        existing = set(list_partitions(connection))
+        month = _month_start(today or datetime.utcnow().date())
+        for offset in range(HISTORY_PARTITIONS_AHEAD + 1):
+            start = _add_months(month, offset)
+            if start not in existing:
+                _create_partition(connection, start)
+
+
+# --- Archive ---
+
+class HistoryArchive:
+    """
+    Historique archivé sur disque local
+
+    Chaque mois archivé est un fichier `history-AAAA-MM.jsonl.zst` composé d'une
+    trame zstd par utilisateur (lignes triées par created_at, id décroissants).
+    `manifest.json` donne, par mois et par utilisateur, la position de la trame
+    et ses bornes d'identifiants : une lecture ne décompresse que les trames de
+    l'utilisateur concerné.
+    """
+
+    def __init__(self, directory: str = HISTORY_ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Any] = {"months": {}}
+        self._manifest_mtime: Optional[float] = None
+        self._frames: "OrderedDict[Tuple[str, str], List[Dict[str, Any]]]" = OrderedDict()
+
+    # --- Manifeste ---
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST)
+
+    def manifest(self) -> Dict[str, Any]:
+        """Manifeste courant (relu si l'archiveur l'a modifié)"""
+        try:
+            mtime = os.stat(self._manifest_path).st_mtime
+        except FileNotFoundError:
+            return self._manifest
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                with open(self._manifest_path, "r", encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path)
+
+    # --- Lecture ---
+
+    def _read_frame(self, month: str, user_id: int) -> List[Dict[str, Any]]:
+        key = (month, str(user_id))
+        with self._lock:
+            rows = self._frames.get(key)
+            if rows is not None:
+                self._frames.move_to_end(key)
+                return rows
+
+        entry = self.manifest()["months"][month]
+        frame = entry["users"][str(user_id)]
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            f.seek(frame["offset"])
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(f.read(frame["length"]))
+        rows = []
+        for line in data.splitlines():
+            row = json.loads(line)
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+            rows.append(row)
+
+        with self._lock:
+            self._frames[key] = rows
+            while len(self._frames) > HISTORY_ARCHIVE_CACHE_FRAMES:
+                self._frames.popitem(last=False)
+        return rows
+
+    def _user_months(self, user_id: int) -> List[str]:
+        months = self.manifest()["months"]
+        return sorted((m for m, entry in months.items() if str(user_id) in entry["users"]), reverse=True)
+
+    def iter_user_rows(
+        self,
+        user_id: int,
+        before: Optional[Tuple[datetime, int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Lignes archivées d'un utilisateur, de la plus récente à la plus ancienne, après `before`"""
+        for month in self._user_months(user_id):
+            entry = self.manifest()["months"][month]
+            if before is not None and datetime.fromisoformat(entry["min_created_at"]) > before[0]:
+                continue
+            for row in self._read_frame(month, user_id):
+                if before is None or (row["created_at"], row["id"]) < before:
+                    yield row
+
+    def page(
+        self,
+        user_id: int,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None,
+        skip: int = 0,
+        prompt_id: Optional[int] = None,
+        status: Optional[str] = None
+    ) -> List[models.PromptExecutionHistory]:
+        """Page de l'historique archivé, mêmes filtres et même ordre que la table"""
+        rows = []
+        for row in self.iter_user_rows(user_id, before):
+            if prompt_id and row["prompt_id"] != prompt_id:
+                continue
+            if status and row["status"] != status:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            rows.append(models.PromptExecutionHistory(**row))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def get(self, execution_id: int, user_id: int) -> Optional[models.PromptExecutionHistory]:
+        """Exécution archivée de l'utilisateur, sinon None"""
+        for month in self._user_months(user_id):
+            frame = self.manifest()["months"][month]["users"][str(user_id)]
+            if not frame["min_id"] <= execution_id <= frame["max_id"]:
+                continue
+            for row in self._read_frame(month, user_id):
+                if row["id"] == execution_id:
+                    return models.PromptExecutionHistory(**row)
+        return None
+
+    # --- Archivage ---
+
+    def archive_month(self, engine, month: date) -> int:
+        """
+        Exporter la partition d'un mois puis la détacher et la supprimer
+
+        Le fichier et le manifeste sont écrits et synchronisés sur disque avant
+        la suppression de la partition.
+        """
+        month_key = _month_key(month)
+        manifest = self.manifest()
+        if month_key in manifest["months"]:
+            raise ValueError(f"Month {month_key} is already archived")
+
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"history-{month_key}.jsonl.zst"
+        columns = [column.name for column in models.PromptExecutionHistory.__table__.columns]
+        compressor = zstandard.ZstdCompressor(level=HISTORY_ARCHIVE_ZSTD_LEVEL)
+        users: Dict[str, Dict[str, Any]] = {}
+        total = 0
+        min_created_at = max_created_at = None
+
+        with engine.connect() as connection, open(os.path.join(self.directory, file_name), "wb") as f:
+            result = connection.execution_options(stream_results=True, yield_per=10000).execute(text(
+                f"SELECT {', '.join(columns)} FROM {partition_name(month)} "
+                "ORDER BY user_id, created_at DESC, id DESC"
+            ))
+
+            def write_frame(user_id: int, lines: List[bytes], ids: List[int]) -> None:
+                data = compressor.compress(b"\n".join(lines))
+                users[str(user_id)] = {
+                    "offset": f.tell(),
+                    "length": len(data),
+                    "rows": len(lines),
+                    "min_id": min(ids),
+                    "max_id": max(ids)
+                }
+                f.write(data)
+
+            current_user, lines, ids = None, [], []
+            for row in result.mappings():
+                if row["user_id"] != current_user and lines:
+                    write_frame(current_user, lines, ids)
+                    lines, ids = [], []
+                current_user = row["user_id"]
+                # Sorties et variables stockées en clair (le fichier est compressé en entier)
+                record = history_codec.decode_row(row)
+                record["created_at"] = record["created_at"].isoformat()
+                lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                ids.append(record["id"])
+                created_at = row["created_at"]
+                min_created_at = created_at if min_created_at is None else min(min_created_at, created_at)
+                max_created_at = created_at if max_created_at is None else max(max_created_at, created_at)
+                total += 1
+            if lines:
+                write_frame(current_user, lines, ids)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if total:
+            manifest = {"months": {**manifest["months"], month_key: {
+                "file": file_name,
+                "rows": total,
+                "min_created_at": min_created_at.isoformat(),
+                "max_created_at": max_created_at.isoformat(),
+                "users": users
+            }}}
+            self._save_manifest(manifest)
+        else:
+            os.remove(os.path.join(self.directory, file_name))
+
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {partition_name(month)}"))
+            connection.execute(text(f"DROP TABLE {partition_name(month)}"))
+        logger.info(f"Archived {total} execution history rows of {month_key} to {file_name}")
+        return total
+
+    def archive_expired(self, engine, today: Optional[date] = None) -> int:
+        """Archiver les partitions plus anciennes que HISTORY_ARCHIVE_AFTER_MONTHS mois"""
+        with engine.connect() as connection:
+            if not _is_partitioned(connection):
+                logger.warning(f"{TABLE} is not partitioned, nothing to archive")
+                return 0
+            months = list_partitions(connection)
+        cutoff = _add_months(_month_start(today or datetime.utcnow().date()), -(HISTORY_ARCHIVE_AFTER_MONTHS - 1))
+        archived = self.manifest()["months"]
+        total = 0
+        for month in months:
+            if month >= cutoff:
+                continue
+            if _month_key(month) in archived:
+                # Export déjà écrit : partition à vérifier puis supprimer manuellement
+                logger.warning(f"Partition {partition_name(month)} is already archived, skipping")
+                continue
+            total += self.archive_month(engine, month)
+        return total
+
+
+history_archive = HistoryArchive()
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    ensure_partitions(engine)
+    history_archive.archive_expired(engine)
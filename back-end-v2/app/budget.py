@@ -0,0 +1,91 @@
+"""
+Estimation du budget d'une exécution (tokens, fenêtre de contexte, coût, latence)
+Calculée localement, sans appel au provider LLM
+"""
+
+from typing import Dict, Any, Optional
+
+from .latency import latency_tracker
+from .pricing import pricing_table
+from .tokens import estimate_tokens
+
+
+def estimate_execution_budget(
+    llm_provider_name: str,
+    llm_model_name: str,
+    filled_prompt: str,
+    max_tokens: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Estimer les tokens, le coût et la latence d'une exécution
+
+    Returns:
+        Dict contenant:
+        - input_tokens: int - Tokens estimés du prompt rendu
+        - context_window: int | None - Fenêtre de contexte du modèle (si connue)
+        - remaining_context_tokens: int | None - Tokens disponibles pour la réponse
+        - max_output_tokens: int | None - Borne des tokens générés
+        - fits_in_context: bool - Le prompt et max_tokens tiennent dans la fenêtre
+        - cost_min / cost_max: float - Coût sans sortie / avec la sortie maximale
+        - estimated_latency_seconds / max_latency_seconds: float | None
+    """
+    input_tokens = estimate_tokens(filled_prompt, llm_model_name)
+    model_pricing = pricing_table.find(llm_provider_name, llm_model_name)
+    context_window = model_pricing.max_tokens if model_pricing is not None else None
+
+    remaining = None
+    fits = True
+    if context_window:
+        remaining = max(0, context_window - input_tokens)
+        fits = input_tokens + (max_tokens or 0) <= context_window
+
+    # Sans max_tokens, la réponse est bornée par la place restante dans le contexte
+    max_output_tokens = max_tokens if max_tokens is not None else remaining
+
+    cost_min = pricing_table.cost(llm_provider_name, llm_model_name, input_tokens, 0)
+    cost_max = None
+    if max_output_tokens is not None:
+        cost_max = pricing_table.cost(llm_provider_name, llm_model_name, input_tokens, max_output_tokens)
+
+    max_latency = None
+    seconds_per_token = latency_tracker.seconds_per_output_token(llm_provider_name, llm_model_name)
+    if seconds_per_token is not None and max_output_tokens is not None:
+        max_latency = round(seconds_per_token * max_output_tokens, 3)
+
+    return {
+        "input_tokens": input_tokens,
+        "context_window": context_window,
+        "remaining_context_tokens": remaining,
+        "max_output_tokens": max_output_tokens,
+        "fits_in_context": fits,
+        "cost_min": cost_min,
+        "cost_max": cost_max,
+        "estimated_latency_seconds": latency_tracker.ewma(llm_provider_name, llm_model_name),
+        "max_latency_seconds": max_latency,
+    }
+
+
+def check_context_budget(
+    llm_provider_name: str,
+    llm_model_name: str,
+    filled_prompt: str,
+    max_tokens: Optional[int] = None
+) -> None:
+    """
+    Vérifier que le prompt et max_tokens tiennent dans la fenêtre de contexte du modèle
+
+    Raises:
+        ValueError: Si la fenêtre de contexte serait dépassée
+    """
+    model_pricing = pricing_table.find(llm_provider_name, llm_model_name)
+    if model_pricing is None or not model_pricing.max_tokens:
+        return
+
+    input_tokens = estimate_tokens(filled_prompt, llm_model_name)
+    requested = input_tokens + (max_tokens or 0)
+    if requested > model_pricing.max_tokens:
+        raise ValueError(
+            f"Prompt exceeds the context window of {llm_model_name}: "
+            f"{input_tokens} input tokens + {max_tokens or 0} max output tokens "
+            f"> {model_pricing.max_tokens}"
+        )
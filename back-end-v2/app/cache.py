@@ -0,0 +1,157 @@
+"""
+Cache des réponses LLM pour PIVORI Studio
+Backends en mémoire (TTL + LRU) et Redis
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def build_cache_key(
+    prompt: str,
+    llm_provider: str,
+    llm_model: str,
+    temperature: Optional[float],
+    max_tokens: Optional[int]
+) -> str:
+    """
+    Construit la clé de cache d'une exécution
+
+    La clé couvre le prompt rendu (template + variables validées) et
+    tous les paramètres qui influencent la réponse du modèle.
+    """
+    payload = json.dumps(
+        {
+            "prompt": prompt,
+            "provider": llm_provider,
+            "model": llm_model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return "llm-response:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Classe abstraite pour les caches de réponses LLM"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Récupérer une réponse en cache (None si absente ou expirée)"""
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Enregistrer une réponse dans le cache"""
+        pass
+
+    async def close(self) -> None:
+        """Libérer les ressources du backend"""
+        pass
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Cache en mémoire avec expiration TTL et éviction LRU"""
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        async with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            # Éviction des entrées les moins récemment utilisées
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache partagé entre workers, stocké dans Redis"""
+
+    def __init__(self, url: str, ttl: int = 3600):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self.client.get(key)
+        except Exception as e:
+            # Une panne du cache ne doit pas bloquer l'exécution
+            logger.warning(f"Redis cache read error: {str(e)}")
+            return None
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            await self.client.set(key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Redis cache write error: {str(e)}")
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+# Configuration du cache
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory, redis, none
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+# Seules les exécutions déterministes (température <= seuil) sont mises en cache
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0.0"))
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """
+    Créer le cache de réponses selon la configuration
+
+    Returns:
+        Instance du cache, ou None si le cache est désactivé
+    """
+    if RESPONSE_CACHE_BACKEND == "none":
+        return None
+
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisResponseCache(
+            url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            ttl=RESPONSE_CACHE_TTL,
+        )
+
+    return InMemoryResponseCache(
+        ttl=RESPONSE_CACHE_TTL,
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    )
+
+
+def is_cacheable(temperature: Optional[float]) -> bool:
+    """Indique si une exécution peut être servie depuis le cache"""
+    return temperature is not None and temperature <= RESPONSE_CACHE_MAX_TEMPERATURE
@@ -0,0 +1,199 @@
+"""
+Cache de lecture du catalogue (spécialités, sous-spécialités, prompts experts)
+Réponses JSON pré-sérialisées avec ETag, en mémoire et optionnellement dans Redis
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging
+import os
+import time
+
+from prometheus_client import Counter
+
+from .conditional import strong_etag
+
+logger = logging.getLogger(__name__)
+
+catalog_cache_requests = Counter(
+    'catalog_cache_requests_total',
+    'Catalog cache lookups',
+    ['namespace', 'result']
+)
+
+# Espaces de noms invalidés par les routes de création
+SPECIALTIES = "specialties"
+SUB_SPECIALTIES = "sub_specialties"
+EXPERT_PROMPTS = "expert_prompts"
+CATALOG_TREE = "catalog_tree"
+
+
+class CatalogEntry:
+    """Réponse JSON pré-sérialisée et son ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes, etag: Optional[str] = None):
+        self.body = body
+        self.etag = etag or strong_etag(body)
+
+
+def catalog_key(**params: Any) -> str:
+    """Clé d'une page ou d'un filtre (paramètres triés)"""
+    return "&".join(f"{name}={params[name]}" for name in sorted(params))
+
+
+class CatalogCache:
+    """
+    Cache à deux niveaux des lectures du catalogue
+
+    Le niveau local (par processus) sert les lectures sans aller-retour réseau.
+    Le niveau Redis, optionnel, est partagé entre les workers : chaque espace de
+    noms y est un hash supprimé d'un bloc à l'invalidation. Les entrées locales
+    ont une durée de vie courte (`local_ttl`) qui borne le délai de prise en
+    compte d'une invalidation faite par un autre worker.
+
+    Chaque invalidation incrémente la génération de l'espace de noms (dans Redis
+    s'il est configuré) : une réponse lue avant une invalidation, dans ce worker
+    ou dans un autre, n'est pas mise en cache.
+    """
+
+    # Écrit l'entrée seulement si la génération n'a pas changé depuis la lecture (script atomique)
+    SET_SCRIPT = """
+    if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+      return 0
+    end
+    redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+    return 1
+    """
+
+    def __init__(
+        self,
+        ttl: int = 300,
+        local_ttl: float = 5.0,
+        max_entries: int = 1000,
+        redis_url: Optional[str] = None
+    ):
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Incrémenté à chaque invalidation : une lecture commencée avant n'est pas mise en cache
+        self._generations: Dict[str, int] = {}
+        self.client = None
+        if redis_url:
+            import redis.asyncio as redis
+
+            self.client = redis.from_url(redis_url)
+            self._set_script = self.client.register_script(self.SET_SCRIPT)
+
+    async def generation(self, namespace: str) -> Optional[int]:
+        """Génération courante de l'espace de noms, à relire avant chaque chargement (None si inconnue)"""
+        if self.client is None:
+            return self._generations.get(namespace, 0)
+        try:
+            return int(await self.client.get(f"catalog:generation:{namespace}") or 0)
+        except Exception as e:
+            logger.warning(f"Redis catalog cache read error: {str(e)}")
+            return None
+
+    async def get(self, namespace: str, key: str) -> Optional[CatalogEntry]:
+        entry = self._entries.get((namespace, key))
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end((namespace, key))
+                catalog_cache_requests.labels(namespace=namespace, result='hit').inc()
+                return value
+            self._entries.pop((namespace, key), None)
+
+        if self.client is not None:
+            try:
+                raw = await self.client.hget(f"catalog:{namespace}", key)
+            except Exception as e:
+                logger.warning(f"Redis catalog cache read error: {str(e)}")
+                raw = None
+            if raw:
+                etag, body = raw.split(b"\n", 1)
+                value = CatalogEntry(body, etag.decode("ascii"))
+                self._store_local(namespace, key, value)
+                catalog_cache_requests.labels(namespace=namespace, result='redis_hit').inc()
+                return value
+
+        catalog_cache_requests.labels(namespace=namespace, result='miss').inc()
+        return None
+
+    async def set(self, namespace: str, key: str, body: bytes, generation: Optional[int]) -> CatalogEntry:
+        """Mettre en cache une réponse lue à la génération `generation` de l'espace de noms"""
+        value = CatalogEntry(body)
+        # Invalidation survenue pendant la lecture : ne pas mettre en cache une réponse périmée
+        if generation is None:
+            return value
+        if self.client is None:
+            if generation == self._generations.get(namespace, 0):
+                self._store_local(namespace, key, value)
+            return value
+
+        try:
+            stored = await self._set_script(
+                keys=[f"catalog:{namespace}", f"catalog:generation:{namespace}"],
+                args=[generation, key, value.etag.encode("ascii") + b"\n" + body, self.ttl]
+            )
+        except Exception as e:
+            logger.warning(f"Redis catalog cache write error: {str(e)}")
+            return value
+        if stored:
+            self._store_local(namespace, key, value)
+        return value
+
+    def _store_local(self, namespace: str, key: str, value: CatalogEntry) -> None:
+        ttl = self.local_ttl if self.client is not None else self.ttl
+        self._entries[(namespace, key)] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, namespace: str) -> None:
+        """Oublier toutes les pages et tous les filtres d'un espace de noms"""
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        for cached_key in [cached_key for cached_key in self._entries if cached_key[0] == namespace]:
+            del self._entries[cached_key]
+
+        if self.client is not None:
+            try:
+                async with self.client.pipeline(transaction=True) as pipe:
+                    pipe.incr(f"catalog:generation:{namespace}")
+                    pipe.delete(f"catalog:{namespace}")
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Redis catalog cache invalidation error: {str(e)}")
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+
+
+# Configuration du cache du catalogue
+CATALOG_CACHE_BACKEND = os.getenv("CATALOG_CACHE_BACKEND", "memory")  # memory, redis, none
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_LOCAL_TTL = float(os.getenv("CATALOG_CACHE_LOCAL_TTL", "5"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1000"))
+
+
+def create_catalog_cache() -> Optional[CatalogCache]:
+    """
+    Créer le cache du catalogue selon la configuration
+
+    Returns:
+        Instance du cache, ou None si le cache est désactivé
+    """
+    if CATALOG_CACHE_BACKEND == "none":
+        return None
+
+    return CatalogCache(
+        ttl=CATALOG_CACHE_TTL,
+        local_ttl=CATALOG_CACHE_LOCAL_TTL,
+        max_entries=CATALOG_CACHE_MAX_ENTRIES,
+        redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0") if CATALOG_CACHE_BACKEND == "redis" else None,
+    )
@@ -0,0 +1,191 @@
+"""
+Compression de l'historique d'exécution au repos
+Les sorties et variables volumineuses sont stockées compressées (zstd, avec un
+dictionnaire entraîné sur l'historique) ; la colonne output garde un aperçu
+"""
+
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import threading
+
+import zstandard
+from sqlalchemy import or_, func
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Taille (octets UTF-8) à partir de laquelle une sortie ou des variables sont compressées
+HISTORY_COMPRESSION_MIN_BYTES = int(os.getenv("HISTORY_COMPRESSION_MIN_BYTES", "4096"))
+HISTORY_COMPRESSION_LEVEL = int(os.getenv("HISTORY_COMPRESSION_LEVEL", "3"))
+# Caractères de la sortie conservés en clair comme aperçu (listes de l'historique)
+HISTORY_PREVIEW_CHARS = int(os.getenv("HISTORY_PREVIEW_CHARS", "500"))
+HISTORY_COMPRESSION_DICT_SIZE = int(os.getenv("HISTORY_COMPRESSION_DICT_SIZE", "112640"))
+HISTORY_COMPRESSION_TRAIN_SAMPLES = int(os.getenv("HISTORY_COMPRESSION_TRAIN_SAMPLES", "5000"))
+# En dessous, l'entraînement d'un dictionnaire n'apporte rien
+MIN_TRAINING_SAMPLES = 100
+
+
+class HistoryCodec:
+    """
+    Compression zstd des sorties et variables de l'historique
+
+    Les trames portent l'identifiant du dictionnaire utilisé : les valeurs
+    compressées avec un ancien dictionnaire (ou sans dictionnaire) restent
+    lisibles après l'entraînement d'un nouveau.
+    """
+
+    def __init__(
+        self,
+        min_bytes: int = HISTORY_COMPRESSION_MIN_BYTES,
+        level: int = HISTORY_COMPRESSION_LEVEL,
+        preview_chars: int = HISTORY_PREVIEW_CHARS
+    ):
+        self.min_bytes = min_bytes
+        self.level = level
+        self.preview_chars = preview_chars
+        self._lock = threading.Lock()
+        self._dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+        self._current: Optional[zstandard.ZstdCompressionDict] = None
+
+    # --- Dictionnaires ---
+
+    def use_dictionary(self, dictionary: zstandard.ZstdCompressionDict) -> None:
+        """Compresser désormais avec `dictionary`"""
+        with self._lock:
+            self._dictionaries[dictionary.dict_id()] = dictionary
+            self._current = dictionary
+
+    def _load(self, dict_id: Optional[int] = None) -> None:
+        from .database import SessionLocal
+
+        with SessionLocal() as db:
+            query = db.query(models.CompressionDictionary)
+            if dict_id is not None:
+                query = query.filter(models.CompressionDictionary.dict_id == dict_id)
+            rows = query.order_by(models.CompressionDictionary.created_at).all()
+        with self._lock:
+            for row in rows:
+                self._dictionaries[row.dict_id] = zstandard.ZstdCompressionDict(row.data)
+            if dict_id is None and rows:
+                self._current = self._dictionaries[rows[-1].dict_id]
+
+    def load_dictionaries(self) -> None:
+        """Charger les dictionnaires ; le plus récent sert à compresser"""
+        self._load()
+        if self._current is not None:
+            logger.info(f"History compression dictionary {self._current.dict_id()} loaded")
+
+    def _dictionary(self, dict_id: int) -> zstandard.ZstdCompressionDict:
+        if dict_id not in self._dictionaries:
+            # Dictionnaire entraîné par un autre processus depuis le démarrage
+            self._load(dict_id)
+        return self._dictionaries[dict_id]
+
+    # --- Compression ---
+
+    def compress(self, data: bytes) -> bytes:
+        if self._current is None:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return zstandard.ZstdCompressor(level=self.level, dict_data=self._current).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        if not dict_id:
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zstandard.ZstdDecompressor(dict_data=self._dictionary(dict_id)).decompress(data)
+
+    def encode_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Copie d'une ligne (ou de valeurs de mise à jour) prête à l'écriture
+
+        Seules les clés `output` et `variables` présentes sont traitées.
+        """
+        encoded = dict(row)
+        if "output" in row:
+            output = row["output"]
+            raw = output.encode("utf-8") if output is not None else b""
+            compressed = len(raw) >= self.min_bytes
+            encoded["output_compressed"] = compressed
+            encoded["output_zstd"] = self.compress(raw) if compressed else None
+            if compressed:
+                encoded["output"] = output[:self.preview_chars]
+        if "variables" in row:
+            raw = json.dumps(row["variables"], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            compressed = len(raw) >= self.min_bytes
+            encoded["variables_zstd"] = self.compress(raw) if compressed else None
+            if compressed:
+                encoded["variables"] = None
+        return encoded
+
+    def encode_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.encode_row(row) for row in rows]
+
+    # --- Lecture ---
+
+    def output(self, execution: Any) -> Optional[str]:
+        """Sortie complète (décompressée si besoin)"""
+        if getattr(execution, "output_compressed", False):
+            return self.decompress(execution.output_zstd).decode("utf-8")
+        return execution.output
+
+    def variables(self, execution: Any) -> Dict[str, Any]:
+        """Variables complètes (décompressées si besoin)"""
+        if execution.variables is None and getattr(execution, "variables_zstd", None) is not None:
+            return json.loads(self.decompress(execution.variables_zstd))
+        return execution.variables or {}
+
+    def decode_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Ligne brute de la table avec sortie et variables en clair (sans colonnes compressées)"""
+        decoded = dict(row)
+        output_zstd = decoded.pop("output_zstd", None)
+        variables_zstd = decoded.pop("variables_zstd", None)
+        if decoded.pop("output_compressed", False):
+            decoded["output"] = self.decompress(output_zstd).decode("utf-8")
+        if variables_zstd is not None:
+            decoded["variables"] = json.loads(self.decompress(variables_zstd))
+        return decoded
+
+
+history_codec = HistoryCodec()
+
+
+def train_dictionary(
+    samples: int = HISTORY_COMPRESSION_TRAIN_SAMPLES,
+    dict_size: int = HISTORY_COMPRESSION_DICT_SIZE
+) -> Optional[int]:
+    """
+    Entraîner un dictionnaire sur les sorties volumineuses les plus récentes
+
+    Le dictionnaire est enregistré en base et utilisé par les processus au
+    prochain démarrage ; les valeurs déjà compressées ne sont pas réécrites.
+    """
+    from .database import SessionLocal
+
+    History = models.PromptExecutionHistory
+    history_codec.load_dictionaries()
+    with SessionLocal() as db:
+        rows = db.query(History.output, History.output_compressed, History.output_zstd).filter(
+            or_(History.output_compressed.is_(True), func.length(History.output) >= history_codec.min_bytes)
+        ).order_by(History.id.desc()).limit(samples).all()
+        data = [history_codec.output(row).encode("utf-8") for row in rows]
+        if len(data) < MIN_TRAINING_SAMPLES:
+            logger.warning(f"Only {len(data)} large outputs in history, not training a dictionary")
+            return None
+
+        dictionary = zstandard.train_dictionary(dict_size, data, level=history_codec.level)
+        db.add(models.CompressionDictionary(
+            dict_id=dictionary.dict_id(),
+            data=dictionary.as_bytes(),
+            samples=len(data)
+        ))
+        db.commit()
+    logger.info(f"Trained history compression dictionary {dictionary.dict_id()} on {len(data)} outputs")
+    return dictionary.dict_id()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    train_dictionary()
@@ -0,0 +1,37 @@
+"""
+Requêtes conditionnelles (ETag fort / If-None-Match)
+Une ressource inchangée est renvoyée en 304 sans corps
+"""
+
+from typing import Dict, Optional
+import hashlib
+
+from fastapi import Request, status
+from fastapi.responses import Response
+
+
+def strong_etag(body: bytes) -> str:
+    """ETag fort dérivé du contenu exact de la réponse"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Vrai si l'en-tête If-None-Match désigne `etag` (ou `*`)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def conditional_response(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    cache_control: str = "no-cache"
+) -> Response:
+    """Réponse JSON avec ETag fort, ou 304 si le client a déjà cette version"""
+    headers = {**(headers or {}), "ETag": etag or strong_etag(body), "Cache-Control": cache_control}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
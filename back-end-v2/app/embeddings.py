@@ -0,0 +1,439 @@
+"""
+Recherche sémantique des prompts experts
+Embeddings locaux stockés dans une matrice float32 mappée en mémoire (top-k cosinus NumPy)
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul processus
+    fcntl = None
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import SessionLocal
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "hashing")  # hashing ou nom d'un modèle sentence-transformers
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "256"))  # embedder hashing uniquement
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "./data/embeddings")
+# Partitionnement IVF au-delà de ce nombre de prompts (0 = toujours exhaustif)
+EMBEDDING_IVF_MIN_ROWS = int(os.getenv("EMBEDDING_IVF_MIN_ROWS", "20000"))
+EMBEDDING_IVF_PROBES = int(os.getenv("EMBEDDING_IVF_PROBES", "8"))
+
+
+class Embedder(ABC):
+    """Classe abstraite des modèles d'embedding"""
+
+    name: str
+    dimension: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Vecteurs float32 normalisés (norme L2 = 1), une ligne par texte"""
+        pass
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder(Embedder):
+    """
+    Embedder hors ligne par hachage des termes et des paires de termes
+
+    Déterministe et sans modèle à télécharger : rapproche les prompts qui
+    partagent leur vocabulaire, sans notion de synonymie.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.name = f"hashing-{dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                # Signe aléatoire : les collisions se compensent au lieu de s'additionner
+                vectors[row, value % self.dimension] += 1.0 if (value >> 63) & 1 else -1.0
+        return _normalize(np.log1p(np.abs(vectors)) * np.sign(vectors))
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Modèle local sentence-transformers (dépendance optionnelle)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def create_embedder() -> Embedder:
+    """Créer l'embedder configuré (repli sur l'embedder hashing si le modèle est indisponible)"""
+    if EMBEDDING_MODEL != "hashing":
+        try:
+            return SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        except Exception as e:
+            logger.warning(f"Embedding model {EMBEDDING_MODEL} unavailable, using hashing embedder: {str(e)}")
+    return HashingEmbedder()
+
+
+def prompt_text(
+    title: str,
+    specialty_names: str,
+    expected_output: Optional[str],
+    template: str
+) -> str:
+    """Texte embarqué d'un prompt (titre répété pour peser davantage)"""
+    return "\n".join(filter(None, [title, title, specialty_names, expected_output, template]))
+
+
+class _Snapshot:
+    """
+    État de l'index lu par les requêtes, jamais modifié après sa publication
+
+    Les `count` premières lignes de `vectors` sont écrites avant la publication ;
+    les lignes ajoutées ensuite dans la même matrice sont ignorées. Seul le
+    vecteur d'un prompt modifié est remplacé en place.
+    """
+
+    __slots__ = ("count", "ids", "rows", "sub_specialties", "vectors", "centroids", "assignments")
+
+    def __init__(
+        self,
+        ids: Tuple[int, ...],
+        rows: Dict[int, int],
+        sub_specialties: np.ndarray,
+        vectors: Optional[np.ndarray],
+        centroids: Optional[np.ndarray],
+        assignments: Optional[np.ndarray]
+    ):
+        self.count = len(ids)
+        self.ids = ids
+        self.rows = rows
+        self.sub_specialties = sub_specialties
+        self.vectors = vectors
+        self.centroids = centroids
+        self.assignments = assignments
+
+
+_EMPTY_SNAPSHOT = _Snapshot((), {}, np.empty(0, dtype=np.int64), None, None, None)
+
+
+class EmbeddingIndex:
+    """
+    Index des embeddings des prompts experts
+
+    Les vecteurs sont stockés dans `vectors.npy` (float32, mappé en mémoire) et
+    les identifiants dans `meta.json`. Au démarrage, seuls les prompts nouveaux
+    ou modifiés depuis la dernière exécution sont recalculés. Au-delà de
+    EMBEDDING_IVF_MIN_ROWS prompts, les vecteurs sont partitionnés (k-means)
+    et une requête ne parcourt que les EMBEDDING_IVF_PROBES partitions les plus proches.
+
+    Les fichiers sont partagés entre les workers : chaque écriture se fait sous
+    un verrou de fichier, après rechargement de l'état persistant, et les
+    requêtes rechargent l'index lorsqu'un autre worker a modifié `meta.json`.
+    Les requêtes lisent un instantané publié en fin d'écriture, sans verrou.
+    """
+
+    def __init__(self, embedder: Embedder, directory: str = EMBEDDING_INDEX_DIR):
+        self.embedder = embedder
+        self.directory = directory
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        self._sub_specialties: List[int] = []
+        self._stamps: Dict[int, str] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._meta_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self._snapshot = _EMPTY_SNAPSHOT
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    # --- Stockage ---
+
+    @contextmanager
+    def _locked(self):
+        """Exclusion entre threads et entre workers pour les écritures de l'index"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open(self, capacity: int) -> None:
+        """Ouvrir (ou agrandir) la matrice mappée en mémoire"""
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self._vectors
+        if previous is not None and previous.shape[0] >= capacity:
+            return
+        # Croissance géométrique : la matrice n'est pas recopiée à chaque ajout
+        capacity = max(capacity, 64, 2 * previous.shape[0] if previous is not None else 0)
+
+        temporary_path = self._vectors_path + ".tmp"
+        vectors = np.lib.format.open_memmap(
+            temporary_path, mode="w+", dtype=np.float32, shape=(capacity, self.embedder.dimension)
+        )
+        if previous is not None and self._ids:
+            vectors[:len(self._ids)] = previous[:len(self._ids)]
+        vectors.flush()
+        del vectors
+        os.replace(temporary_path, self._vectors_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+    def _save_meta(self) -> None:
+        self._vectors.flush()
+        temporary_path = self._meta_path + ".tmp"
+        with open(temporary_path, "w") as meta_file:
+            json.dump({
+                "embedder": self.embedder.name,
+                "dimension": self.embedder.dimension,
+                "ids": self._ids,
+                "sub_specialties": self._sub_specialties,
+                "stamps": [self._stamps[prompt_id] for prompt_id in self._ids],
+            }, meta_file)
+        os.replace(temporary_path, self._meta_path)
+        self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+        self._publish()
+
+    def _publish(self) -> None:
+        """Publier l'état courant pour les requêtes (une seule affectation)"""
+        self._snapshot = _Snapshot(
+            tuple(self._ids),
+            dict(self._rows),
+            np.asarray(self._sub_specialties, dtype=np.int64),
+            self._vectors,
+            self._centroids,
+            self._assignments[:len(self._ids)].copy() if self._assignments is not None else None
+        )
+
+    def _load_existing(self) -> None:
+        """Recharger l'index persistant s'il a été produit par le même embedder"""
+        try:
+            self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+            with open(self._meta_path) as meta_file:
+                meta = json.load(meta_file)
+            if meta["embedder"] != self.embedder.name or meta["dimension"] != self.embedder.dimension:
+                return
+            vectors = np.load(self._vectors_path, mmap_mode="r+")
+        except (OSError, ValueError, KeyError):
+            return
+
+        self._vectors = vectors
+        self._ids = meta["ids"]
+        self._sub_specialties = meta["sub_specialties"]
+        self._stamps = dict(zip(self._ids, meta["stamps"]))
+        self._rows = {prompt_id: row for row, prompt_id in enumerate(self._ids)}
+        if self._centroids is not None:
+            self._assignments = np.argmax(np.asarray(self._vectors[:len(self._ids)]) @ self._centroids.T, axis=1)
+        self._publish()
+
+    def _sync(self) -> None:
+        """Recharger l'index persistant s'il a été modifié par un autre worker"""
+        try:
+            mtime = os.stat(self._meta_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._meta_mtime:
+            with self._lock:
+                self._load_existing()
+
+    # --- Construction et mise à jour ---
+
+    @staticmethod
+    def _prompts_query():
+        return (
+            select(
+                models.ExpertPrompt.id,
+                models.ExpertPrompt.sub_specialty_id,
+                models.ExpertPrompt.title,
+                models.ExpertPrompt.template,
+                models.ExpertPrompt.expected_output,
+                models.ExpertPrompt.updated_at,
+                models.SubSpecialty.name,
+                models.Specialty.name,
+            )
+            .join(models.SubSpecialty, models.ExpertPrompt.sub_specialty_id == models.SubSpecialty.id)
+            .join(models.Specialty, models.SubSpecialty.specialty_id == models.Specialty.id)
+        )
+
+    def _write(self, rows: List[Any]) -> None:
+        """Calculer et enregistrer les embeddings des lignes (insertion ou remplacement)"""
+        if not rows:
+            return
+        vectors = self.embedder.embed([
+            prompt_text(title, f"{specialty_name} {sub_specialty_name}", expected_output, template)
+            for _, _, title, template, expected_output, _, sub_specialty_name, specialty_name in rows
+        ])
+        new_ids = [row[0] for row in rows if row[0] not in self._rows]
+        self._open(len(self._ids) + len(new_ids))
+
+        for (prompt_id, sub_specialty_id, *_fields), vector in zip(rows, vectors):
+            updated_at = _fields[3]
+            row = self._rows.get(prompt_id)
+            if row is None:
+                row = len(self._ids)
+                self._ids.append(prompt_id)
+                self._sub_specialties.append(sub_specialty_id)
+                self._rows[prompt_id] = row
+                if self._assignments is not None:
+                    self._assignments = np.append(self._assignments, -1)
+            self._sub_specialties[row] = sub_specialty_id
+            self._stamps[prompt_id] = str(updated_at)
+            self._vectors[row] = vector
+            if self._centroids is not None:
+                self._assignments[row] = int(np.argmax(self._centroids @ vector))
+
+    def rebuild(self) -> None:
+        """Synchroniser l'index avec la table des prompts (session synchrone)"""
+        db = SessionLocal()
+        try:
+            rows = db.execute(self._prompts_query()).all()
+        finally:
+            db.close()
+
+        # Un seul worker à la fois : les suivants rechargent l'index déjà à jour
+        with self._locked():
+            self._load_existing()
+            current_ids = {row[0] for row in rows}
+            if any(prompt_id not in current_ids for prompt_id in self._ids):
+                # Prompts supprimés : repartir d'un index vide
+                self._vectors, self._ids, self._rows, self._sub_specialties, self._stamps = None, [], {}, [], {}
+
+            stale = [row for row in rows if self._stamps.get(row[0]) != str(row[5])]
+            self._write(stale)
+            if self._vectors is None:
+                self._open(0)
+            self._train_partitions()
+            self._save_meta()
+        logger.info(f"Embedding index ready: {len(self._ids)} prompts ({len(stale)} embedded)")
+
+    async def startup(self) -> None:
+        await asyncio.to_thread(self.rebuild)
+
+    async def add(self, db: AsyncSession, prompt_id: int) -> None:
+        """Indexer un prompt venant d'être créé ou modifié"""
+        row = (await db.execute(self._prompts_query().where(models.ExpertPrompt.id == prompt_id))).first()
+        if row is not None:
+            await asyncio.to_thread(self._add_rows, [row])
+
+    def _add_rows(self, rows: List[Any]) -> None:
+        with self._locked():
+            self._load_existing()
+            self._write(rows)
+            self._save_meta()
+
+    def _train_partitions(self, iterations: int = 10) -> None:
+        """Partitionner les vecteurs par k-means sphérique (IVF) pour les grands catalogues"""
+        count = len(self._ids)
+        if not EMBEDDING_IVF_MIN_ROWS or count < EMBEDDING_IVF_MIN_ROWS:
+            self._centroids = None
+            self._assignments = None
+            return
+
+        vectors = np.asarray(self._vectors[:count])
+        partitions = int(np.sqrt(count))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(count, partitions, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for partition in range(partitions):
+                members = vectors[assignments == partition]
+                if len(members):
+                    centroids[partition] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        self._centroids = centroids
+        self._assignments = np.argmax(vectors @ centroids.T, axis=1)
+
+    # --- Requêtes ---
+
+    def _top_k(
+        self,
+        snapshot: _Snapshot,
+        query: np.ndarray,
+        k: int,
+        exclude_id: Optional[int],
+        sub_specialty_id: Optional[int]
+    ) -> List[Tuple[int, float]]:
+        count = snapshot.count
+        if not count:
+            return []
+
+        if snapshot.centroids is not None:
+            probes = np.argsort(-(snapshot.centroids @ query))[:EMBEDDING_IVF_PROBES]
+            candidates = np.flatnonzero(np.isin(snapshot.assignments, probes))
+        else:
+            candidates = np.arange(count)
+
+        if sub_specialty_id:
+            candidates = candidates[snapshot.sub_specialties[candidates] == sub_specialty_id]
+        if exclude_id is not None and exclude_id in snapshot.rows:
+            candidates = candidates[candidates != snapshot.rows[exclude_id]]
+        if not len(candidates):
+            return []
+
+        scores = snapshot.vectors[candidates] @ query
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(snapshot.ids[candidates[index]], round(float(scores[index]), 4)) for index in best]
+
+    def similar(self, prompt_id: int, k: int = 10, sub_specialty_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Prompts les plus proches d'un prompt indexé (vide s'il est inconnu)"""
+        self._sync()
+        snapshot = self._snapshot
+        row = snapshot.rows.get(prompt_id)
+        if row is None:
+            return []
+        query = np.asarray(snapshot.vectors[row])
+        return self._top_k(snapshot, query, k, prompt_id, sub_specialty_id)
+
+    def suggest(self, task: str, k: int = 10, sub_specialty_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Prompts les plus proches d'une description de tâche libre"""
+        self._sync()
+        query = self.embedder.embed([task])[0]
+        return self._top_k(self._snapshot, query, k, None, sub_specialty_id)
+
+
+def create_embedding_index() -> EmbeddingIndex:
+    return EmbeddingIndex(create_embedder())
@@ -0,0 +1,256 @@
+"""
+Écriture différée de l'historique d'exécution
+Les lignes sont accumulées en mémoire puis insérées par lots (tous les N lignes ou M ms),
+avec la mise à jour des rollups d'analyse dans la même transaction
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import exc, func, insert, select, text
+
+from . import models
+from .analytics import record_rollups
+from .compression import history_codec
+from .database import AsyncSessionLocal, async_engine
+
+logger = logging.getLogger(__name__)
+
+history_writer_buffered_rows = Gauge(
+    'history_writer_buffered_rows',
+    'Execution history rows waiting to be written'
+)
+
+history_writer_dropped_rows = Counter(
+    'history_writer_dropped_rows_total',
+    'Execution history rows dropped after repeated write failures'
+)
+
+HISTORY_FLUSH_ROWS = int(os.getenv("HISTORY_FLUSH_ROWS", "200"))
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "250"))
+# Au-delà, les lignes les plus anciennes sont abandonnées si la base reste indisponible
+HISTORY_MAX_BUFFERED_ROWS = int(os.getenv("HISTORY_MAX_BUFFERED_ROWS", "50000"))
+# Identifiants réservés par aller-retour à la séquence PostgreSQL
+HISTORY_ID_BLOCK_SIZE = int(os.getenv("HISTORY_ID_BLOCK_SIZE", "100"))
+# Essais d'écriture d'une ligne isolée en échec avant son abandon
+HISTORY_MAX_ROW_ATTEMPTS = int(os.getenv("HISTORY_MAX_ROW_ATTEMPTS", "3"))
+
+
+def _is_transient(error: Exception) -> bool:
+    """Erreur de disponibilité de la base (à réessayer telle quelle), et non d'une ligne"""
+    return (
+        isinstance(error, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError, asyncio.TimeoutError))
+        or getattr(error, "connection_invalidated", False)
+    )
+
+
+class HistoryWriter:
+    """
+    Tampon d'écriture de l'historique d'exécution
+
+    Les identifiants sont attribués avant l'écriture : par blocs tirés de la
+    séquence de la table sous PostgreSQL, ou par un compteur local initialisé
+    depuis max(id) sous SQLite. Ce compteur n'est pas partagé : sous SQLite,
+    l'application doit tourner dans un seul processus (pas de `--workers`).
+    Les lignes en attente restent consultables par `pending` jusqu'à leur insertion.
+
+    Si un lot est refusé pour une raison propre à ses lignes (contrainte, valeur
+    trop longue), il est coupé en deux jusqu'à isoler les lignes fautives ;
+    chacune est réessayée aux vidages suivants puis abandonnée (journalisée)
+    après `HISTORY_MAX_ROW_ATTEMPTS` échecs.
+    """
+
+    SEQUENCE = "prompt_execution_history_id_seq"
+
+    def __init__(
+        self,
+        flush_rows: int = HISTORY_FLUSH_ROWS,
+        flush_interval_ms: int = HISTORY_FLUSH_INTERVAL_MS,
+        max_buffered_rows: int = HISTORY_MAX_BUFFERED_ROWS
+    ):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_buffered_rows = max_buffered_rows
+        self._buffer: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # Lignes déjà en base (jobs terminés) à ajouter seulement aux rollups
+        self._tracked: List[Dict[str, Any]] = []
+        # Échecs des lignes isolées, par identifiant
+        self._attempts: Dict[int, int] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._id_lock = asyncio.Lock()
+        self._pool: List[int] = []
+        self._next_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Identifiants ---
+
+    async def _reserve_ids(self, count: int) -> List[int]:
+        """Tirer `count` identifiants de la séquence PostgreSQL en un aller-retour"""
+        async with AsyncSessionLocal() as db:
+            return list((await db.execute(
+                text(f"SELECT nextval('{self.SEQUENCE}') FROM generate_series(1, :count)"),
+                {"count": count}
+            )).scalars().all())
+
+    async def allocate_ids(self, count: int = 1) -> List[int]:
+        """Réserver `count` identifiants d'historique"""
+        async with self._id_lock:
+            if async_engine.dialect.name == "postgresql":
+                if len(self._pool) < count:
+                    self._pool += await self._reserve_ids(max(HISTORY_ID_BLOCK_SIZE, count - len(self._pool)))
+                ids, self._pool = self._pool[:count], self._pool[count:]
+                return ids
+
+            if self._next_id == 0:
+                async with AsyncSessionLocal() as db:
+                    max_id = await db.scalar(select(func.max(models.PromptExecutionHistory.id)))
+                self._next_id = (max_id or 0) + 1
+            ids = list(range(self._next_id, self._next_id + count))
+            self._next_id += count
+            return ids
+
+    # --- Écriture ---
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Ajouter une ligne (avec son `id` déjà attribué) au tampon"""
+        row.setdefault("created_at", datetime.utcnow())
+        self._buffer[row["id"]] = row
+        while len(self._buffer) > self.max_buffered_rows:
+            dropped_id, _ = self._buffer.popitem(last=False)
+            self._attempts.pop(dropped_id, None)
+            history_writer_dropped_rows.inc()
+            logger.error(f"History buffer full, dropping execution {dropped_id}")
+        history_writer_buffered_rows.set(len(self._buffer))
+        if len(self._buffer) >= self.flush_rows:
+            self._flush_requested.set()
+
+    def track(self, row: Dict[str, Any]) -> None:
+        """Compter dans les rollups une exécution écrite hors du tampon"""
+        self._tracked.append(row)
+        if len(self._tracked) >= self.flush_rows:
+            self._flush_requested.set()
+
+    def pending(self, execution_id: int) -> Optional[models.PromptExecutionHistory]:
+        """Ligne encore en attente d'écriture (objet transitoire), sinon None"""
+        row = self._buffer.get(execution_id)
+        if row is None:
+            return None
+        return models.PromptExecutionHistory(**{"cached": False, "hedged": False, **row})
+
+    async def _write(self, rows: List[Dict[str, Any]], tracked: List[Dict[str, Any]]) -> None:
+        """Insérer `rows` et mettre à jour les rollups dans une seule transaction"""
+        async with AsyncSessionLocal() as db:
+            if rows:
+                # Compression des valeurs volumineuses hors de la boucle d'événements
+                encoded = await asyncio.to_thread(history_codec.encode_rows, rows)
+                await db.execute(insert(models.PromptExecutionHistory), encoded)
+            await record_rollups(db, rows + tracked)
+            await db.commit()
+
+    def _reject(self, row: Dict[str, Any], error: Exception) -> None:
+        """Compter l'échec d'une ligne isolée, l'abandonner après trop d'essais"""
+        execution_id = row["id"]
+        attempts = self._attempts.get(execution_id, 0) + 1
+        if attempts < HISTORY_MAX_ROW_ATTEMPTS:
+            self._attempts[execution_id] = attempts
+            return
+        self._attempts.pop(execution_id, None)
+        if self._buffer.get(execution_id) is row:
+            del self._buffer[execution_id]
+        history_writer_dropped_rows.inc()
+        logger.error(
+            f"Dropping execution {execution_id} (user {row.get('user_id')}, prompt {row.get('prompt_id')}) "
+            f"after {attempts} failed writes: {str(error)}"
+        )
+
+    async def _isolate(self, rows: List[Dict[str, Any]], error: Exception, written: List[Dict[str, Any]]) -> None:
+        """Réécrire par moitiés un lot refusé jusqu'à isoler les lignes en échec"""
+        if len(rows) == 1:
+            self._reject(rows[0], error)
+            return
+        middle = len(rows) // 2
+        for half in (rows[:middle], rows[middle:]):
+            try:
+                await self._write(half, [])
+                written.extend(half)
+            except Exception as e:
+                if _is_transient(e):
+                    raise
+                await self._isolate(half, e, written)
+
+    async def flush(self) -> int:
+        """Insérer toutes les lignes en attente en une seule requête et mettre à jour les rollups"""
+        async with self._flush_lock:
+            if not self._buffer and not self._tracked:
+                return 0
+            rows = list(self._buffer.values())
+            tracked = list(self._tracked)
+            written: List[Dict[str, Any]] = []
+            tracked_done = False
+            try:
+                await self._write(rows, tracked)
+                written, tracked_done = rows, True
+            except Exception as e:
+                if _is_transient(e):
+                    # Base indisponible : lignes conservées pour le prochain essai
+                    logger.error(f"History flush of {len(rows)} rows failed: {str(e)}")
+                    return 0
+                logger.warning(f"History flush of {len(rows)} rows rejected, isolating failing rows: {str(e)}")
+                try:
+                    if tracked:
+                        try:
+                            await self._write([], tracked)
+                        except Exception as tracked_error:
+                            if _is_transient(tracked_error):
+                                raise
+                            # Rollups recalculables par `python -m app.analytics`
+                            logger.error(f"Dropping {len(tracked)} rollup updates: {str(tracked_error)}")
+                    tracked_done = True
+                    if rows:
+                        await self._isolate(rows, e, written)
+                except Exception as retry_error:
+                    logger.error(f"History flush interrupted: {str(retry_error)}")
+
+            if tracked_done:
+                del self._tracked[:len(tracked)]
+            for row in written:
+                self._attempts.pop(row["id"], None)
+                # Une ligne réécrite pendant l'insertion reste en attente
+                if self._buffer.get(row["id"]) is row:
+                    del self._buffer[row["id"]]
+            history_writer_buffered_rows.set(len(self._buffer))
+            return len(written)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrêter la boucle d'écriture puis vider le tampon"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._buffer or self._tracked:
+            logger.error(
+                f"{len(self._buffer)} execution history rows and {len(self._tracked)} rollup updates "
+                "could not be written at shutdown"
+            )
+
+
+history_writer = HistoryWriter()
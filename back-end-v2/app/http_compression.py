@@ -0,0 +1,201 @@
+"""
+Compression HTTP négociée (Brotli, gzip)
+Middleware ASGI : compresse les réponses au-delà d'un seuil de taille et les flux
+(SSE, NDJSON) au fil de l'eau, chaque fragment étant vidé immédiatement
+"""
+
+from typing import Dict, Optional
+import os
+import re
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Brotli optionnel : gzip seul
+    brotli = None
+
+HTTP_COMPRESSION_MIN_BYTES = int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+HTTP_COMPRESSION_GZIP_LEVEL = int(os.getenv("HTTP_COMPRESSION_GZIP_LEVEL", "6"))
+HTTP_COMPRESSION_BROTLI_QUALITY = int(os.getenv("HTTP_COMPRESSION_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Suffixe ajouté aux ETag forts des représentations compressées
+_ETAG_SUFFIX = re.compile(r'-(gzip|br)"')
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    """Encodages d'un en-tête Accept-Encoding et leur qualité"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Vrai si le client accepte `encoding` (qualité non nulle)"""
+    accepted = _accepted(accept_encoding)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Encodage préféré parmi ceux acceptés (br puis gzip), None pour identity"""
+    accepted = _accepted(accept_encoding)
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    candidates = [
+        (accepted.get(encoding, accepted.get("*", 0.0)), -index, encoding)
+        for index, encoding in enumerate(supported)
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=HTTP_COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(HTTP_COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b"")
+        return self._zlib.compress(data) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Compression des réponses selon Accept-Encoding
+
+    Les réponses déjà encodées, les statuts sans corps, les types non textuels et
+    les réponses complètes de moins de `minimum_size` octets sont transmis tels
+    quels. Les ETag forts des réponses compressées reçoivent un suffixe
+    (`"…-gzip"`) ; il est retiré de If-None-Match avant d'atteindre les routes,
+    qui comparent toujours l'ETag de la représentation non compressée.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = HTTP_COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        validated_encoding = None
+        if "if-none-match" in request_headers:
+            # Un 304 renvoie l'ETag de la représentation que le client possède
+            suffixes = _ETAG_SUFFIX.findall(request_headers["if-none-match"])
+            validated_encoding = encoding if encoding in suffixes else None
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, _ETAG_SUFFIX.sub('"', value.decode("latin-1")).encode("latin-1") if name == b"if-none-match" else value)
+                for name, value in scope["headers"]
+            ]
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponder(self.app, encoding, self.minimum_size, validated_encoding)(scope, receive, send)
+
+
+class _CompressedResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int, validated_encoding: Optional[str] = None):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.validated_encoding = validated_encoding
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _compressible(self, headers: Headers) -> bool:
+        status = self.start_message["status"]
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _suffix_etag(self, headers: MutableHeaders) -> None:
+        etag = headers.get("etag")
+        # Un ETag déjà suffixé vient d'une représentation encodée par la route
+        if etag and not etag.startswith("W/") and etag.endswith('"') and not _ETAG_SUFFIX.search(etag):
+            headers["ETag"] = f'{etag[:-1]}-{self.encoding}"'
+
+    def _set_encoding_headers(self, content_length: Optional[int]) -> None:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        self._suffix_etag(headers)
+        if content_length is None:
+            del headers["content-length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+
+    async def send_wrapper(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._compressible(Headers(raw=message["headers"]))
+            if message["status"] == 304 and self.validated_encoding:
+                self._suffix_etag(MutableHeaders(raw=message["headers"]))
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                # Réponse complète : compressée seulement au-delà du seuil
+                if len(body) < self.minimum_size:
+                    MutableHeaders(raw=self.start_message["headers"]).add_vary_header("Accept-Encoding")
+                    await self.send(self.start_message)
+                    await self.send(message)
+                    return
+                compressor = _Compressor(self.encoding)
+                data = compressor.compress(body, flush=False) + compressor.finish()
+                self._set_encoding_headers(len(data))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            # Flux : chaque fragment est vidé pour ne pas retarder les événements
+            self.compressor = _Compressor(self.encoding)
+            self._set_encoding_headers(None)
+            await self.send(self.start_message)
+
+        if more_body:
+            data = self.compressor.compress(body, flush=True)
+            if data:
+                await self.send({"type": "http.response.body", "body": data, "more_body": True})
+        else:
+            data = self.compressor.compress(body, flush=False) + self.compressor.finish()
+            await self.send({"type": "http.response.body", "body": data})
@@ -0,0 +1,183 @@
+"""
+File d'attente des exécutions de prompts en mode job
+Backends Redis et en mémoire (fallback pour le développement et les tests)
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue(ABC):
+    """Classe abstraite pour les files d'attente de jobs"""
+
+    @abstractmethod
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        """Ajouter un job à la file"""
+        pass
+
+    @abstractmethod
+    async def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Retirer le prochain job (None si la file reste vide pendant `timeout` secondes)"""
+        pass
+
+    @abstractmethod
+    async def notify_done(self, job_id: int) -> None:
+        """Signaler la fin d'un job aux clients abonnés"""
+        pass
+
+    @abstractmethod
+    async def wait_done(self, job_id: int, timeout: float) -> bool:
+        """Attendre la fin d'un job (False si `timeout` est dépassé)"""
+        pass
+
+    async def close(self) -> None:
+        """Libérer les ressources du backend"""
+        pass
+
+
+class InMemoryJobQueue(JobQueue):
+    """File d'attente locale au processus"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._done_events: Dict[int, asyncio.Event] = {}
+
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        await self._queue.put(job)
+
+    async def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def notify_done(self, job_id: int) -> None:
+        event = self._done_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait_done(self, job_id: int, timeout: float) -> bool:
+        event = self._done_events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class RedisJobQueue(JobQueue):
+    """File d'attente partagée entre les workers, stockée dans Redis"""
+
+    QUEUE_KEY = "jobs:prompt-executions"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+
+    @staticmethod
+    def _done_channel(job_id: int) -> str:
+        return f"jobs:done:{job_id}"
+
+    async def enqueue(self, job: Dict[str, Any]) -> None:
+        await self.client.rpush(self.QUEUE_KEY, json.dumps(job))
+
+    async def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        item = await self.client.blpop(self.QUEUE_KEY, timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        _, raw = item
+        return json.loads(raw)
+
+    async def notify_done(self, job_id: int) -> None:
+        await self.client.publish(self._done_channel(job_id), "done")
+
+    async def wait_done(self, job_id: int, timeout: float) -> bool:
+        pubsub = self.client.pubsub()
+        try:
+            await pubsub.subscribe(self._done_channel(job_id))
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while loop.time() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=deadline - loop.time()
+                )
+                if message is not None:
+                    return True
+            return False
+        finally:
+            await pubsub.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class JobWorkerPool:
+    """Pool de workers asyncio qui vident la file d'attente"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        concurrency: int = 4
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+
+    async def start(self) -> None:
+        self._running = True
+        self._tasks = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.concurrency)
+        ]
+        logger.info(f"Started {self.concurrency} job workers")
+
+    async def stop(self) -> None:
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int) -> None:
+        while self._running:
+            try:
+                job = await self.queue.dequeue(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} dequeue error: {str(e)}")
+                await asyncio.sleep(1.0)
+                continue
+
+            if job is None:
+                continue
+
+            try:
+                await self.handler(job)
+            except Exception as e:
+                logger.error(f"Job {job.get('execution_id')} failed in worker {index}: {str(e)}")
+            finally:
+                await self.queue.notify_done(job["execution_id"])
+
+
+# Configuration de la file d'attente
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")  # memory, redis
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+
+def create_job_queue() -> JobQueue:
+    """Créer la file d'attente des jobs selon la configuration"""
+    if JOB_QUEUE_BACKEND == "redis":
+        return RedisJobQueue(url=os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryJobQueue()
@@ -0,0 +1,75 @@
+"""
+Suivi des latences des providers LLM
+Moyennes mobiles exponentielles (EWMA) et fenêtre glissante par provider/modèle
+"""
+
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import os
+import threading
+
+LATENCY_EWMA_ALPHA = float(os.getenv("LATENCY_EWMA_ALPHA", "0.2"))
+LATENCY_WINDOW_SIZE = int(os.getenv("LATENCY_WINDOW_SIZE", "200"))
+
+
+class LatencyStats:
+    """Statistiques de latence d'un couple provider/modèle"""
+
+    __slots__ = ("ewma_seconds", "ewma_seconds_per_output_token", "samples")
+
+    def __init__(self, window_size: int):
+        self.ewma_seconds: Optional[float] = None
+        self.ewma_seconds_per_output_token: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=window_size)
+
+
+class LatencyTracker:
+    """Latences observées des appels LLM, par provider et par modèle"""
+
+    def __init__(self, alpha: float = LATENCY_EWMA_ALPHA, window_size: int = LATENCY_WINDOW_SIZE):
+        self.alpha = alpha
+        self.window_size = window_size
+        self._stats: Dict[Tuple[str, str], LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ewma(previous: Optional[float], value: float, alpha: float) -> float:
+        return value if previous is None else alpha * value + (1 - alpha) * previous
+
+    def record(self, provider: str, model: str, seconds: float, output_tokens: int = 0) -> None:
+        """Enregistrer la durée d'un appel réussi"""
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None:
+                stats = LatencyStats(self.window_size)
+                self._stats[(provider, model)] = stats
+
+            stats.ewma_seconds = self._ewma(stats.ewma_seconds, seconds, self.alpha)
+            if output_tokens > 0:
+                stats.ewma_seconds_per_output_token = self._ewma(
+                    stats.ewma_seconds_per_output_token, seconds / output_tokens, self.alpha
+                )
+            stats.samples.append(seconds)
+
+    def ewma(self, provider: str, model: str) -> Optional[float]:
+        """Latence moyenne récente (None sans observation)"""
+        stats = self._stats.get((provider, model))
+        return stats.ewma_seconds if stats is not None else None
+
+    def seconds_per_output_token(self, provider: str, model: str) -> Optional[float]:
+        """Durée moyenne récente par token généré (None sans observation)"""
+        stats = self._stats.get((provider, model))
+        return stats.ewma_seconds_per_output_token if stats is not None else None
+
+    def percentile(self, provider: str, model: str, percentile: float) -> Optional[float]:
+        """Percentile des latences de la fenêtre glissante (None sans observation)"""
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None or not stats.samples:
+                return None
+            ordered = sorted(stats.samples)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+latency_tracker = LatencyTracker()
@@ -4,19 +4,54 @@ Support pour OpenAI, Gemini, Claude
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator
 import os
+import asyncio
 import logging
+import random
+from functools import partial
+import httpx
 from openai import AsyncOpenAI
 import google.generativeai as genai
 from anthropic import AsyncAnthropic
 
+from .pricing import pricing_table
+from .tokens import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
 
+def build_http_client(provider_name: str) -> httpx.AsyncClient:
+    """
+    Construire le client HTTP partagé d'un provider
+
+    Les limites du pool de connexions keep-alive sont configurables par
+    provider, par exemple OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS
+    et OPENAI_KEEPALIVE_EXPIRY.
+    """
+    prefix = provider_name.upper()
+    limits = httpx.Limits(
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY", "30")),
+    )
+    return httpx.AsyncClient(limits=limits)
+
+
+def _usage(input_tokens: int, output_tokens: int) -> Dict[str, int]:
+    return {
+        "tokens_used": input_tokens + output_tokens,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+    }
+
+
 class LLMProvider(ABC):
     """Classe abstraite pour les fournisseurs LLM"""
     
+    # Nom du provider dans LLMFactory et la table des tarifs
+    name: str = ""
+    
     @abstractmethod
     async def execute(
         self,
@@ -32,31 +67,61 @@ class LLMProvider(ABC):
             Dict contenant:
             - output: str - Le texte généré
             - tokens_used: int - Nombre de tokens utilisés
+            - input_tokens: int - Tokens du prompt
+            - output_tokens: int - Tokens générés
             - model: str - Modèle utilisé
         """
         pass
     
-    @abstractmethod
-    def calculate_cost(self, tokens: int, model: str) -> float:
-        """Calculer le coût en USD pour un nombre de tokens"""
+    async def stream(
+        self,
+        prompt: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Exécuter un prompt en streaming
+        
+        Yields:
+            Dict de type "delta" (text: fragment généré) au fil de la génération,
+            puis un dernier Dict de type "usage" (tokens_used, input_tokens, output_tokens)
+        
+        Par défaut, la réponse complète est transmise en un seul fragment.
+        """
+        result = await self.execute(
+            prompt=prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        yield {"type": "delta", "text": result["output"]}
+        yield {
+            "type": "usage",
+            "tokens_used": result["tokens_used"],
+            "input_tokens": result["input_tokens"],
+            "output_tokens": result["output_tokens"]
+        }
+    
+    def calculate_cost(self, input_tokens: int, output_tokens: int, model: str) -> float:
+        """Calculer le coût en USD d'un appel à partir de la table des tarifs"""
+        return pricing_table.cost(self.name, model, input_tokens, output_tokens)
+    
+    async def close(self) -> None:
+        """Libérer les connexions du provider"""
         pass
 
 
 class OpenAIProvider(LLMProvider):
     """Provider pour OpenAI (GPT-4, GPT-3.5, etc.)"""
     
+    name = "openai"
+    
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
-        self.client = AsyncOpenAI(api_key=api_key)
-        
-        # Tarifs par modèle (USD par 1000 tokens)
-        self.pricing = {
-            "gpt-4": {"input": 0.03, "output": 0.06},
-            "gpt-4-turbo": {"input": 0.01, "output": 0.03},
-            "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015},
-        }
+        self.client = AsyncOpenAI(api_key=api_key, http_client=build_http_client("openai"))
     
     async def execute(
         self,
@@ -75,45 +140,79 @@ class OpenAIProvider(LLMProvider):
                 max_tokens=max_tokens
             )
             
+            output = response.choices[0].message.content
+            if response.usage is not None:
+                usage = _usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+            else:
+                usage = _usage(estimate_tokens(prompt, model), estimate_tokens(output, model))
+            
             return {
-                "output": response.choices[0].message.content,
-                "tokens_used": response.usage.total_tokens,
+                "output": output,
+                **usage,
                 "model": model
             }
         except Exception as e:
             logger.error(f"OpenAI execution error: {str(e)}")
             raise
     
-    def calculate_cost(self, tokens: int, model: str) -> float:
-        if model not in self.pricing:
-            # Utiliser le tarif de gpt-4 par défaut
-            model = "gpt-4"
-        
-        # Approximation: 75% input, 25% output
-        input_tokens = int(tokens * 0.75)
-        output_tokens = int(tokens * 0.25)
-        
-        cost = (
-            (input_tokens / 1000) * self.pricing[model]["input"] +
-            (output_tokens / 1000) * self.pricing[model]["output"]
-        )
-        return round(cost, 6)
+    async def stream(
+        self,
+        prompt: str,
+        model: str = "gpt-4",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            
+            output_parts = []
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    output_parts.append(text)
+                    yield {"type": "delta", "text": text}
+            
+            # Estimation des tokens (l'API ne renvoie pas l'usage en streaming)
+            yield {
+                "type": "usage",
+                **_usage(estimate_tokens(prompt, model), estimate_tokens("".join(output_parts), model))
+            }
+        except Exception as e:
+            logger.error(f"OpenAI streaming error: {str(e)}")
+            raise
+    
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def _gemini_usage(response: Any, prompt: str, output: str, model: str) -> Dict[str, int]:
+    """Usage renvoyé par Gemini, ou estimation locale lorsqu'il est absent"""
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is not None and getattr(usage_metadata, "prompt_token_count", None):
+        return _usage(usage_metadata.prompt_token_count, usage_metadata.candidates_token_count or 0)
+    return _usage(estimate_tokens(prompt, model), estimate_tokens(output, model))
 
 
 class GeminiProvider(LLMProvider):
     """Provider pour Google Gemini"""
     
+    name = "gemini"
+    
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable not set")
         genai.configure(api_key=api_key)
-        
-        # Tarifs Gemini (USD par 1000 tokens)
-        self.pricing = {
-            "gemini-pro": {"input": 0.00025, "output": 0.0005},
-            "gemini-2.5-flash": {"input": 0.000075, "output": 0.0003},
-        }
     
     async def execute(
         self,
@@ -134,48 +233,63 @@ class GeminiProvider(LLMProvider):
                 generation_config=generation_config
             )
             
-            # Estimation des tokens (Gemini ne fournit pas toujours le compte exact)
-            tokens_used = len(prompt.split()) + len(response.text.split())
-            
             return {
                 "output": response.text,
-                "tokens_used": tokens_used,
+                **_gemini_usage(response, prompt, response.text, model),
                 "model": model
             }
         except Exception as e:
             logger.error(f"Gemini execution error: {str(e)}")
             raise
     
-    def calculate_cost(self, tokens: int, model: str) -> float:
-        if model not in self.pricing:
-            model = "gemini-pro"
-        
-        # Approximation: 75% input, 25% output
-        input_tokens = int(tokens * 0.75)
-        output_tokens = int(tokens * 0.25)
-        
-        cost = (
-            (input_tokens / 1000) * self.pricing[model]["input"] +
-            (output_tokens / 1000) * self.pricing[model]["output"]
-        )
-        return round(cost, 6)
+    async def stream(
+        self,
+        prompt: str,
+        model: str = "gemini-pro",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            generation_config = {
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            }
+            
+            model_instance = genai.GenerativeModel(model)
+            response = await model_instance.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+            
+            output_parts = []
+            last_chunk = None
+            async for chunk in response:
+                last_chunk = chunk
+                text = chunk.text
+                if text:
+                    output_parts.append(text)
+                    yield {"type": "delta", "text": text}
+            
+            yield {
+                "type": "usage",
+                **_gemini_usage(last_chunk, prompt, "".join(output_parts), model)
+            }
+        except Exception as e:
+            logger.error(f"Gemini streaming error: {str(e)}")
+            raise
 
 
 class ClaudeProvider(LLMProvider):
     """Provider pour Anthropic Claude"""
     
+    name = "claude"
+    
     def __init__(self):
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-        self.client = AsyncAnthropic(api_key=api_key)
-        
-        # Tarifs Claude (USD par 1000 tokens)
-        self.pricing = {
-            "claude-3-opus-20240229": {"input": 0.015, "output": 0.075},
-            "claude-3-sonnet-20240229": {"input": 0.003, "output": 0.015},
-            "claude-3-haiku-20240307": {"input": 0.00025, "output": 0.00125},
-        }
+        self.client = AsyncAnthropic(api_key=api_key, http_client=build_http_client("anthropic"))
     
     async def execute(
         self,
@@ -196,41 +310,151 @@ class ClaudeProvider(LLMProvider):
             
             return {
                 "output": response.content[0].text,
-                "tokens_used": response.usage.input_tokens + response.usage.output_tokens,
+                **_usage(response.usage.input_tokens, response.usage.output_tokens),
                 "model": model
             }
         except Exception as e:
             logger.error(f"Claude execution error: {str(e)}")
             raise
     
-    def calculate_cost(self, tokens: int, model: str) -> float:
-        if model not in self.pricing:
-            model = "claude-3-sonnet-20240229"
-        
-        # Approximation: 75% input, 25% output
-        input_tokens = int(tokens * 0.75)
-        output_tokens = int(tokens * 0.25)
+    async def stream(
+        self,
+        prompt: str,
+        model: str = "claude-3-sonnet-20240229",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = 1024
+    ) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            response = await self.client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True
+            )
+            
+            input_tokens = 0
+            output_tokens = 0
+            async for event in response:
+                if event.type == "message_start":
+                    input_tokens = event.message.usage.input_tokens
+                elif event.type == "content_block_delta":
+                    text = getattr(event.delta, "text", None)
+                    if text:
+                        yield {"type": "delta", "text": text}
+                elif event.type == "message_delta":
+                    output_tokens = event.usage.output_tokens
+            
+            yield {"type": "usage", **_usage(input_tokens, output_tokens)}
+        except Exception as e:
+            logger.error(f"Claude streaming error: {str(e)}")
+            raise
+    
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class MockProvider(LLMProvider):
+    """
+    Provider simulé pour le développement, les benchmarks et les tests de routage
+    
+    Répond après une latence fixe et échoue avec une probabilité donnée,
+    sans appel réseau.
+    """
+    
+    def __init__(self, name: str = "mock", latency: float = 0.0, failure_rate: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+    
+    async def execute(
+        self,
+        prompt: str,
+        model: str = "mock",
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError(f"Simulated failure of mock provider '{self.name}'")
         
-        cost = (
-            (input_tokens / 1000) * self.pricing[model]["input"] +
-            (output_tokens / 1000) * self.pricing[model]["output"]
-        )
-        return round(cost, 6)
+        output = f"[{self.name}/{model}] {prompt[:200]}"
+        return {
+            "output": output,
+            **_usage(estimate_tokens(prompt, model), estimate_tokens(output, model)),
+            "model": model
+        }
+
+
+def _mock_providers_from_env() -> Dict[str, Any]:
+    """
+    Providers simulés déclarés dans LLM_MOCK_PROVIDERS
+    
+    Format : "nom:latence[:taux_echec],..." (ex. "mock-fast:0.05,mock-slow:2:0.1")
+    """
+    providers = {}
+    for entry in filter(None, (item.strip() for item in os.getenv("LLM_MOCK_PROVIDERS", "").split(","))):
+        name, *options = entry.split(":")
+        latency = float(options[0]) if options else 0.0
+        failure_rate = float(options[1]) if len(options) > 1 else 0.0
+        providers[name] = partial(MockProvider, name, latency, failure_rate)
+    return providers
 
 
 class LLMFactory:
-    """Factory pour obtenir le bon provider LLM"""
+    """
+    Registre des providers LLM
+
+    Chaque provider est instancié une seule fois (au démarrage de l'application
+    ou au premier appel) puis partagé entre les requêtes, ce qui réutilise les
+    connexions keep-alive de son client HTTP.
+    """
     
     _providers = {
         "openai": OpenAIProvider,
         "gemini": GeminiProvider,
         "claude": ClaudeProvider,
+        **_mock_providers_from_env(),
+    }
+    
+    # Préfixe des variables d'environnement de chaque provider
+    _env_prefixes = {
+        "openai": "OPENAI",
+        "gemini": "GEMINI",
+        "claude": "ANTHROPIC",
     }
     
+    _instances: Dict[str, LLMProvider] = {}
+    _semaphores: Dict[str, asyncio.Semaphore] = {}
+    
+    @classmethod
+    async def startup(cls) -> None:
+        """Instancier les providers configurés (appelé au démarrage de l'application)"""
+        for name in cls._providers:
+            try:
+                cls.get_provider(name)
+                logger.info(f"LLM provider '{name}' initialized")
+            except ValueError as e:
+                # Provider non configuré : il sera indisponible jusqu'au prochain démarrage
+                logger.warning(f"LLM provider '{name}' not initialized: {str(e)}")
+    
+    @classmethod
+    async def shutdown(cls) -> None:
+        """Fermer proprement les clients des providers (appelé à l'arrêt de l'application)"""
+        instances = list(cls._instances.items())
+        cls._instances.clear()
+        for name, provider in instances:
+            try:
+                await provider.close()
+            except Exception as e:
+                logger.error(f"Error closing LLM provider '{name}': {str(e)}")
+    
     @classmethod
     def get_provider(cls, name: str) -> LLMProvider:
         """
-        Obtenir une instance du provider LLM
+        Obtenir l'instance partagée du provider LLM
         
         Args:
             name: Nom du provider ("openai", "gemini", "claude")
@@ -239,7 +463,7 @@ class LLMFactory:
             Instance du provider
         
         Raises:
-            ValueError: Si le provider n'existe pas
+            ValueError: Si le provider n'existe pas ou n'est pas configuré
         """
         if name not in cls._providers:
             raise ValueError(
@@ -247,10 +471,28 @@ class LLMFactory:
                 f"Available providers: {', '.join(cls._providers.keys())}"
             )
         
-        return cls._providers[name]()
+        provider = cls._instances.get(name)
+        if provider is None:
+            provider = cls._providers[name]()
+            cls._instances[name] = provider
+        return provider
+    
+    @classmethod
+    def get_semaphore(cls, name: str) -> asyncio.Semaphore:
+        """
+        Obtenir le sémaphore limitant les appels concurrents vers un provider
+        
+        La limite se configure par provider, par exemple OPENAI_MAX_CONCURRENCY
+        ou ANTHROPIC_MAX_CONCURRENCY (8 par défaut).
+        """
+        semaphore = cls._semaphores.get(name)
+        if semaphore is None:
+            prefix = cls._env_prefixes.get(name, name.upper())
+            semaphore = asyncio.Semaphore(int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "8")))
+            cls._semaphores[name] = semaphore
+        return semaphore
     
     @classmethod
     def list_providers(cls) -> list:
         """Liste des providers disponibles"""
         return list(cls._providers.keys())
-
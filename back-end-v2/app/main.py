@@ -3,26 +3,52 @@ PIVORI Studio Backend API - Version 2.0
 Backend FastAPI amélioré avec corrections critiques
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status, BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload, undefer
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Sequence, Set, Tuple
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 import os
 import time
+import math
+import asyncio
+import gzip
 import hashlib
-import json
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 import logging
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 
 from . import models, schemas
-from .database import SessionLocal, engine
+from .database import SessionLocal, AsyncSessionLocal, engine, async_engine
 from .llm_providers import LLMFactory, LLMProvider
 from .validators import validate_variables_against_schema
+from .templates import CompiledTemplate, get_compiled_template
+from .pricing import pricing_table, DEFAULT_MODELS
+from .budget import check_context_budget, estimate_execution_budget
+from .latency import latency_tracker
+from .routing import llm_router
+from .rate_limit import RATE_LIMIT_SCOPES, RateLimitExceeded, create_rate_limiter
+from .tokens import estimate_tokens, preload_encodings
+from .principals import UserPrincipal, principal_cache
+from .pagination import decode_cursor, keyset_page, next_cursor
+from . import passwords
+from .cache import build_cache_key, create_response_cache, is_cacheable
+from . import catalog_cache as catalog
+from .search import create_search_index
+from .embeddings import create_embedding_index
+from .jobs import JobWorkerPool, create_job_queue, JOB_WORKERS
+from .history_writer import history_writer
+from . import analytics
+from .archive import ensure_partitions, history_archive
+from .compression import history_codec
+from .serialization import ORJSONResponse, dumps, serialize_rows
+from .conditional import conditional_response, etag_matches
+from .http_compression import CompressionMiddleware, accepts_encoding
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -36,8 +62,6 @@ SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Configuration des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # Métriques Prometheus
@@ -53,6 +77,12 @@ prompt_execution_duration = Histogram(
     ['prompt_id', 'llm_provider']
 )
 
+prompt_time_to_first_token = Histogram(
+    'prompt_time_to_first_token_seconds',
+    'Time to first token of streamed prompt executions',
+    ['prompt_id', 'llm_provider']
+)
+
 llm_tokens_used = Counter(
     'llm_tokens_used_total',
     'Total tokens used',
@@ -70,11 +100,95 @@ active_executions = Gauge(
     'Number of currently active executions'
 )
 
+llm_routing_decisions = Counter(
+    'llm_routing_decisions_total',
+    'LLM provider chosen by the routing policy',
+    ['policy', 'llm_provider', 'hedged']
+)
+
+llm_circuit_breaker_open = Gauge(
+    'llm_circuit_breaker_open',
+    'Whether the circuit breaker of an LLM provider is open (1) or not (0)',
+    ['llm_provider']
+)
+
+llm_response_cache_requests = Counter(
+    'llm_response_cache_requests_total',
+    'LLM response cache lookups',
+    ['llm_provider', 'result']
+)
+
+# Cache des réponses LLM (None si désactivé)
+response_cache = create_response_cache()
+
+# Cache de lecture du catalogue (None si désactivé)
+catalog_cache = catalog.create_catalog_cache()
+
+# Index de recherche des prompts experts
+search_index = create_search_index()
+
+# Index des embeddings des prompts experts (recherche sémantique)
+embedding_index = create_embedding_index()
+
+# Contrôle d'admission des exécutions (None si désactivé)
+rate_limiter = create_rate_limiter()
+
+# File d'attente des exécutions en mode job
+job_queue = create_job_queue()
+JOB_EVENTS_KEEPALIVE = 15.0
+
+# Tâches détachées d'une requête annulée (référencées jusqu'à leur fin)
+_background_tasks: Set[asyncio.Task] = set()
+
+# Cycle de vie de l'application
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Créer les clients LLM une seule fois au démarrage
+    await LLMFactory.startup()
+    # Partitions mensuelles de l'historique (PostgreSQL partitionné uniquement) ;
+    # sans elles, les lignes vont dans la partition par défaut
+    try:
+        await asyncio.to_thread(ensure_partitions, engine)
+    except Exception as e:
+        logger.error(f"Could not create execution history partitions: {str(e)}")
+    # Dictionnaires de compression de l'historique
+    await asyncio.to_thread(history_codec.load_dictionaries)
+    # Tokenizer chargé (ou téléchargé) une fois, hors des requêtes
+    await asyncio.to_thread(preload_encodings)
+    # Charger les tarifs des modèles puis surveiller leurs changements
+    await asyncio.to_thread(pricing_table.refresh, True)
+    pricing_refresher = asyncio.create_task(pricing_table.run_refresh_loop())
+    await search_index.startup()
+    await embedding_index.startup()
+    job_workers = JobWorkerPool(job_queue, _run_job, concurrency=JOB_WORKERS)
+    await job_workers.start()
+    await history_writer.start()
+    try:
+        yield
+    finally:
+        pricing_refresher.cancel()
+        await job_workers.stop()
+        await job_queue.close()
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+        # Écrire l'historique encore en mémoire avant de fermer le moteur
+        await history_writer.stop()
+        await LLMFactory.shutdown()
+        passwords.shutdown()
+        if rate_limiter is not None:
+            await rate_limiter.close()
+        if response_cache is not None:
+            await response_cache.close()
+        if catalog_cache is not None:
+            await catalog_cache.close()
+        await async_engine.dispose()
+
 # Application FastAPI
 app = FastAPI(
     title="PIVORI Studio API",
     description="API Backend pour la plateforme de Prompt Engineering",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configuration CORS
@@ -84,8 +198,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compression négociée (Brotli / gzip) des réponses et des flux
+app.add_middleware(CompressionMiddleware)
+
 # Dépendance pour la base de données
 def get_db():
     db = SessionLocal()
@@ -94,13 +212,12 @@ def get_db():
     finally:
         db.close()
 
-# Fonctions d'authentification
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# Session asynchrone pour les routes async (ne bloque pas la boucle d'événements)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
+# Fonctions d'authentification
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -111,10 +228,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def _load_principal(user_id: int) -> Optional[UserPrincipal]:
+    """Lire l'utilisateur en base (session courte, uniquement en cas d'absence du cache)"""
+    async with AsyncSessionLocal() as db:
+        user = await db.get(models.User, user_id)
+        return UserPrincipal.from_user(user) if user is not None else None
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> UserPrincipal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -126,44 +248,56 @@ async def get_current_user(
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        user_id = int(user_id)
+    except (JWTError, ValueError):
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = await _load_principal(user_id)
+        if principal is None:
+            raise credentials_exception
+        principal_cache.set(principal)
+    return principal
 
 # Routes d'authentification
 @app.post("/api/v1/auth/register", response_model=schemas.UserResponse, tags=["Authentication"])
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Créer un nouveau compte utilisateur"""
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await passwords.hash_password(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @app.post("/api/v1/auth/login", response_model=schemas.Token, tags=["Authentication"])
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Se connecter et obtenir un token JWT"""
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
+    valid = False
+    if db_user:
+        valid, new_hash = await passwords.verify_password(user.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if new_hash:
+        # Paramètres de hachage modifiés : remplacer le hash stocké
+        db_user.hashed_password = new_hash
+        await db.commit()
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(db_user.id)}, expires_delta=access_token_expires
@@ -171,211 +305,743 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/api/v1/auth/me", response_model=schemas.UserResponse, tags=["Authentication"])
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: UserPrincipal = Depends(get_current_user)):
     """Obtenir les informations de l'utilisateur connecté"""
     return current_user
 
+# Lecture du catalogue (réponses pré-sérialisées, ETag et cache)
+async def _catalog_response(
+    request: Request,
+    namespace: str,
+    key: str,
+    load: Callable[[], Awaitable[bytes]],
+    compressed: bool = False
+) -> Response:
+    """
+    Servir une lecture du catalogue depuis le cache, ou la charger puis la mettre en cache
+    
+    Répond 304 sans corps lorsque l'ETag correspond à l'en-tête If-None-Match.
+    Avec `compressed`, la réponse est conservée compressée (gzip) et envoyée
+    telle quelle aux clients qui l'acceptent.
+    """
+    entry = await catalog_cache.get(namespace, key) if catalog_cache is not None else None
+    if entry is None:
+        generation = await catalog_cache.generation(namespace) if catalog_cache is not None else 0
+        body = await load()
+        if compressed:
+            # mtime=0 : même contenu, mêmes octets et même ETag
+            body = await asyncio.to_thread(gzip.compress, body, 6, mtime=0)
+        if catalog_cache is not None:
+            entry = await catalog_cache.set(namespace, key, body, generation)
+        else:
+            entry = catalog.CatalogEntry(body)
+    
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    send_gzip = compressed and accepts_encoding(request.headers.get("accept-encoding", ""), "gzip")
+    if compressed:
+        headers["Vary"] = "Accept-Encoding"
+    if send_gzip:
+        # Représentation gzip : même convention d'ETag que le CompressionMiddleware,
+        # y compris dans les 304 (le middleware retire le suffixe de If-None-Match)
+        headers["ETag"] = entry.etag[:-1] + '-gzip"'
+        headers["Content-Encoding"] = "gzip"
+    if etag_matches(request, entry.etag):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if compressed and not send_gzip:
+        # Décompressée ici, éventuellement recompressée (br) et suffixée par le middleware
+        return Response(content=gzip.decompress(entry.body), media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+async def _invalidate_catalog(*namespaces: str) -> None:
+    if catalog_cache is not None:
+        for namespace in namespaces:
+            await catalog_cache.invalidate(namespace)
+
 # Routes pour les Spécialités
 @app.get("/api/v1/specialties", response_model=List[schemas.SpecialtyResponse], tags=["Specialties"])
-def get_specialties(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_specialties(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
     """Récupérer la liste des spécialités"""
-    specialties = db.query(models.Specialty).offset(skip).limit(limit).all()
-    return specialties
+    async def load() -> bytes:
+        specialties = (await db.scalars(
+            select(models.Specialty).order_by(models.Specialty.id).offset(skip).limit(limit)
+        )).all()
+        return serialize_rows(schemas.SpecialtyResponse, list(specialties))
+    
+    return await _catalog_response(request, catalog.SPECIALTIES, catalog.catalog_key(skip=skip, limit=limit), load)
 
 @app.post("/api/v1/specialties", response_model=schemas.SpecialtyResponse, tags=["Specialties"])
-def create_specialty(
+async def create_specialty(
     specialty: schemas.SpecialtyCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Créer une nouvelle spécialité"""
     db_specialty = models.Specialty(**specialty.dict())
     db.add(db_specialty)
-    db.commit()
-    db.refresh(db_specialty)
+    await db.commit()
+    await db.refresh(db_specialty)
+    await _invalidate_catalog(catalog.SPECIALTIES, catalog.CATALOG_TREE)
     return db_specialty
 
 @app.get("/api/v1/specialties/{specialty_id}", response_model=schemas.SpecialtyResponse, tags=["Specialties"])
-def get_specialty(specialty_id: int, db: Session = Depends(get_db)):
+async def get_specialty(specialty_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Récupérer une spécialité par ID"""
-    specialty = db.query(models.Specialty).filter(models.Specialty.id == specialty_id).first()
-    if specialty is None:
-        raise HTTPException(status_code=404, detail="Specialty not found")
-    return specialty
+    async def load() -> bytes:
+        specialty = await db.get(models.Specialty, specialty_id)
+        if specialty is None:
+            raise HTTPException(status_code=404, detail="Specialty not found")
+        return serialize_rows(schemas.SpecialtyResponse, specialty)
+    
+    return await _catalog_response(request, catalog.SPECIALTIES, catalog.catalog_key(id=specialty_id), load)
 
 # Routes pour les Sous-spécialités
 @app.get("/api/v1/sub-specialties", response_model=List[schemas.SubSpecialtyResponse], tags=["Sub-Specialties"])
-def get_sub_specialties(
+async def get_sub_specialties(
+    request: Request,
     specialty_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupérer la liste des sous-spécialités"""
-    query = db.query(models.SubSpecialty)
-    if specialty_id:
-        query = query.filter(models.SubSpecialty.specialty_id == specialty_id)
-    sub_specialties = query.offset(skip).limit(limit).all()
-    return sub_specialties
+    async def load() -> bytes:
+        query = select(models.SubSpecialty)
+        if specialty_id:
+            query = query.where(models.SubSpecialty.specialty_id == specialty_id)
+        sub_specialties = (await db.scalars(
+            query.order_by(models.SubSpecialty.id).offset(skip).limit(limit)
+        )).all()
+        return serialize_rows(schemas.SubSpecialtyResponse, list(sub_specialties))
+    
+    key = catalog.catalog_key(specialty_id=specialty_id, skip=skip, limit=limit)
+    return await _catalog_response(request, catalog.SUB_SPECIALTIES, key, load)
 
 @app.post("/api/v1/sub-specialties", response_model=schemas.SubSpecialtyResponse, tags=["Sub-Specialties"])
-def create_sub_specialty(
+async def create_sub_specialty(
     sub_specialty: schemas.SubSpecialtyCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Créer une nouvelle sous-spécialité"""
     db_sub_specialty = models.SubSpecialty(**sub_specialty.dict())
     db.add(db_sub_specialty)
-    db.commit()
-    db.refresh(db_sub_specialty)
+    await db.commit()
+    await db.refresh(db_sub_specialty)
+    await _invalidate_catalog(catalog.SUB_SPECIALTIES, catalog.CATALOG_TREE)
     return db_sub_specialty
 
 # Routes pour les Prompts Experts
 @app.get("/api/v1/expert-prompts", response_model=List[schemas.ExpertPromptResponse], tags=["Expert Prompts"])
-def get_expert_prompts(
+async def get_expert_prompts(
+    request: Request,
     sub_specialty_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupérer la liste des prompts experts"""
-    query = db.query(models.ExpertPrompt)
-    if sub_specialty_id:
-        query = query.filter(models.ExpertPrompt.sub_specialty_id == sub_specialty_id)
-    prompts = query.offset(skip).limit(limit).all()
-    return prompts
+    async def load() -> bytes:
+        query = select(models.ExpertPrompt)
+        if sub_specialty_id:
+            query = query.where(models.ExpertPrompt.sub_specialty_id == sub_specialty_id)
+        prompts = (await db.scalars(
+            query.order_by(models.ExpertPrompt.id).offset(skip).limit(limit)
+        )).all()
+        return serialize_rows(schemas.ExpertPromptResponse, list(prompts))
+    
+    key = catalog.catalog_key(sub_specialty_id=sub_specialty_id, skip=skip, limit=limit)
+    return await _catalog_response(request, catalog.EXPERT_PROMPTS, key, load)
 
 @app.get("/api/v1/expert-prompts/{prompt_id}", response_model=schemas.ExpertPromptResponse, tags=["Expert Prompts"])
-def get_expert_prompt(prompt_id: int, db: Session = Depends(get_db)):
+async def get_expert_prompt(prompt_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Récupérer un prompt expert par ID"""
-    prompt = db.query(models.ExpertPrompt).filter(models.ExpertPrompt.id == prompt_id).first()
-    if prompt is None:
-        raise HTTPException(status_code=404, detail="Expert prompt not found")
-    return prompt
+    async def load() -> bytes:
+        prompt = await _load_prompt(db, prompt_id)
+        return serialize_rows(schemas.ExpertPromptResponse, prompt)
+    
+    return await _catalog_response(request, catalog.EXPERT_PROMPTS, catalog.catalog_key(id=prompt_id), load)
 
 @app.post("/api/v1/expert-prompts", response_model=schemas.ExpertPromptResponse, tags=["Expert Prompts"])
-def create_expert_prompt(
+async def create_expert_prompt(
     prompt: schemas.ExpertPromptCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Créer un nouveau prompt expert"""
+    # Refuser les templates mal formés dès leur création
+    try:
+        CompiledTemplate(prompt.template)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid template: {str(e)}")
+    
     db_prompt = models.ExpertPrompt(**prompt.dict())
     db.add(db_prompt)
-    db.commit()
-    db.refresh(db_prompt)
+    await db.commit()
+    await db.refresh(db_prompt)
+    await _invalidate_catalog(catalog.EXPERT_PROMPTS, catalog.CATALOG_TREE)
+    await search_index.add(db, db_prompt.id)
+    await embedding_index.add(db, db_prompt.id)
     return db_prompt
 
-# Route d'exécution de prompt (CORRIGÉE)
-@app.post("/api/v1/execute-prompt/{prompt_id}", response_model=schemas.PromptExecutionResponse, tags=["Execution"])
-async def execute_prompt(
-    prompt_id: int,
-    execution_request: schemas.PromptExecutionRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def _load_prompt_hits(db: AsyncSession, hits: List[Tuple[int, float]]) -> List[schemas.ExpertPromptSearchHit]:
+    """Charger les prompts d'une liste (prompt_id, score) en conservant l'ordre"""
+    if not hits:
+        return []
+    rows = await db.scalars(
+        select(models.ExpertPrompt).where(models.ExpertPrompt.id.in_([prompt_id for prompt_id, _ in hits]))
+    )
+    prompts = {prompt.id: prompt for prompt in rows}
+    return [
+        schemas.ExpertPromptSearchHit(
+            **schemas.ExpertPromptResponse.model_validate(prompts[prompt_id]).model_dump(),
+            score=score
+        )
+        for prompt_id, score in hits
+        if prompt_id in prompts
+    ]
+
+# Arborescence complète du catalogue
+CATALOG_TREE_PROMPT_FIELDS = set(schemas.ExpertPromptResponse.model_fields)
+CATALOG_TREE_DEFAULT_FIELDS = "id,title,expected_output,updated_at"
+
+@app.get("/api/v1/catalog/tree", response_model=List[schemas.CatalogTreeSpecialty], tags=["Catalog"])
+async def get_catalog_tree(
+    request: Request,
+    fields: str = Query(
+        CATALOG_TREE_DEFAULT_FIELDS,
+        description="Champs des prompts experts à inclure, séparés par des virgules (ex. id,title,template)"
+    ),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Exécuter un prompt expert avec les variables fournies
-    Cette version implémente l'exécution RÉELLE avec les LLM
+    Récupérer l'arborescence Spécialités → Sous-spécialités → Prompts experts en une requête
+    
+    Les trois niveaux sont chargés en trois requêtes (selectinload), quel que soit
+    le nombre de spécialités. Seuls les champs demandés des prompts sont lus et
+    renvoyés ; la réponse est mise en cache compressée (gzip) par projection.
     """
-    active_executions.inc()
-    start_time = time.time()
+    prompt_fields = sorted({field.strip() for field in fields.split(",") if field.strip()} | {"id"})
+    unknown = [field for field in prompt_fields if field not in CATALOG_TREE_PROMPT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown expert prompt fields: {', '.join(unknown)}")
     
-    try:
-        # Récupérer le prompt
-        prompt = db.query(models.ExpertPrompt).filter(models.ExpertPrompt.id == prompt_id).first()
-        if not prompt:
-            raise HTTPException(status_code=404, detail="Expert prompt not found")
-        
-        # Valider les variables contre le schéma
-        try:
-            validated_variables = validate_variables_against_schema(
-                execution_request.variables,
-                prompt.variables_schema
+    async def load() -> bytes:
+        columns = [getattr(models.ExpertPrompt, field) for field in prompt_fields]
+        specialties = (await db.scalars(
+            select(models.Specialty)
+            .options(
+                selectinload(models.Specialty.sub_specialties)
+                .selectinload(models.SubSpecialty.expert_prompts)
+                .load_only(*columns)
             )
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        
-        # Récupérer le provider LLM (ou utiliser celui par défaut)
-        llm_provider_name = execution_request.llm_provider or "openai"
-        llm_model_name = execution_request.llm_model or "gpt-4"
+            .order_by(models.Specialty.id)
+        )).all()
         
-        # Obtenir le provider LLM
+        tree = [
+            {
+                "id": specialty.id,
+                "name": specialty.name,
+                "description": specialty.description,
+                "icon_url": specialty.icon_url,
+                "sub_specialties": [
+                    {
+                        "id": sub_specialty.id,
+                        "name": sub_specialty.name,
+                        "description": sub_specialty.description,
+                        "expert_prompts": [
+                            {field: getattr(prompt, field) for field in prompt_fields}
+                            for prompt in sorted(sub_specialty.expert_prompts, key=lambda p: p.id)
+                        ]
+                    }
+                    for sub_specialty in sorted(specialty.sub_specialties, key=lambda s: s.id)
+                ]
+            }
+            for specialty in specialties
+        ]
+        return dumps(tree)
+    
+    key = catalog.catalog_key(fields=",".join(prompt_fields))
+    return await _catalog_response(request, catalog.CATALOG_TREE, key, load, compressed=True)
+
+# Recherche dans les prompts experts
+@app.get("/api/v1/search/expert-prompts", response_model=schemas.ExpertPromptSearchResponse, tags=["Expert Prompts"])
+async def search_expert_prompts(
+    q: str = Query(..., min_length=1, max_length=200),
+    sub_specialty_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Rechercher des prompts experts par titre, template, résultat attendu et spécialité
+    
+    Les résultats sont classés par pertinence. Le dernier mot de la requête est
+    recherché par préfixe pour l'autocomplétion ; une faute de frappe est
+    tolérée lorsqu'aucun résultat exact n'est trouvé.
+    """
+    total, hits = await search_index.search(db, q, sub_specialty_id=sub_specialty_id, offset=skip, limit=limit)
+    return {"query": q, "total": total, "results": await _load_prompt_hits(db, hits)}
+
+@app.get(
+    "/api/v1/expert-prompts/{prompt_id}/similar",
+    response_model=List[schemas.ExpertPromptSearchHit],
+    tags=["Expert Prompts"]
+)
+async def get_similar_expert_prompts(
+    prompt_id: int,
+    k: int = Query(10, ge=1, le=100),
+    sub_specialty_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Trouver les prompts experts les plus proches sémantiquement d'un prompt (similarité cosinus)"""
+    await _load_prompt(db, prompt_id)
+    hits = await asyncio.to_thread(embedding_index.similar, prompt_id, k, sub_specialty_id)
+    return await _load_prompt_hits(db, hits)
+
+@app.post(
+    "/api/v1/expert-prompts/suggest",
+    response_model=List[schemas.ExpertPromptSearchHit],
+    tags=["Expert Prompts"]
+)
+async def suggest_expert_prompts(
+    suggestion_request: schemas.PromptSuggestionRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Suggérer les prompts experts les plus adaptés à une tâche décrite librement"""
+    hits = await asyncio.to_thread(
+        embedding_index.suggest,
+        suggestion_request.task,
+        suggestion_request.k,
+        suggestion_request.sub_specialty_id
+    )
+    return await _load_prompt_hits(db, hits)
+
+# Préparation et métriques communes aux routes d'exécution
+async def _load_prompt(db: AsyncSession, prompt_id: int) -> models.ExpertPrompt:
+    """Récupérer le prompt expert (404 s'il n'existe pas)"""
+    prompt = await db.get(models.ExpertPrompt, prompt_id)
+    if not prompt:
+        raise HTTPException(status_code=404, detail="Expert prompt not found")
+    return prompt
+
+def _render_prompt(prompt: models.ExpertPrompt, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valider les variables contre le schéma puis les injecter dans le template
+
+    Raises:
+        ValueError: Si les variables sont invalides ou incomplètes
+    """
+    template = get_compiled_template(prompt)
+    validated_variables = validate_variables_against_schema(
+        variables,
+        prompt.variables_schema,
+        cache_key=(prompt.id, prompt.updated_at)
+    )
+    
+    # Rejeter les variables manquantes avant tout rendu ou appel LLM
+    missing = template.missing(validated_variables)
+    if missing:
+        raise ValueError(f"Missing variable in template: {', '.join(sorted(missing))}")
+    
+    filled_prompt = template.render(validated_variables)
+    
+    return {"variables": validated_variables, "filled_prompt": filled_prompt}
+
+def _resolve_provider(parameters: schemas.PromptExecutionParameters) -> Dict[str, Any]:
+    """Obtenir le provider LLM demandé (ou celui par défaut)"""
+    llm_provider_name = parameters.llm_provider or "openai"
+    llm_model_name = parameters.llm_model or "gpt-4"
+    
+    try:
+        llm_provider = LLMFactory.get_provider(llm_provider_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "llm_provider": llm_provider,
+        "llm_provider_name": llm_provider_name,
+        "llm_model_name": llm_model_name,
+    }
+
+async def _prepare_execution(
+    prompt_id: int,
+    execution_request: schemas.PromptExecutionRequest,
+    db: AsyncSession
+) -> Dict[str, Any]:
+    """
+    Charger le prompt, valider les variables, résoudre le provider et rendre le template
+
+    Raises:
+        HTTPException: 404 si le prompt n'existe pas, 400 si la requête est invalide
+    """
+    prompt = await _load_prompt(db, prompt_id)
+    
+    try:
+        rendered = _render_prompt(prompt, execution_request.variables)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    resolved = _resolve_provider(execution_request)
+    
+    # Rejeter les prompts qui dépasseraient la fenêtre de contexte avant tout appel payant
+    try:
+        check_context_budget(
+            resolved["llm_provider_name"],
+            resolved["llm_model_name"],
+            rendered["filled_prompt"],
+            execution_request.max_tokens
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Cibles de routage : provider demandé puis providers de repli dont la
+    # fenêtre de contexte peut recevoir le prompt
+    targets = [(resolved["llm_provider_name"], resolved["llm_model_name"])]
+    for fallback in execution_request.fallbacks or []:
+        if fallback.llm_provider not in LLMFactory.list_providers():
+            raise HTTPException(status_code=400, detail=f"Unknown LLM provider: {fallback.llm_provider}")
+        target = (
+            fallback.llm_provider,
+            fallback.llm_model or DEFAULT_MODELS.get(fallback.llm_provider, resolved["llm_model_name"])
+        )
         try:
-            llm_provider = LLMFactory.get_provider(llm_provider_name)
+            check_context_budget(*target, rendered["filled_prompt"], execution_request.max_tokens)
         except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        
-        # Injecter les variables dans le template
-        try:
-            filled_prompt = prompt.template.format(**validated_variables)
-        except KeyError as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing variable in template: {str(e)}"
-            )
-        
-        # Exécuter le prompt avec le LLM
-        logger.info(f"Executing prompt {prompt_id} with {llm_provider_name}/{llm_model_name}")
-        
-        execution_result = await llm_provider.execute(
-            prompt=filled_prompt,
-            model=llm_model_name,
-            temperature=execution_request.temperature,
-            max_tokens=execution_request.max_tokens
-        )
-        
-        # Calculer le coût
-        cost = llm_provider.calculate_cost(
-            tokens=execution_result["tokens_used"],
-            model=llm_model_name
+            logger.info(f"Skipping fallback {target[0]}/{target[1]}: {str(e)}")
+            continue
+        targets.append(target)
+    
+    return {"prompt": prompt, **rendered, **resolved, "targets": targets}
+
+async def _run_llm(
+    prompt_id: int,
+    llm_provider: LLMProvider,
+    llm_provider_name: str,
+    llm_model_name: str,
+    filled_prompt: str,
+    parameters: schemas.PromptExecutionParameters
+) -> Dict[str, Any]:
+    """
+    Exécuter un prompt rendu, en passant par le cache pour les exécutions déterministes
+
+    Returns:
+        Dict contenant le résultat du provider (output, tokens_used), le coût
+        et l'indicateur cached
+    """
+    cache_key = None
+    execution_result = None
+    if response_cache is not None and is_cacheable(parameters.temperature):
+        cache_key = build_cache_key(
+            filled_prompt,
+            llm_provider_name,
+            llm_model_name,
+            parameters.temperature,
+            parameters.max_tokens
         )
-        
-        # Enregistrer les métriques
-        duration = time.time() - start_time
-        
-        prompt_executions_total.labels(
-            prompt_id=prompt_id,
+        execution_result = await response_cache.get(cache_key)
+        llm_response_cache_requests.labels(
             llm_provider=llm_provider_name,
-            status='success'
+            result='hit' if execution_result is not None else 'miss'
         ).inc()
-        
-        prompt_execution_duration.labels(
-            prompt_id=prompt_id,
-            llm_provider=llm_provider_name
-        ).observe(duration)
-        
+    
+    if execution_result is not None:
+        logger.info(f"Serving prompt {prompt_id} from cache ({llm_provider_name}/{llm_model_name})")
+        # Aucun appel facturé pour une réponse servie depuis le cache
+        return {**execution_result, "cost": 0.0, "cached": True}
+    
+    # Exécuter le prompt avec le LLM
+    logger.info(f"Executing prompt {prompt_id} with {llm_provider_name}/{llm_model_name}")
+    
+    call_start = time.time()
+    execution_result = await llm_provider.execute(
+        prompt=filled_prompt,
+        model=llm_model_name,
+        temperature=parameters.temperature,
+        max_tokens=parameters.max_tokens
+    )
+    latency_tracker.record(
+        llm_provider_name,
+        llm_model_name,
+        time.time() - call_start,
+        execution_result["output_tokens"]
+    )
+    
+    if cache_key is not None:
+        await response_cache.set(cache_key, execution_result)
+    
+    # Calculer le coût
+    cost = llm_provider.calculate_cost(
+        input_tokens=execution_result["input_tokens"],
+        output_tokens=execution_result["output_tokens"],
+        model=llm_model_name
+    )
+    return {**execution_result, "cost": cost, "cached": False}
+
+def _rate_limit_error(error: RateLimitExceeded) -> HTTPException:
+    """Réponse 429, avec Retry-After sauf si la demande dépasse à elle seule une limite par minute"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(error),
+        headers={"Retry-After": str(math.ceil(error.retry_after))} if error.retry_after is not None else None
+    )
+
+async def _acquire(
+    user_id: Optional[int],
+    llm_provider_name: str,
+    llm_model_name: str,
+    filled_prompts: List[str],
+    max_tokens: Optional[int],
+    scopes: Sequence[str] = RATE_LIMIT_SCOPES,
+    max_wait: Optional[float] = None
+) -> None:
+    """
+    Débiter le contrôle d'admission pour des prompts rendus
+    
+    Compte une requête et les tokens estimés (prompt + max_tokens) par prompt rendu.
+    
+    Raises:
+        RateLimitExceeded: Si une limite est atteinte dans le délai d'attente
+    """
+    if rate_limiter is None:
+        return
+    
+    tokens = sum(
+        estimate_tokens(filled_prompt, llm_model_name) + (max_tokens or 0)
+        for filled_prompt in filled_prompts
+    )
+    await rate_limiter.acquire(
+        user_id,
+        llm_provider_name,
+        llm_model_name,
+        requests=len(filled_prompts),
+        tokens=tokens,
+        scopes=scopes,
+        max_wait=max_wait
+    )
+
+async def _admit(
+    user_id: int,
+    llm_provider_name: str,
+    llm_model_name: str,
+    filled_prompts: List[str],
+    max_tokens: Optional[int],
+    scopes: Sequence[str] = RATE_LIMIT_SCOPES
+) -> None:
+    """
+    Contrôle d'admission avant l'appel au provider
+    
+    Raises:
+        HTTPException: 429 avec Retry-After si une limite est atteinte, sans
+            Retry-After si la demande dépasse à elle seule une limite par minute
+    """
+    try:
+        await _acquire(user_id, llm_provider_name, llm_model_name, filled_prompts, max_tokens, scopes)
+    except RateLimitExceeded as e:
+        raise _rate_limit_error(e)
+
+async def _run_routed(
+    prompt_id: int,
+    prepared: Dict[str, Any],
+    execution_request: schemas.PromptExecutionRequest,
+    max_wait: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Exécuter un prompt préparé selon la politique de routage de la requête
+
+    Les limites par provider et par modèle sont débitées pour chaque cible
+    effectivement appelée (repli, requête couverte), la limite par utilisateur
+    restant à la charge de l'appelant.
+
+    Returns:
+        Dict contenant le résultat de _run_llm (result), le provider et le
+        modèle retenus, et l'indicateur hedged
+
+    Raises:
+        RateLimitExceeded: Si aucune cible n'a de capacité dans le délai `max_wait`
+    """
+    policy = execution_request.routing_policy or "single"
+    
+    async def call(llm_provider_name: str, llm_model_name: str) -> Dict[str, Any]:
+        await _acquire(
+            None,
+            llm_provider_name,
+            llm_model_name,
+            [prepared["filled_prompt"]],
+            execution_request.max_tokens,
+            scopes=("provider", "model"),
+            max_wait=max_wait
+        )
+        if llm_provider_name == prepared["llm_provider_name"]:
+            llm_provider = prepared["llm_provider"]
+        else:
+            llm_provider = LLMFactory.get_provider(llm_provider_name)
+        return await _run_llm(
+            prompt_id,
+            llm_provider,
+            llm_provider_name,
+            llm_model_name,
+            prepared["filled_prompt"],
+            execution_request
+        )
+    
+    try:
+        routed = await llm_router.execute(policy, prepared["targets"], call)
+    finally:
+        for provider_name, state in llm_router.breaker_states().items():
+            llm_circuit_breaker_open.labels(llm_provider=provider_name).set(1 if state == "open" else 0)
+    
+    llm_routing_decisions.labels(
+        policy=policy,
+        llm_provider=routed["llm_provider"],
+        hedged=str(routed["hedged"]).lower()
+    ).inc()
+    return routed
+
+def _record_success_metrics(
+    prompt_id: int,
+    llm_provider_name: str,
+    llm_model_name: str,
+    duration: float,
+    tokens_used: int,
+    cost: float,
+    cached: bool = False
+) -> None:
+    """Enregistrer les métriques Prometheus d'une exécution réussie"""
+    prompt_executions_total.labels(
+        prompt_id=prompt_id,
+        llm_provider=llm_provider_name,
+        status='success'
+    ).inc()
+    
+    prompt_execution_duration.labels(
+        prompt_id=prompt_id,
+        llm_provider=llm_provider_name
+    ).observe(duration)
+    
+    # Une réponse servie depuis le cache ne consomme ni tokens ni budget
+    if not cached:
         llm_tokens_used.labels(
             llm_provider=llm_provider_name,
             model=llm_model_name
-        ).inc(execution_result["tokens_used"])
+        ).inc(tokens_used)
         
         llm_cost_total.labels(
             llm_provider=llm_provider_name,
             model=llm_model_name
         ).inc(cost)
+
+async def _record_error(
+    prompt_id: int,
+    user_id: int,
+    execution_request: schemas.PromptExecutionRequest,
+    start_time: float,
+    error: Exception
+) -> None:
+    """Enregistrer l'échec d'une exécution (métriques et historique)"""
+    logger.error(f"Error executing prompt {prompt_id}: {str(error)}")
+    
+    prompt_executions_total.labels(
+        prompt_id=prompt_id,
+        llm_provider=execution_request.llm_provider or "unknown",
+        status='error'
+    ).inc()
+    
+    # Enregistrer l'échec dans l'historique (écriture différée)
+    [execution_id] = await history_writer.allocate_ids()
+    history_writer.write({
+        "id": execution_id,
+        "prompt_id": prompt_id,
+        "user_id": user_id,
+        "variables": execution_request.variables,
+        "output": None,
+        "llm_provider": execution_request.llm_provider or "unknown",
+        "llm_model": execution_request.llm_model or "unknown",
+        "tokens_used": 0,
+        "cost": 0.0,
+        "execution_time": time.time() - start_time,
+        "status": "error",
+        "error_message": str(error)
+    })
+
+# Route d'exécution de prompt (CORRIGÉE)
+@app.post("/api/v1/execute-prompt/{prompt_id}", response_model=schemas.PromptExecutionResponse, tags=["Execution"])
+async def execute_prompt(
+    prompt_id: int,
+    execution_request: schemas.PromptExecutionRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    Exécuter un prompt expert avec les variables fournies
+    Cette version implémente l'exécution RÉELLE avec les LLM
+    """
+    active_executions.inc()
+    start_time = time.time()
+    
+    try:
+        prepared = await _prepare_execution(prompt_id, execution_request, db)
+        validated_variables = prepared["variables"]
+        # Rendre la connexion au pool pendant l'appel LLM
+        await db.commit()
+        # Limites provider et modèle débitées par cible dans _run_routed
+        await _admit(
+            current_user.id,
+            prepared["llm_provider_name"],
+            prepared["llm_model_name"],
+            [prepared["filled_prompt"]],
+            execution_request.max_tokens,
+            scopes=("user",)
+        )
         
-        # Enregistrer l'historique d'exécution
-        execution_history = models.PromptExecutionHistory(
-            prompt_id=prompt_id,
-            user_id=current_user.id,
-            variables=validated_variables,
-            output=execution_result["output"],
-            llm_provider=llm_provider_name,
-            llm_model=llm_model_name,
-            tokens_used=execution_result["tokens_used"],
-            cost=cost,
-            execution_time=duration,
-            status="success"
+        routed = await _run_routed(prompt_id, prepared, execution_request)
+        execution_result = routed["result"]
+        llm_provider_name = routed["llm_provider"]
+        llm_model_name = routed["llm_model"]
+        hedged = routed["hedged"]
+        cost = execution_result["cost"]
+        cached = execution_result["cached"]
+        
+        # Enregistrer les métriques
+        duration = time.time() - start_time
+        _record_success_metrics(
+            prompt_id,
+            llm_provider_name,
+            llm_model_name,
+            duration,
+            execution_result["tokens_used"],
+            cost,
+            cached=cached
         )
-        db.add(execution_history)
-        db.commit()
-        db.refresh(execution_history)
+        
+        # Enregistrer l'historique d'exécution (inséré par lot hors du chemin critique)
+        [execution_id] = await history_writer.allocate_ids()
+        history_writer.write({
+            "id": execution_id,
+            "prompt_id": prompt_id,
+            "user_id": current_user.id,
+            "variables": validated_variables,
+            "output": execution_result["output"],
+            "llm_provider": llm_provider_name,
+            "llm_model": llm_model_name,
+            "tokens_used": execution_result["tokens_used"],
+            "cost": cost,
+            "execution_time": duration,
+            "status": "success",
+            "error_message": None,
+            "cached": cached,
+            "hedged": hedged
+        })
         
         return {
-            "execution_id": execution_history.id,
+            "execution_id": execution_id,
             "prompt_id": prompt_id,
             "output": execution_result["output"],
             "llm_provider": llm_provider_name,
@@ -383,81 +1049,723 @@ async def execute_prompt(
             "tokens_used": execution_result["tokens_used"],
             "cost": cost,
             "execution_time": duration,
-            "status": "success"
+            "status": "success",
+            "cached": cached,
+            "hedged": hedged
         }
         
     except HTTPException:
         raise
+    except RateLimitExceeded as e:
+        raise _rate_limit_error(e)
     except Exception as e:
-        logger.error(f"Error executing prompt {prompt_id}: {str(e)}")
+        await _record_error(prompt_id, current_user.id, execution_request, start_time, e)
+        raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
+    
+    finally:
+        active_executions.dec()
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formater un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+# Route d'exécution en streaming (Server-Sent Events)
+@app.post("/api/v1/execute-prompt/{prompt_id}/stream", tags=["Execution"])
+async def execute_prompt_stream(
+    prompt_id: int,
+    execution_request: schemas.PromptExecutionRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    Exécuter un prompt expert en streaming
+    
+    Les tokens sont transmis au fil de l'eau sous forme d'événements SSE `token`.
+    L'historique, les tokens et le coût sont enregistrés à la fin du flux,
+    puis un événement `done` (ou `error`) clôt la réponse.
+    """
+    # Les erreurs de validation et d'admission sont renvoyées avant l'ouverture du flux
+    prepared = await _prepare_execution(prompt_id, execution_request, db)
+    llm_provider = prepared["llm_provider"]
+    llm_provider_name = prepared["llm_provider_name"]
+    llm_model_name = prepared["llm_model_name"]
+    user_id = current_user.id
+    await _admit(
+        user_id,
+        llm_provider_name,
+        llm_model_name,
+        [prepared["filled_prompt"]],
+        execution_request.max_tokens
+    )
+    
+    async def event_stream():
+        active_executions.inc()
+        start_time = time.time()
+        output_parts = []
+        usage = {"tokens_used": 0, "input_tokens": 0, "output_tokens": 0}
+        first_token_at = None
+        
+        try:
+            logger.info(f"Streaming prompt {prompt_id} with {llm_provider_name}/{llm_model_name}")
+            
+            async for chunk in llm_provider.stream(
+                prompt=prepared["filled_prompt"],
+                model=llm_model_name,
+                temperature=execution_request.temperature,
+                max_tokens=execution_request.max_tokens
+            ):
+                if chunk["type"] == "usage":
+                    usage = chunk
+                    continue
+                
+                if first_token_at is None:
+                    first_token_at = time.time()
+                    prompt_time_to_first_token.labels(
+                        prompt_id=prompt_id,
+                        llm_provider=llm_provider_name
+                    ).observe(first_token_at - start_time)
+                
+                output_parts.append(chunk["text"])
+                yield _sse_event("token", {"text": chunk["text"]})
+            
+            tokens_used = usage["tokens_used"]
+            latency_tracker.record(
+                llm_provider_name,
+                llm_model_name,
+                time.time() - start_time,
+                usage["output_tokens"]
+            )
+            cost = llm_provider.calculate_cost(
+                input_tokens=usage["input_tokens"],
+                output_tokens=usage["output_tokens"],
+                model=llm_model_name
+            )
+            duration = time.time() - start_time
+            _record_success_metrics(
+                prompt_id,
+                llm_provider_name,
+                llm_model_name,
+                duration,
+                tokens_used,
+                cost
+            )
+            
+            [execution_id] = await history_writer.allocate_ids()
+            history_writer.write({
+                "id": execution_id,
+                "prompt_id": prompt_id,
+                "user_id": user_id,
+                "variables": prepared["variables"],
+                "output": "".join(output_parts),
+                "llm_provider": llm_provider_name,
+                "llm_model": llm_model_name,
+                "tokens_used": tokens_used,
+                "cost": cost,
+                "execution_time": duration,
+                "status": "success",
+                "error_message": None,
+                "cached": False,
+                "hedged": False
+            })
+            
+            yield _sse_event("done", {
+                "execution_id": execution_id,
+                "prompt_id": prompt_id,
+                "llm_provider": llm_provider_name,
+                "llm_model": llm_model_name,
+                "tokens_used": tokens_used,
+                "cost": cost,
+                "execution_time": duration,
+                "status": "success"
+            })
+        
+        except Exception as e:
+            await _record_error(prompt_id, user_id, execution_request, start_time, e)
+            yield _sse_event("error", {"detail": f"Execution failed: {str(e)}"})
+        
+        finally:
+            active_executions.dec()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Route d'exécution par lot
+@app.post("/api/v1/execute-prompt/{prompt_id}/batch", tags=["Execution"])
+async def execute_prompt_batch(
+    prompt_id: int,
+    batch_request: schemas.PromptBatchExecutionRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    Exécuter un prompt expert sur plusieurs jeux de variables
+    
+    Tous les jeux de variables sont validés avant le premier appel LLM. Les
+    exécutions sont réparties sur le provider dans la limite de sa concurrence
+    maximale, et chaque résultat est renvoyé dès qu'il est disponible (une ligne
+    JSON par jeu de variables). L'historique est inséré en une seule transaction,
+    puis une dernière ligne `summary` donne les identifiants d'exécution.
+    """
+    prompt = await _load_prompt(db, prompt_id)
+    resolved = _resolve_provider(batch_request)
+    
+    # Valider tous les jeux de variables avant toute exécution
+    rendered_sets = []
+    validation_errors = []
+    for index, variables in enumerate(batch_request.variable_sets):
+        try:
+            rendered = _render_prompt(prompt, variables)
+            check_context_budget(
+                resolved["llm_provider_name"],
+                resolved["llm_model_name"],
+                rendered["filled_prompt"],
+                batch_request.max_tokens
+            )
+            rendered_sets.append(rendered)
+        except ValueError as e:
+            validation_errors.append({"index": index, "error": str(e)})
+    if validation_errors:
+        raise HTTPException(status_code=400, detail=validation_errors)
+    
+    # Admission élément par élément : le premier en 429, les suivants attendent
+    # la capacité juste avant leur appel au provider
+    await _admit(
+        current_user.id,
+        resolved["llm_provider_name"],
+        resolved["llm_model_name"],
+        [rendered_sets[0]["filled_prompt"]],
+        batch_request.max_tokens
+    )
+    
+    llm_provider = resolved["llm_provider"]
+    llm_provider_name = resolved["llm_provider_name"]
+    llm_model_name = resolved["llm_model_name"]
+    semaphore = LLMFactory.get_semaphore(llm_provider_name)
+    user_id = current_user.id
+    
+    async def run_one(index: int, rendered: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            if index > 0:
+                try:
+                    await _acquire(
+                        user_id,
+                        llm_provider_name,
+                        llm_model_name,
+                        [rendered["filled_prompt"]],
+                        batch_request.max_tokens,
+                        max_wait=math.inf
+                    )
+                except RateLimitExceeded as e:
+                    # Seul un élément dépassant à lui seul une limite par minute est refusé
+                    return {"index": index, "status": "error", "execution_time": 0.0, "error_message": str(e)}
+            active_executions.inc()
+            start_time = time.time()
+            try:
+                execution_result = await _run_llm(
+                    prompt_id,
+                    llm_provider,
+                    llm_provider_name,
+                    llm_model_name,
+                    rendered["filled_prompt"],
+                    batch_request
+                )
+                duration = time.time() - start_time
+                _record_success_metrics(
+                    prompt_id,
+                    llm_provider_name,
+                    llm_model_name,
+                    duration,
+                    execution_result["tokens_used"],
+                    execution_result["cost"],
+                    cached=execution_result["cached"]
+                )
+                return {
+                    "index": index,
+                    "status": "success",
+                    "output": execution_result["output"],
+                    "tokens_used": execution_result["tokens_used"],
+                    "cost": execution_result["cost"],
+                    "execution_time": duration,
+                    "cached": execution_result["cached"]
+                }
+            except Exception as e:
+                logger.error(f"Error executing prompt {prompt_id} (batch item {index}): {str(e)}")
+                prompt_executions_total.labels(
+                    prompt_id=prompt_id,
+                    llm_provider=llm_provider_name,
+                    status='error'
+                ).inc()
+                return {
+                    "index": index,
+                    "status": "error",
+                    "execution_time": time.time() - start_time,
+                    "error_message": str(e)
+                }
+            finally:
+                active_executions.dec()
+    
+    async def record_history(results: List[schemas.PromptBatchItemResult]) -> List[int]:
+        """Confier l'historique des résultats au tampon d'écriture, dans l'ordre du lot"""
+        results.sort(key=lambda r: r.index)
+        execution_ids = await history_writer.allocate_ids(len(results))
+        for execution_id, result in zip(execution_ids, results):
+            history_writer.write({
+                "id": execution_id,
+                "prompt_id": prompt_id,
+                "user_id": user_id,
+                "variables": rendered_sets[result.index]["variables"],
+                "output": result.output,
+                "llm_provider": llm_provider_name,
+                "llm_model": llm_model_name,
+                "tokens_used": result.tokens_used,
+                "cost": result.cost,
+                "execution_time": result.execution_time,
+                "status": result.status,
+                "error_message": result.error_message,
+                "cached": result.cached,
+                "hedged": False
+            })
+        return execution_ids
+    
+    async def result_stream():
+        tasks = [
+            asyncio.create_task(run_one(index, rendered))
+            for index, rendered in enumerate(rendered_sets)
+        ]
+        results = []
+        streamed = False
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = schemas.PromptBatchItemResult(**await next_result)
+                results.append(result)
+                yield result.model_dump_json() + "\n"
+            streamed = True
+        finally:
+            if not streamed:
+                # Client déconnecté : les résultats déjà obtenus (appels facturés)
+                # restent dans l'historique, les exécutions en cours sont abandonnées
+                received = {result.index for result in results}
+                for task in tasks:
+                    if task.done() and not task.cancelled():
+                        item = task.result()
+                        if item["index"] not in received:
+                            results.append(schemas.PromptBatchItemResult(**item))
+                    task.cancel()
+                if results:
+                    # Tâche détachée : la génération en cours d'annulation ne peut plus attendre
+                    recorder = asyncio.create_task(record_history(results))
+                    _background_tasks.add(recorder)
+                    recorder.add_done_callback(_background_tasks.discard)
+        
+        execution_ids = await record_history(results)
         
+        yield dumps({"summary": {
+            "prompt_id": prompt_id,
+            "total": len(results),
+            "succeeded": sum(1 for r in results if r.status == "success"),
+            "failed": sum(1 for r in results if r.status == "error"),
+            "cost": round(sum(r.cost for r in results), 6),
+            "execution_ids": execution_ids
+        }}).decode("utf-8") + "\n"
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+# Route d'estimation du budget d'exécution (dry-run)
+@app.post("/api/v1/execute-prompt/{prompt_id}/estimate", response_model=schemas.PromptEstimateResponse, tags=["Execution"])
+async def estimate_prompt_execution(
+    prompt_id: int,
+    execution_request: schemas.PromptExecutionRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    Estimer une exécution sans appeler le provider LLM
+    
+    Renvoie les tokens estimés du prompt rendu, la place restante dans la
+    fenêtre de contexte du modèle, les bornes de coût et la latence projetée.
+    """
+    prompt = await _load_prompt(db, prompt_id)
+    
+    try:
+        rendered = _render_prompt(prompt, execution_request.variables)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    llm_provider_name = execution_request.llm_provider or "openai"
+    llm_model_name = execution_request.llm_model or "gpt-4"
+    if llm_provider_name not in LLMFactory.list_providers():
+        raise HTTPException(status_code=400, detail=f"Unknown LLM provider: {llm_provider_name}")
+    
+    budget = estimate_execution_budget(
+        llm_provider_name,
+        llm_model_name,
+        rendered["filled_prompt"],
+        execution_request.max_tokens
+    )
+    return {
+        "prompt_id": prompt_id,
+        "llm_provider": llm_provider_name,
+        "llm_model": llm_model_name,
+        **budget
+    }
+
+# Routes d'exécution en mode job
+async def _run_job(job: Dict[str, Any]) -> None:
+    """Exécuter un job de la file d'attente et mettre à jour sa ligne d'historique"""
+    execution_id = job["execution_id"]
+    prompt_id = job["prompt_id"]
+    parameters = schemas.PromptExecutionRequest(**job["parameters"])
+    active_executions.inc()
+    start_time = time.time()
+    
+    try:
+        prepared = {
+            **_resolve_provider(parameters),
+            "filled_prompt": job["filled_prompt"],
+            "targets": [tuple(target) for target in job["targets"]]
+        }
+        # Le job attend la capacité des providers plutôt que d'échouer
+        routed = await _run_routed(prompt_id, prepared, parameters, max_wait=math.inf)
+        execution_result = routed["result"]
+        duration = time.time() - start_time
+        _record_success_metrics(
+            prompt_id,
+            routed["llm_provider"],
+            routed["llm_model"],
+            duration,
+            execution_result["tokens_used"],
+            execution_result["cost"],
+            cached=execution_result["cached"]
+        )
+        updates = {
+            "output": execution_result["output"],
+            "llm_provider": routed["llm_provider"],
+            "llm_model": routed["llm_model"],
+            "tokens_used": execution_result["tokens_used"],
+            "cost": execution_result["cost"],
+            "execution_time": duration,
+            "status": "success",
+            "cached": execution_result["cached"],
+            "hedged": routed["hedged"]
+        }
+    except Exception as e:
+        logger.error(f"Error executing job {execution_id} (prompt {prompt_id}): {str(e)}")
         prompt_executions_total.labels(
             prompt_id=prompt_id,
-            llm_provider=execution_request.llm_provider or "unknown",
+            llm_provider=parameters.llm_provider or "unknown",
             status='error'
         ).inc()
-        
-        # Enregistrer l'échec dans l'historique
-        execution_history = models.PromptExecutionHistory(
-            prompt_id=prompt_id,
-            user_id=current_user.id,
-            variables=execution_request.variables,
-            output=None,
-            llm_provider=execution_request.llm_provider or "unknown",
-            llm_model=execution_request.llm_model or "unknown",
-            tokens_used=0,
-            cost=0.0,
-            execution_time=time.time() - start_time,
-            status="error",
-            error_message=str(e)
-        )
-        db.add(execution_history)
-        db.commit()
-        
-        raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
-    
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        updates = {
+            "execution_time": time.time() - start_time,
+            "status": "error",
+            "error_message": str(detail)
+        }
     finally:
         active_executions.dec()
+    
+    # Session ouverte uniquement le temps de la mise à jour
+    async with AsyncSessionLocal() as job_db:
+        execution = (await job_db.execute(
+            update(models.PromptExecutionHistory)
+            .where(models.PromptExecutionHistory.id == execution_id)
+            .values(**await asyncio.to_thread(history_codec.encode_row, updates))
+            .returning(
+                models.PromptExecutionHistory.created_at,
+                models.PromptExecutionHistory.user_id,
+                models.PromptExecutionHistory.prompt_id,
+                models.PromptExecutionHistory.llm_provider,
+                models.PromptExecutionHistory.llm_model
+            )
+        )).one_or_none()
+        await job_db.commit()
+    # Compter le job terminé dans les rollups d'analyse
+    if execution is not None:
+        history_writer.track({**updates, **execution._asdict()})
+
+async def _get_user_execution(db: AsyncSession, execution_id: int, user_id: int) -> models.PromptExecutionHistory:
+    """Récupérer une exécution de l'utilisateur (404 si elle n'existe pas)"""
+    # Exécution encore dans le tampon d'écriture de l'historique
+    pending = history_writer.pending(execution_id)
+    if pending is not None and pending.user_id == user_id:
+        return pending
+    
+    execution = await db.scalar(
+        select(models.PromptExecutionHistory).where(
+            models.PromptExecutionHistory.id == execution_id,
+            models.PromptExecutionHistory.user_id == user_id
+        ).options(
+            undefer(models.PromptExecutionHistory.output_zstd),
+            undefer(models.PromptExecutionHistory.variables_zstd)
+        )
+    )
+    
+    if not execution:
+        # Exécution d'un mois déjà archivé
+        execution = await asyncio.to_thread(history_archive.get, execution_id, user_id)
+    if not execution:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    
+    return execution
+
+def _execution_response(execution: models.PromptExecutionHistory, full_output: bool = True) -> Dict[str, Any]:
+    """
+    Champs de ExecutionHistoryResponse d'une exécution, valeurs compressées décodées
+    
+    Sans `full_output`, une sortie compressée est renvoyée sous forme d'aperçu
+    (`output_truncated`) sans être décompressée.
+    """
+    response = {
+        field: getattr(execution, field)
+        for field in schemas.ExecutionHistoryResponse.model_fields
+        if field != "output_truncated"
+    }
+    response["variables"] = history_codec.variables(execution)
+    truncated = bool(execution.output_compressed) and not full_output
+    response["output"] = execution.output if truncated else history_codec.output(execution)
+    response["output_truncated"] = truncated
+    return response
+
+async def _execution_conditional_response(request: Request, execution: models.PromptExecutionHistory) -> Response:
+    """Réponse complète d'une exécution avec un ETag fort calculé sur son contenu"""
+    body = await asyncio.to_thread(lambda: dumps(_execution_response(execution)))
+    return conditional_response(request, body, cache_control="private, no-cache")
+
+@app.post(
+    "/api/v1/jobs/execute-prompt/{prompt_id}",
+    response_model=schemas.JobSubmissionResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["Jobs"]
+)
+async def submit_prompt_job(
+    prompt_id: int,
+    execution_request: schemas.PromptExecutionRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    Soumettre l'exécution d'un prompt expert en mode job
+    
+    La requête est validée puis une ligne d'historique `pending` est créée et
+    son identifiant renvoyé immédiatement. Un worker exécute le job ; le client
+    interroge `/api/v1/jobs/{job_id}` ou s'abonne à `/api/v1/jobs/{job_id}/events`.
+    """
+    prepared = await _prepare_execution(prompt_id, execution_request, db)
+    # Limites provider et modèle débitées par le worker au moment de l'appel
+    await _admit(
+        current_user.id,
+        prepared["llm_provider_name"],
+        prepared["llm_model_name"],
+        [prepared["filled_prompt"]],
+        execution_request.max_tokens,
+        scopes=("user",)
+    )
+    
+    # Ligne insérée immédiatement (le worker la met à jour), avec un identifiant
+    # tiré du même allocateur que l'historique différé
+    [execution_id] = await history_writer.allocate_ids()
+    execution_history = models.PromptExecutionHistory(**history_codec.encode_row({
+        "id": execution_id,
+        "prompt_id": prompt_id,
+        "user_id": current_user.id,
+        "variables": prepared["variables"],
+        "llm_provider": prepared["llm_provider_name"],
+        "llm_model": prepared["llm_model_name"],
+        "status": "pending"
+    }))
+    db.add(execution_history)
+    await db.commit()
+    
+    await job_queue.enqueue({
+        "execution_id": execution_history.id,
+        "prompt_id": prompt_id,
+        "filled_prompt": prepared["filled_prompt"],
+        "targets": prepared["targets"],
+        "parameters": {
+            "llm_provider": prepared["llm_provider_name"],
+            "llm_model": prepared["llm_model_name"],
+            "temperature": execution_request.temperature,
+            "max_tokens": execution_request.max_tokens,
+            "routing_policy": execution_request.routing_policy
+        }
+    })
+    
+    return {"job_id": execution_history.id, "status": "pending"}
+
+@app.get("/api/v1/jobs/{job_id}", response_model=schemas.ExecutionHistoryResponse, tags=["Jobs"])
+async def get_job(
+    job_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """Récupérer l'état et le résultat d'un job (304 si If-None-Match correspond)"""
+    execution = await _get_user_execution(db, job_id, current_user.id)
+    return await _execution_conditional_response(request, execution)
+
+@app.get("/api/v1/jobs/{job_id}/events", tags=["Jobs"])
+async def subscribe_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    S'abonner à la fin d'un job (Server-Sent Events)
+    
+    Un événement `done` contenant l'exécution est envoyé dès que le job n'est
+    plus `pending`.
+    """
+    await _get_user_execution(db, job_id, current_user.id)
+    user_id = current_user.id
+    
+    async def event_stream():
+        while True:
+            # Relire l'état du job avec une session courte
+            async with AsyncSessionLocal() as poll_db:
+                execution = await _get_user_execution(poll_db, job_id, user_id)
+            if execution.status != "pending":
+                yield _sse_event("done", await asyncio.to_thread(_execution_response, execution))
+                return
+            
+            if not await job_queue.wait_done(job_id, timeout=JOB_EVENTS_KEEPALIVE):
+                # Commentaire SSE pour garder la connexion ouverte
+                yield ": keep-alive\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Routes pour l'historique d'exécution
 @app.get("/api/v1/executions/history", response_model=List[schemas.ExecutionHistoryResponse], tags=["Execution"])
 def get_execution_history(
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     prompt_id: Optional[int] = None,
     status: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
-    """Récupérer l'historique des exécutions de prompts"""
+    """
+    Récupérer l'historique des exécutions de prompts
+    
+    Les exécutions sont triées de la plus récente à la plus ancienne. Passer
+    l'en-tête `X-Next-Cursor` de la réponse dans `cursor` pour obtenir la page
+    suivante ; `skip` (OFFSET) reste accepté pour les premières pages. Une page
+    incomplète en base est complétée par l'historique archivé (mois plus anciens).
+    Les sorties compressées sont renvoyées tronquées (`output_truncated`) ; la
+    sortie complète est donnée par `/api/v1/executions/{execution_id}`.
+    """
     query = db.query(models.PromptExecutionHistory).filter(
         models.PromptExecutionHistory.user_id == current_user.id
-    )
+    ).options(undefer(models.PromptExecutionHistory.variables_zstd))
     
     if prompt_id:
         query = query.filter(models.PromptExecutionHistory.prompt_id == prompt_id)
     if status:
         query = query.filter(models.PromptExecutionHistory.status == status)
     
-    executions = query.order_by(models.PromptExecutionHistory.created_at.desc()).offset(skip).limit(limit).all()
-    return executions
+    try:
+        page_query = keyset_page(query, models.PromptExecutionHistory, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if skip and not cursor:
+        page_query = page_query.offset(skip)
+    
+    executions = page_query.all()
+    
+    if len(executions) < limit:
+        # Les mois archivés sont plus anciens que toutes les lignes en base
+        if executions:
+            before, archive_skip = (executions[-1].created_at, executions[-1].id), 0
+        else:
+            before = decode_cursor(cursor) if cursor else None
+            archive_skip = 0
+            if skip and not cursor:
+                archive_skip = max(0, skip - query.count())
+        executions += history_archive.page(
+            current_user.id,
+            limit - len(executions),
+            before=before,
+            skip=archive_skip,
+            prompt_id=prompt_id,
+            status=status
+        )
+    
+    # Encodage direct des lignes, sans objets ExecutionHistoryResponse intermédiaires
+    headers = {}
+    next_page = next_cursor(executions, limit)
+    if next_page:
+        headers["X-Next-Cursor"] = next_page
+    return Response(
+        content=dumps([_execution_response(execution, full_output=False) for execution in executions]),
+        media_type="application/json",
+        headers=headers
+    )
 
 @app.get("/api/v1/executions/{execution_id}", response_model=schemas.ExecutionHistoryResponse, tags=["Execution"])
-def get_execution(
+async def get_execution(
     execution_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
-    """Récupérer une exécution spécifique par ID"""
-    execution = db.query(models.PromptExecutionHistory).filter(
-        models.PromptExecutionHistory.id == execution_id,
-        models.PromptExecutionHistory.user_id == current_user.id
-    ).first()
+    """Récupérer une exécution spécifique par ID (304 si If-None-Match correspond)"""
+    execution = await _get_user_execution(db, execution_id, current_user.id)
+    return await _execution_conditional_response(request, execution)
+
+# Route d'analyse des exécutions (rollups)
+@app.get("/api/v1/analytics/executions", response_model=schemas.ExecutionAnalyticsResponse, tags=["Analytics"])
+async def get_execution_analytics(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: str = "period",
+    user_id: Optional[int] = None,
+    prompt_id: Optional[int] = None,
+    llm_provider: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """
+    Coût, tokens et durées des exécutions par période, utilisateur, prompt ou provider
     
-    if not execution:
-        raise HTTPException(status_code=404, detail="Execution not found")
+    Répond depuis les rollups horaires / journaliers (sans parcourir l'historique).
+    `group_by` combine `period`, `user`, `prompt`, `provider` et `model` (séparés
+    par des virgules). Par défaut : les 30 derniers jours. Seuls les
+    administrateurs voient les exécutions des autres utilisateurs.
+    """
+    fields = [name.strip() for name in group_by.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in analytics.GROUP_BY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by fields: {', '.join(unknown)}")
     
-    return execution
+    if not current_user.is_admin:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not allowed to read other users' analytics")
+        user_id = current_user.id
+    
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    groups = await analytics.query_rollups(
+        db,
+        granularity,
+        start,
+        end,
+        fields,
+        user_id=user_id,
+        prompt_id=prompt_id,
+        llm_provider=llm_provider
+    )
+    return {"granularity": granularity, "start": start, "end": end, "group_by": fields, "groups": groups}
 
 # Route pour les métriques Prometheus
 @app.get("/metrics", tags=["Monitoring"])
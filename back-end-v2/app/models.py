@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, UniqueConstraint, Boolean, Integer, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, UniqueConstraint, Index, Boolean, Integer, Float, LargeBinary, BigInteger
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import JSON
 from datetime import datetime
@@ -91,8 +91,8 @@ class PromptExecutionHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     prompt_id = Column(Integer, ForeignKey("expert_prompts.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    variables = Column(JSON, nullable=False)
-    output = Column(Text)
+    variables = Column(JSON)  # NULL si compressées (variables_zstd)
+    output = Column(Text)  # Aperçu seulement si output_compressed
     llm_provider = Column(String, nullable=False)
     llm_model = Column(String, nullable=False)
     tokens_used = Column(Integer, default=0)
@@ -100,11 +100,61 @@ class PromptExecutionHistory(Base):
     execution_time = Column(Float, default=0.0)
     status = Column(String, nullable=False)  # 'success', 'error', 'pending'
     error_message = Column(Text)
+    cached = Column(Boolean, default=False)  # Réponse servie depuis le cache
+    hedged = Column(Boolean, default=False)  # Requête couverte lancée vers un second provider
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Valeurs volumineuses compressées (zstd, voir app/compression.py), chargées à la demande
+    output_compressed = Column(Boolean, default=False)
+    output_zstd = deferred(Column(LargeBinary))
+    variables_zstd = deferred(Column(LargeBinary))
 
     expert_prompt = relationship("ExpertPrompt", back_populates="execution_history")
     user = relationship("User", back_populates="execution_history")
 
+    # Index de l'historique paginé par curseur (created_at, id), selon les filtres
+    __table_args__ = (
+        Index("ix_execution_history_user_created", "user_id", "created_at", "id"),
+        Index("ix_execution_history_user_prompt_created", "user_id", "prompt_id", "created_at", "id"),
+        Index("ix_execution_history_user_status_created", "user_id", "status", "created_at", "id"),
+    )
+
+class ExecutionRollup(Base):
+    """Agrégats horaires et journaliers de l'historique d'exécution"""
+    __tablename__ = "execution_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)  # 'hour', 'day'
+    bucket_start = Column(DateTime, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    prompt_id = Column(Integer, ForeignKey("expert_prompts.id"), nullable=False)
+    llm_provider = Column(String, nullable=False)
+    llm_model = Column(String, nullable=False)
+    executions = Column(Integer, default=0)
+    errors = Column(Integer, default=0)
+    cached = Column(Integer, default=0)
+    tokens_used = Column(Integer, default=0)
+    cost = Column(Float, default=0.0)
+    execution_time = Column(Float, default=0.0)  # Somme des durées
+    latency_sketch = Column(JSON, nullable=False)  # Sketch fusionnable des durées (analytics.LatencySketch)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket_start", "user_id", "prompt_id", "llm_provider", "llm_model",
+            name="_execution_rollup_key_uc"
+        ),
+        Index("ix_execution_rollups_user_bucket", "user_id", "granularity", "bucket_start"),
+        Index("ix_execution_rollups_bucket", "granularity", "bucket_start"),
+    )
+
+class CompressionDictionary(Base):
+    """Dictionnaire zstd entraîné sur l'historique d'exécution"""
+    __tablename__ = "compression_dictionaries"
+
+    dict_id = Column(BigInteger, primary_key=True, autoincrement=False)  # Identifiant zstd du dictionnaire
+    data = Column(LargeBinary, nullable=False)
+    samples = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class LLMProvider(Base):
     __tablename__ = "llm_providers"
 
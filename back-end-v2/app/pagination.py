@@ -0,0 +1,51 @@
+"""
+Pagination par curseur (keyset) sur (created_at, id)
+Le coût d'une page ne dépend pas de sa profondeur, contrairement à OFFSET
+"""
+
+from datetime import datetime
+from typing import Any, Optional, Tuple
+import base64
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Curseur opaque désignant la dernière ligne d'une page"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Décoder un curseur produit par encode_cursor
+
+    Raises:
+        ValueError: Si le curseur est invalide
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_page(query: Any, model: Any, cursor: Optional[str], limit: int) -> Any:
+    """
+    Appliquer le tri (created_at, id) décroissant, la position du curseur et la limite
+
+    Fonctionne avec une Query ORM comme avec un select().
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """Curseur de la page suivante (None si la page est la dernière)"""
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
@@ -0,0 +1,53 @@
+"""
+Hachage des mots de passe (bcrypt)
+Exécuté dans un pool de threads borné pour ne pas bloquer la boucle d'événements
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# Facteur de travail bcrypt : les hashs d'un autre coût sont recalculés à la connexion
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hachages simultanés au maximum (bcrypt libère le GIL)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+async def hash_password(password: str) -> str:
+    """Hacher un mot de passe avec le facteur de travail courant"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Vérifier un mot de passe
+
+    Returns:
+        (valide, nouveau hash) : le nouveau hash est fourni lorsque le hash
+        stocké utilise d'autres paramètres (coût bcrypt, schéma déprécié)
+        et doit être remplacé, sinon None
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, pwd_context.verify_and_update, password, hashed_password)
+
+
+def shutdown() -> None:
+    """Arrêter le pool de hachage"""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,154 @@
+"""
+Table des tarifs des modèles LLM
+Chargée depuis la table llm_models et rafraîchie lorsqu'elle change
+"""
+
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+
+from sqlalchemy import func
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PRICING_REFRESH_INTERVAL = float(os.getenv("PRICING_REFRESH_INTERVAL", "60"))
+
+
+class ModelPricing:
+    """Tarifs (USD par 1000 tokens) et fenêtre de contexte d'un modèle"""
+
+    __slots__ = ("input", "output", "max_tokens")
+
+    def __init__(self, input: float, output: float, max_tokens: Optional[int] = None):
+        self.input = input
+        self.output = output
+        self.max_tokens = max_tokens
+
+
+# Tarifs par défaut, utilisés pour les modèles absents de la table llm_models
+DEFAULT_PRICING: Dict[Tuple[str, str], ModelPricing] = {
+    ("openai", "gpt-4"): ModelPricing(0.03, 0.06, 8192),
+    ("openai", "gpt-4-turbo"): ModelPricing(0.01, 0.03, 128000),
+    ("openai", "gpt-3.5-turbo"): ModelPricing(0.0005, 0.0015, 16385),
+    ("gemini", "gemini-pro"): ModelPricing(0.00025, 0.0005, 32760),
+    ("gemini", "gemini-2.5-flash"): ModelPricing(0.000075, 0.0003, 1048576),
+    ("claude", "claude-3-opus-20240229"): ModelPricing(0.015, 0.075, 200000),
+    ("claude", "claude-3-sonnet-20240229"): ModelPricing(0.003, 0.015, 200000),
+    ("claude", "claude-3-haiku-20240307"): ModelPricing(0.00025, 0.00125, 200000),
+}
+
+# Modèle de référence de chaque provider pour les modèles inconnus
+DEFAULT_MODELS = {
+    "openai": "gpt-4",
+    "gemini": "gemini-pro",
+    "claude": "claude-3-sonnet-20240229",
+}
+
+# Noms de providers de la table llm_providers correspondant aux providers de LLMFactory
+PROVIDER_ALIASES = {
+    "anthropic": "claude",
+    "google": "gemini",
+}
+
+
+class PricingTable:
+    """
+    Tarifs en mémoire des modèles LLM
+
+    Les lignes actives de llm_models (jointes à llm_providers) priment sur
+    DEFAULT_PRICING. La table est rechargée lorsque le nombre de lignes ou
+    la date de dernière modification des modèles change.
+    """
+
+    def __init__(self):
+        self._prices: Dict[Tuple[str, str], ModelPricing] = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str) -> ModelPricing:
+        """Tarifs d'un modèle (ceux du modèle de référence du provider s'il est inconnu)"""
+        key = (provider, model)
+        pricing = self._prices.get(key) or DEFAULT_PRICING.get(key)
+        if pricing is None:
+            default_key = (provider, DEFAULT_MODELS.get(provider, model))
+            pricing = self._prices.get(default_key) or DEFAULT_PRICING.get(default_key)
+        if pricing is None:
+            pricing = DEFAULT_PRICING[("openai", DEFAULT_MODELS["openai"])]
+        return pricing
+
+    def find(self, provider: str, model: str) -> Optional[ModelPricing]:
+        """Tarifs exacts d'un modèle, sans repli (None s'il est inconnu)"""
+        key = (provider, model)
+        return self._prices.get(key) or DEFAULT_PRICING.get(key)
+
+    def cost(self, provider: str, model: str, input_tokens: int, output_tokens: int) -> float:
+        """Calculer le coût en USD d'un appel"""
+        pricing = self.get(provider, model)
+        cost = (
+            (input_tokens / 1000) * pricing.input +
+            (output_tokens / 1000) * pricing.output
+        )
+        return round(cost, 6)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Recharger les tarifs depuis la base s'ils ont changé
+
+        Returns:
+            True si la table a été rechargée
+        """
+        db = SessionLocal()
+        try:
+            stamp = db.query(
+                func.count(models.LLMModel.id),
+                func.max(models.LLMModel.updated_at),
+                func.max(models.LLMProvider.updated_at)
+            ).select_from(models.LLMModel).outerjoin(
+                models.LLMProvider, models.LLMModel.provider
+            ).one()
+            stamp = tuple(stamp)
+            if not force and stamp == self._stamp:
+                return False
+
+            rows = db.query(models.LLMModel, models.LLMProvider.name).join(
+                models.LLMProvider, models.LLMModel.provider
+            ).filter(
+                models.LLMModel.is_active == True,
+                models.LLMProvider.is_active == True
+            ).all()
+        finally:
+            db.close()
+
+        prices = {}
+        for llm_model, provider_name in rows:
+            if llm_model.cost_per_thousand_tokens_input is None or llm_model.cost_per_thousand_tokens_output is None:
+                continue
+            provider = PROVIDER_ALIASES.get(provider_name.lower(), provider_name.lower())
+            prices[(provider, llm_model.model_identifier)] = ModelPricing(
+                llm_model.cost_per_thousand_tokens_input,
+                llm_model.cost_per_thousand_tokens_output,
+                llm_model.max_tokens
+            )
+
+        with self._lock:
+            self._prices = prices
+            self._stamp = stamp
+        logger.info(f"Loaded pricing for {len(prices)} LLM models")
+        return True
+
+    async def run_refresh_loop(self, interval: float = PRICING_REFRESH_INTERVAL) -> None:
+        """Vérifier périodiquement les changements de tarifs (hors de la boucle d'événements)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Pricing refresh error: {str(e)}")
+
+
+pricing_table = PricingTable()
@@ -0,0 +1,128 @@
+"""
+Cache des utilisateurs authentifiés
+Évite une requête sur la table users à chaque appel authentifié
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+import logging
+import os
+import threading
+import time
+
+from prometheus_client import Counter
+from sqlalchemy import event
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+principal_cache_requests = Counter(
+    'auth_principal_cache_requests_total',
+    'Authenticated user cache lookups',
+    ['result']
+)
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+
+class UserPrincipal:
+    """
+    Copie détachée d'un utilisateur authentifié
+
+    Expose les attributs de models.User utilisés par les routes et par
+    schemas.UserResponse, sans session SQLAlchemy associée.
+    """
+
+    __slots__ = ("id", "email", "username", "is_active", "is_admin", "created_at")
+
+    def __init__(
+        self,
+        id: int,
+        email: str,
+        username: str,
+        is_active: bool,
+        is_admin: bool,
+        created_at: Optional[datetime]
+    ):
+        self.id = id
+        self.email = email
+        self.username = username
+        self.is_active = is_active
+        self.is_admin = is_admin
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "UserPrincipal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            created_at=user.created_at
+        )
+
+
+class PrincipalCache:
+    """
+    Cache LRU à durée de vie courte des utilisateurs, indexé par id
+
+    Les entrées sont invalidées dès qu'un utilisateur est modifié ou supprimé
+    via l'ORM de ce processus ; le TTL borne le délai de prise en compte des
+    modifications faites ailleurs (autre worker, SQL direct).
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserPrincipal]:
+        if self.ttl <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, principal = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(user_id)
+                    principal_cache_requests.labels(result='hit').inc()
+                    return principal
+                del self._entries[user_id]
+
+        principal_cache_requests.labels(result='miss').inc()
+        return None
+
+    def set(self, principal: UserPrincipal) -> None:
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_principal(mapper, connection, target: models.User) -> None:
+    # Statut actif, droits admin ou profil modifiés : relire l'utilisateur au prochain appel
+    if target.id is not None:
+        principal_cache.invalidate(target.id)
@@ -0,0 +1,284 @@
+"""
+Contrôle d'admission des exécutions par token buckets
+Limites par utilisateur, par provider et par modèle (requêtes et tokens LLM)
+"""
+
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+rate_limit_rejections = Counter(
+    'rate_limit_rejections_total',
+    'Executions rejected by admission control',
+    ['scope']
+)
+
+rate_limit_queue_depth = Gauge(
+    'rate_limit_queue_depth',
+    'Executions waiting for rate limit capacity'
+)
+
+# (clé du bucket, capacité, débit de remplissage par seconde, coût)
+BucketRequest = Tuple[str, float, float, float]
+
+RATE_LIMIT_SCOPES = ("user", "provider", "model")
+
+
+class TokenBucketStore(ABC):
+    """Stockage des token buckets"""
+
+    @abstractmethod
+    async def consume(self, buckets: List[BucketRequest]) -> Tuple[float, Optional[int]]:
+        """
+        Consommer atomiquement le coût de chaque bucket
+
+        Rien n'est consommé si un seul bucket est insuffisant.
+
+        Returns:
+            (0, None) si la requête est admise, sinon le délai (secondes) avant
+            que tous les buckets soient suffisamment remplis et l'index du
+            bucket le plus limitant
+        """
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """Token buckets locaux au processus"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = asyncio.Lock()
+
+    async def consume(self, buckets: List[BucketRequest]) -> Tuple[float, Optional[int]]:
+        now = time.monotonic()
+        async with self._lock:
+            levels = []
+            retry_after = 0.0
+            limiting = None
+            for index, (key, capacity, rate, cost) in enumerate(buckets):
+                tokens, updated_at = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated_at) * rate)
+                levels.append(tokens)
+                if tokens < cost and (cost - tokens) / rate > retry_after:
+                    retry_after = (cost - tokens) / rate
+                    limiting = index
+
+            if retry_after > 0:
+                return retry_after, limiting
+
+            for (key, capacity, rate, cost), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - cost, now)
+            return 0.0, None
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Token buckets partagés entre les workers, stockés dans Redis"""
+
+    # Vérifie tous les buckets puis les débite ensemble (script atomique)
+    CONSUME_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local levels = {}
+    local retry_after = 0
+    local limiting = 0
+    for i, key in ipairs(KEYS) do
+      local capacity = tonumber(ARGV[i * 3 - 1])
+      local rate = tonumber(ARGV[i * 3])
+      local cost = tonumber(ARGV[i * 3 + 1])
+      local state = redis.call('HMGET', key, 'tokens', 'ts')
+      local tokens = tonumber(state[1]) or capacity
+      local ts = tonumber(state[2]) or now
+      tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+      levels[i] = tokens
+      if tokens < cost and (cost - tokens) / rate > retry_after then
+        retry_after = (cost - tokens) / rate
+        limiting = i - 1
+      end
+    end
+    if retry_after > 0 then
+      return tostring(retry_after) .. ':' .. limiting
+    end
+    for i, key in ipairs(KEYS) do
+      local capacity = tonumber(ARGV[i * 3 - 1])
+      local rate = tonumber(ARGV[i * 3])
+      local cost = tonumber(ARGV[i * 3 + 1])
+      redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+      redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+    return '0:-1'
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self._script = self.client.register_script(self.CONSUME_SCRIPT)
+        self._fallback = InMemoryTokenBucketStore()
+
+    async def consume(self, buckets: List[BucketRequest]) -> Tuple[float, Optional[int]]:
+        keys = [f"ratelimit:{key}" for key, _, _, _ in buckets]
+        args = [time.time()]
+        for _, capacity, rate, cost in buckets:
+            args.extend([capacity, rate, cost])
+        try:
+            result = await self._script(keys=keys, args=args)
+            retry_after, limiting = (result.decode() if isinstance(result, bytes) else result).split(":")
+            return float(retry_after), (int(limiting) if int(limiting) >= 0 else None)
+        except Exception as e:
+            # Redis indisponible : limiter localement plutôt que bloquer les exécutions
+            logger.warning(f"Redis rate limiter error, using in-memory buckets: {str(e)}")
+            return await self._fallback.consume(buckets)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class RateLimitExceeded(Exception):
+    """
+    Capacité insuffisante pour admettre l'exécution
+
+    `retry_after` vaut None lorsque le coût dépasse la capacité du bucket :
+    la requête ne pourra jamais être admise telle quelle.
+    """
+
+    def __init__(self, retry_after: Optional[float], scope: str = "unknown"):
+        self.retry_after = retry_after
+        self.scope = scope
+        if retry_after is None:
+            super().__init__(f"Request exceeds the {scope} rate limit capacity")
+        else:
+            super().__init__(f"Rate limit exceeded, retry after {retry_after:.1f}s")
+
+
+def _per_minute(env_var: str, default: str) -> float:
+    return float(os.getenv(env_var, default))
+
+
+class RateLimiter:
+    """
+    Contrôle d'admission avant l'appel au provider
+
+    Chaque limite est exprimée par minute (0 = désactivée) et appliquée par
+    un token bucket de capacité égale à une minute de débit. Les requêtes
+    et les tokens LLM estimés sont comptés séparément.
+    """
+
+    def __init__(self, store: TokenBucketStore):
+        self.store = store
+        self.limits = {
+            "user": (
+                _per_minute("RATE_LIMIT_USER_REQUESTS_PER_MINUTE", "60"),
+                _per_minute("RATE_LIMIT_USER_TOKENS_PER_MINUTE", "200000"),
+            ),
+            "provider": (
+                _per_minute("RATE_LIMIT_PROVIDER_REQUESTS_PER_MINUTE", "0"),
+                _per_minute("RATE_LIMIT_PROVIDER_TOKENS_PER_MINUTE", "0"),
+            ),
+            "model": (
+                _per_minute("RATE_LIMIT_MODEL_REQUESTS_PER_MINUTE", "0"),
+                _per_minute("RATE_LIMIT_MODEL_TOKENS_PER_MINUTE", "0"),
+            ),
+        }
+        # Attente maximale d'une capacité avant de rejeter (0 = rejet immédiat)
+        self.max_wait = float(os.getenv("RATE_LIMIT_MAX_WAIT", "0"))
+
+    def _buckets(
+        self,
+        user_id: Optional[int],
+        provider: str,
+        model: str,
+        requests: int,
+        tokens: int,
+        scopes: Sequence[str]
+    ) -> List[BucketRequest]:
+        keys = {
+            "user": f"user:{user_id}",
+            "provider": f"provider:{provider}",
+            "model": f"model:{provider}:{model}",
+        }
+        buckets = []
+        for scope in scopes:
+            key = keys[scope]
+            requests_limit, tokens_limit = self.limits[scope]
+            if requests_limit > 0:
+                buckets.append((f"{key}:requests", requests_limit, requests_limit / 60, requests))
+            if tokens_limit > 0 and tokens > 0:
+                buckets.append((f"{key}:tokens", tokens_limit, tokens_limit / 60, tokens))
+        return buckets
+
+    async def acquire(
+        self,
+        user_id: Optional[int],
+        provider: str,
+        model: str,
+        requests: int = 1,
+        tokens: int = 0,
+        scopes: Sequence[str] = RATE_LIMIT_SCOPES,
+        max_wait: Optional[float] = None
+    ) -> None:
+        """
+        Admettre une exécution ou lever RateLimitExceeded
+
+        Args:
+            scopes: Portées débitées (user, provider, model) ; `user_id` n'est
+                utilisé que pour la portée user
+            max_wait: Attente maximale d'une capacité en secondes
+                (RATE_LIMIT_MAX_WAIT par défaut, math.inf pour attendre sans limite)
+
+        Raises:
+            RateLimitExceeded: Si la capacité n'est pas disponible dans le délai d'attente,
+                ou si le coût dépasse la capacité d'un bucket (sans délai de réessai)
+        """
+        buckets = self._buckets(user_id, provider, model, requests, tokens, scopes)
+        if not buckets:
+            return
+
+        for key, capacity, _, cost in buckets:
+            if cost > capacity:
+                # Ne serait jamais admis : rejet sans débiter les autres buckets
+                scope = key.split(":", 1)[0]
+                rate_limit_rejections.labels(scope=scope).inc()
+                raise RateLimitExceeded(None, scope)
+
+        # D'autres exécutions peuvent consommer la capacité pendant l'attente :
+        # réessayer tant que le prochain délai tient dans l'attente maximale
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        retry_after, limiting = await self.store.consume(buckets)
+        if retry_after > 0 and time.monotonic() + retry_after <= deadline:
+            rate_limit_queue_depth.inc()
+            try:
+                while retry_after > 0 and time.monotonic() + retry_after <= deadline:
+                    await asyncio.sleep(retry_after)
+                    retry_after, limiting = await self.store.consume(buckets)
+            finally:
+                rate_limit_queue_depth.dec()
+
+        if retry_after > 0:
+            # Portée du bucket limitant (user, provider ou model)
+            scope = buckets[limiting][0].split(":", 1)[0] if limiting is not None else "unknown"
+            rate_limit_rejections.labels(scope=scope).inc()
+            raise RateLimitExceeded(retry_after, scope)
+
+    async def close(self) -> None:
+        await self.store.close()
+
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, redis, none
+
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    """Créer le contrôle d'admission selon la configuration (None si désactivé)"""
+    if RATE_LIMIT_BACKEND == "none":
+        return None
+    if RATE_LIMIT_BACKEND == "redis":
+        return RateLimiter(RedisTokenBucketStore(url=os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    return RateLimiter(InMemoryTokenBucketStore())
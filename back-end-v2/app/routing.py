@@ -0,0 +1,241 @@
+"""
+Politiques de routage entre providers LLM
+Failover avec circuit breakers, requêtes couvertes (hedging) et sélection par latence
+"""
+
+from typing import Dict, Any, List, Tuple, Callable, Awaitable, Optional
+import asyncio
+import logging
+import os
+import time
+
+from .latency import LatencyTracker, latency_tracker
+from .rate_limit import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+ROUTING_POLICIES = ("single", "failover", "hedged", "latency")
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+# Percentile de latence au-delà duquel une requête couverte est lancée
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Délai de couverture tant qu'aucune latence n'a été observée (secondes)
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "10"))
+
+Target = Tuple[str, str]
+CallFn = Callable[[str, str], Awaitable[Dict[str, Any]]]
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker d'un provider
+
+    Après `failure_threshold` échecs consécutifs, le circuit s'ouvre et le
+    provider est écarté pendant `reset_timeout` secondes. Un seul appel d'essai
+    est ensuite autorisé (demi-ouvert) : un succès referme le circuit, les
+    autres appels restent écartés jusqu'à l'issue de l'essai.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Appel d'essai en cours (demi-ouvert)
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def available(self) -> bool:
+        """Un appel serait autorisé (sans réserver l'appel d'essai)"""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self.probing)
+
+    def allow(self) -> bool:
+        """Autoriser un appel ; en demi-ouvert, réserve l'unique appel d'essai"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Appel d'essai abandonné sans résultat (annulation)"""
+        self.probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class NoAvailableProviderError(Exception):
+    """Aucun provider n'a pu traiter la requête"""
+    pass
+
+
+class CircuitOpenError(Exception):
+    """Provider écarté par son circuit breaker (ouvert ou essai déjà en cours)"""
+    pass
+
+
+def _rate_limited(errors: List[Exception]) -> Optional[RateLimitExceeded]:
+    """Si toutes les cibles ont été refusées par le contrôle d'admission, le refus le plus court"""
+    if not errors or not all(isinstance(error, RateLimitExceeded) for error in errors):
+        return None
+    retryable = [error for error in errors if error.retry_after is not None]
+    return min(retryable, key=lambda error: error.retry_after) if retryable else errors[0]
+
+
+class LLMRouter:
+    """Exécution d'un appel LLM selon une politique de routage"""
+
+    def __init__(self, tracker: LatencyTracker = latency_tracker):
+        self.tracker = tracker
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            self.breakers[provider] = breaker
+        return breaker
+
+    async def execute(self, policy: str, targets: List[Target], call: CallFn) -> Dict[str, Any]:
+        """
+        Exécuter l'appel sur les cibles (provider, modèle) selon la politique
+
+        Returns:
+            Dict contenant result (résultat de `call`), llm_provider et llm_model
+            de la cible retenue, et hedged (une requête couverte a été lancée)
+
+        Raises:
+            NoAvailableProviderError: Si aucune cible n'a abouti (failover, hedged, latency)
+            RateLimitExceeded: Si `call` a refusé chaque cible tentée faute de capacité
+        """
+        if policy == "single":
+            # Pas d'alternative : le provider demandé est appelé quel que soit son circuit
+            provider, model = targets[0]
+            result = await self._call(call, provider, model, gated=False)
+            return {"result": result, "llm_provider": provider, "llm_model": model, "hedged": False}
+
+        if policy == "latency":
+            targets = self._by_latency(targets)
+        if policy == "hedged":
+            return await self._hedged(targets, call)
+        return await self._failover(targets, call)
+
+    async def _call(self, call: CallFn, provider: str, model: str, gated: bool = True) -> Dict[str, Any]:
+        breaker = self.breaker(provider)
+        if gated and not breaker.allow():
+            raise CircuitOpenError(f"circuit open for {provider}")
+        probe = gated and breaker.state == breaker.HALF_OPEN
+        try:
+            result = await call(provider, model)
+        except (asyncio.CancelledError, RateLimitExceeded):
+            # Appel non transmis au provider : ni succès ni échec du circuit
+            if probe:
+                breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    def _available(self, targets: List[Target]) -> List[Target]:
+        return [target for target in targets if self.breaker(target[0]).available()]
+
+    def _by_latency(self, targets: List[Target]) -> List[Target]:
+        # Les cibles sans observation passent en premier pour être mesurées
+        return sorted(targets, key=lambda target: self.tracker.ewma(*target) or 0.0)
+
+    async def _failover(self, targets: List[Target], call: CallFn) -> Dict[str, Any]:
+        errors = []
+        exceptions = []
+        for provider, model in self._available(targets):
+            try:
+                result = await self._call(call, provider, model)
+                return {"result": result, "llm_provider": provider, "llm_model": model, "hedged": False}
+            except Exception as e:
+                logger.warning(f"LLM provider {provider}/{model} failed, trying next: {str(e)}")
+                errors.append(f"{provider}/{model}: {str(e)}")
+                exceptions.append(e)
+        rate_limited = _rate_limited(exceptions)
+        if rate_limited is not None:
+            raise rate_limited
+        raise NoAvailableProviderError("All LLM providers failed: " + ("; ".join(errors) or "all circuits open"))
+
+    async def _hedged(self, targets: List[Target], call: CallFn) -> Dict[str, Any]:
+        candidates = self._available(targets)
+        if not candidates:
+            raise NoAvailableProviderError("All LLM providers failed: all circuits open")
+
+        pending: Dict[asyncio.Task, Target] = {}
+        errors = []
+        exceptions = []
+        hedged = False
+
+        def launch(target: Target) -> None:
+            pending[asyncio.create_task(self._call(call, *target))] = target
+
+        launch(candidates.pop(0))
+        try:
+            while pending:
+                # Attendre le p95 de la cible principale avant de couvrir la requête
+                timeout = None
+                if candidates:
+                    primary = next(iter(pending.values()))
+                    timeout = self.tracker.percentile(primary[0], primary[1], HEDGE_PERCENTILE) or HEDGE_DEFAULT_DELAY
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    logger.info(f"Hedging LLM request to {candidates[0][0]}/{candidates[0][1]}")
+                    launch(candidates.pop(0))
+                    continue
+
+                for task in done:
+                    provider, model = pending.pop(task)
+                    if task.exception() is None:
+                        return {"result": task.result(), "llm_provider": provider, "llm_model": model, "hedged": hedged}
+                    errors.append(f"{provider}/{model}: {str(task.exception())}")
+                    exceptions.append(task.exception())
+
+                # Échec rapide : passer immédiatement à la cible suivante
+                if not pending and candidates:
+                    launch(candidates.pop(0))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        rate_limited = _rate_limited(exceptions)
+        if rate_limited is not None:
+            raise rate_limited
+        raise NoAvailableProviderError("All LLM providers failed: " + "; ".join(errors))
+
+    def breaker_states(self) -> Dict[str, str]:
+        return {provider: breaker.state for provider, breaker in self.breakers.items()}
+
+
+llm_router = LLMRouter()
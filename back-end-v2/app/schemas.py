@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 from pydantic import BaseModel, Field, EmailStr
 
@@ -95,14 +95,54 @@ class ExpertPromptResponse(ExpertPromptBase):
     class Config:
         from_attributes = True
 
+class ExpertPromptSearchHit(ExpertPromptResponse):
+    score: float
+
+class ExpertPromptSearchResponse(BaseModel):
+    query: str
+    total: int
+    results: List[ExpertPromptSearchHit]
+
+class PromptSuggestionRequest(BaseModel):
+    task: str = Field(..., min_length=1, max_length=4000)
+    sub_specialty_id: Optional[int] = None
+    k: int = Field(10, ge=1, le=100)
+
+# --- Catalog Tree Schemas ---
+class CatalogTreeSubSpecialty(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    # Champs choisis par le paramètre `fields`
+    expert_prompts: List[Dict[str, Any]]
+
+class CatalogTreeSpecialty(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    icon_url: Optional[str] = None
+    sub_specialties: List[CatalogTreeSubSpecialty]
+
 # --- Prompt Execution Schemas ---
-class PromptExecutionRequest(BaseModel):
-    variables: Dict[str, Any] = Field(default_factory=dict)
+class PromptExecutionParameters(BaseModel):
     llm_provider: Optional[str] = "openai"
     llm_model: Optional[str] = "gpt-4"
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = None
 
+class LLMTarget(BaseModel):
+    llm_provider: str
+    llm_model: Optional[str] = None
+
+class PromptExecutionRequest(PromptExecutionParameters):
+    variables: Dict[str, Any] = Field(default_factory=dict)
+    # Routage : single (défaut), failover, hedged ou latency
+    routing_policy: Optional[Literal["single", "failover", "hedged", "latency"]] = None
+    fallbacks: Optional[List[LLMTarget]] = None
+
+class PromptBatchExecutionRequest(PromptExecutionParameters):
+    variable_sets: List[Dict[str, Any]] = Field(..., min_length=1, max_length=1000)
+
 class PromptExecutionResponse(BaseModel):
     execution_id: int
     prompt_id: int
@@ -113,6 +153,36 @@ class PromptExecutionResponse(BaseModel):
     cost: float
     execution_time: float
     status: str
+    cached: bool = False
+    hedged: bool = False
+
+class PromptEstimateResponse(BaseModel):
+    prompt_id: int
+    llm_provider: str
+    llm_model: str
+    input_tokens: int
+    context_window: Optional[int] = None
+    remaining_context_tokens: Optional[int] = None
+    max_output_tokens: Optional[int] = None
+    fits_in_context: bool
+    cost_min: float
+    cost_max: Optional[float] = None
+    estimated_latency_seconds: Optional[float] = None
+    max_latency_seconds: Optional[float] = None
+
+class PromptBatchItemResult(BaseModel):
+    index: int
+    status: str
+    output: Optional[str] = None
+    tokens_used: int = 0
+    cost: float = 0.0
+    execution_time: float
+    cached: bool = False
+    error_message: Optional[str] = None
+
+class JobSubmissionResponse(BaseModel):
+    job_id: int
+    status: str
 
 # --- Execution History Schemas ---
 class ExecutionHistoryResponse(BaseModel):
@@ -128,11 +198,38 @@ class ExecutionHistoryResponse(BaseModel):
     execution_time: float
     status: str
     error_message: Optional[str]
+    cached: bool = False
+    hedged: bool = False
     created_at: datetime
+    output_truncated: bool = False  # output est un aperçu de la sortie compressée
 
     class Config:
         from_attributes = True
 
+# --- Analytics Schemas ---
+class ExecutionAnalyticsGroup(BaseModel):
+    bucket_start: Optional[datetime] = None
+    user_id: Optional[int] = None
+    prompt_id: Optional[int] = None
+    llm_provider: Optional[str] = None
+    llm_model: Optional[str] = None
+    executions: int
+    errors: int
+    cached: int
+    tokens_used: int
+    cost: float
+    avg_execution_time: float
+    p50_execution_time: Optional[float] = None
+    p95_execution_time: Optional[float] = None
+    p99_execution_time: Optional[float] = None
+
+class ExecutionAnalyticsResponse(BaseModel):
+    granularity: Literal["hour", "day"]
+    start: datetime
+    end: datetime
+    group_by: List[str]
+    groups: List[ExecutionAnalyticsGroup]
+
 # --- LLMProvider Schemas ---
 class LLMProviderBase(BaseModel):
     name: str
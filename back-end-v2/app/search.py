@@ -0,0 +1,359 @@
+"""
+Recherche plein texte des prompts experts
+Index inversé en mémoire (développement) ou tsvector/GIN PostgreSQL (production)
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import math
+import os
+import re
+import unicodedata
+
+from sqlalchemy import TextClause, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import DATABASE_URL, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Poids des champs indexés (titre > spécialités > résultat attendu > template)
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "specialties": 2.0,
+    "expected_output": 1.0,
+    "template": 1.0,
+}
+
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Pénalité des termes trouvés par préfixe ou par approximation plutôt qu'à l'identique
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SearchHits = Tuple[int, List[Tuple[int, float]]]
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Découper un texte en termes normalisés (minuscules, sans accents)"""
+    if not value:
+        return []
+    folded = unicodedata.normalize("NFKD", value.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return [token for token in _TOKEN_RE.findall(folded) if len(token) > 1 or token.isdigit()]
+
+
+def _within_edit_distance(a: str, b: str, max_distance: int) -> bool:
+    """Distance de Levenshtein bornée (arrêt dès que la borne est dépassée)"""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+
+class SearchIndex(ABC):
+    """Classe abstraite des index de recherche des prompts experts"""
+
+    async def startup(self) -> None:
+        """Construire l'index au démarrage de l'application"""
+        pass
+
+    async def add(self, db: AsyncSession, prompt_id: int) -> None:
+        """Indexer un prompt venant d'être créé"""
+        pass
+
+    @abstractmethod
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        sub_specialty_id: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> SearchHits:
+        """
+        Rechercher les prompts correspondant à la requête
+
+        Le dernier terme de la requête est recherché par préfixe (saisie en cours).
+
+        Returns:
+            (nombre total de résultats, [(prompt_id, score)] de la page, par score décroissant)
+        """
+        pass
+
+
+class _Document:
+    __slots__ = ("sub_specialty_id", "length", "terms")
+
+    def __init__(self, sub_specialty_id: int, length: float, terms: Dict[str, float]):
+        self.sub_specialty_id = sub_specialty_id
+        self.length = length
+        self.terms = terms
+
+
+class InMemorySearchIndex(SearchIndex):
+    """
+    Index inversé en mémoire, classement BM25 pondéré par champ
+
+    Les termes de la requête doivent tous être présents (ET logique). Un terme
+    absent du vocabulaire est recherché par approximation (distance d'édition
+    de 1, ou 2 pour les termes longs, parmi les termes de même initiale).
+    """
+
+    def __init__(self):
+        self._documents: Dict[int, _Document] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._vocabulary: List[str] = []
+        self._total_length = 0.0
+
+    @staticmethod
+    def _fields_query():
+        return (
+            select(
+                models.ExpertPrompt.id,
+                models.ExpertPrompt.sub_specialty_id,
+                models.ExpertPrompt.title,
+                models.ExpertPrompt.template,
+                models.ExpertPrompt.expected_output,
+                models.SubSpecialty.name,
+                models.Specialty.name,
+            )
+            .join(models.SubSpecialty, models.ExpertPrompt.sub_specialty_id == models.SubSpecialty.id)
+            .join(models.Specialty, models.SubSpecialty.specialty_id == models.Specialty.id)
+        )
+
+    def _index_row(self, row) -> None:
+        prompt_id, sub_specialty_id, title, template, expected_output, sub_specialty_name, specialty_name = row
+        fields = {
+            "title": title,
+            "specialties": f"{specialty_name} {sub_specialty_name}",
+            "expected_output": expected_output,
+            "template": template,
+        }
+        terms: Dict[str, float] = defaultdict(float)
+        for field, value in fields.items():
+            for token in tokenize(value):
+                terms[token] += FIELD_WEIGHTS[field]
+
+        if prompt_id in self._documents:
+            self._remove(prompt_id)
+        length = sum(terms.values())
+        self._documents[prompt_id] = _Document(sub_specialty_id, length, dict(terms))
+        self._total_length += length
+        for term in terms:
+            if term not in self._postings:
+                insort(self._vocabulary, term)
+            self._postings[term].add(prompt_id)
+
+    def _remove(self, prompt_id: int) -> None:
+        document = self._documents.pop(prompt_id)
+        self._total_length -= document.length
+        for term in document.terms:
+            self._postings[term].discard(prompt_id)
+
+    def rebuild(self) -> None:
+        """Construire l'index à partir de tous les prompts (session synchrone)"""
+        db = SessionLocal()
+        try:
+            rows = db.execute(self._fields_query()).all()
+        finally:
+            db.close()
+
+        self._documents.clear()
+        self._postings.clear()
+        self._vocabulary = []
+        self._total_length = 0.0
+        for row in rows:
+            self._index_row(row)
+        logger.info(f"Indexed {len(self._documents)} expert prompts for search")
+
+    async def startup(self) -> None:
+        await asyncio.to_thread(self.rebuild)
+
+    async def add(self, db: AsyncSession, prompt_id: int) -> None:
+        row = (await db.execute(self._fields_query().where(models.ExpertPrompt.id == prompt_id))).first()
+        if row is not None:
+            self._index_row(row)
+
+    def _expand(self, term: str, prefix: bool) -> Dict[str, float]:
+        """Termes du vocabulaire correspondant à un terme de la requête, avec leur facteur"""
+        expansions = {}
+        if self._postings.get(term):
+            expansions[term] = 1.0
+        if prefix:
+            index = bisect_left(self._vocabulary, term)
+            while index < len(self._vocabulary) and self._vocabulary[index].startswith(term):
+                candidate = self._vocabulary[index]
+                if candidate != term and self._postings.get(candidate):
+                    expansions[candidate] = PREFIX_FACTOR
+                index += 1
+        return expansions
+
+    def _fuzzy(self, term: str) -> Dict[str, float]:
+        """
+        Termes du vocabulaire à distance d'édition 1 (2 pour les termes longs)
+
+        Seuls les termes de même initiale et de longueur compatible sont
+        comparés ; le vocabulaire étant trié, ils forment une tranche contiguë.
+        """
+        max_distance = 2 if len(term) >= 8 else 1
+        start = bisect_left(self._vocabulary, term[0])
+        end = bisect_left(self._vocabulary, chr(ord(term[0]) + 1))
+        expansions = {}
+        for candidate in self._vocabulary[start:end]:
+            if (
+                abs(len(candidate) - len(term)) <= max_distance
+                and self._postings.get(candidate)
+                and _within_edit_distance(term, candidate, max_distance)
+            ):
+                expansions[candidate] = FUZZY_FACTOR
+        return expansions
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        sub_specialty_id: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> SearchHits:
+        terms = tokenize(query)
+        if not terms or not self._documents:
+            return 0, []
+
+        document_count = len(self._documents)
+        average_length = self._total_length / document_count or 1.0
+        scores: Optional[Dict[int, float]] = None
+
+        for position, term in enumerate(terms):
+            expansions = self._expand(term, prefix=position == len(terms) - 1)
+            if not expansions and len(term) >= 4:
+                # Approximation hors de la boucle d'événements
+                expansions = await asyncio.to_thread(self._fuzzy, term)
+            term_scores: Dict[int, float] = defaultdict(float)
+            for candidate, factor in expansions.items():
+                postings = self._postings[candidate]
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for prompt_id in postings:
+                    document = self._documents[prompt_id]
+                    if sub_specialty_id and document.sub_specialty_id != sub_specialty_id:
+                        continue
+                    frequency = document.terms[candidate]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * document.length / average_length)
+                    term_scores[prompt_id] = max(
+                        term_scores[prompt_id],
+                        factor * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    )
+
+            # ET logique : ne garder que les documents contenant tous les termes
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {
+                    prompt_id: score + term_scores[prompt_id]
+                    for prompt_id, score in scores.items()
+                    if prompt_id in term_scores
+                }
+            if not scores:
+                return 0, []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return len(ranked), [(prompt_id, round(score, 4)) for prompt_id, score in ranked[offset:offset + limit]]
+
+
+class PostgresSearchIndex(SearchIndex):
+    """
+    Recherche via la colonne expert_prompts.search_vector (tsvector, index GIN)
+
+    La colonne est maintenue par le trigger de migrations/004_expert_prompts_search.sql,
+    y compris à la création d'un prompt. Sans résultat plein texte, la recherche
+    se replie sur la similarité des trigrammes du titre (pg_trgm, index de
+    migrations/008_expert_prompts_title_trgm_unaccent.sql).
+    """
+
+    FULL_TEXT_QUERY = text("""
+        SELECT id, ts_rank_cd(search_vector, query) AS score, count(*) OVER () AS total
+        FROM expert_prompts, to_tsquery('simple', unaccent(:query)) AS query
+        WHERE search_vector @@ query
+          AND (CAST(:sub_specialty_id AS INTEGER) IS NULL OR sub_specialty_id = :sub_specialty_id)
+        ORDER BY score DESC, id
+        LIMIT :limit OFFSET :offset
+    """)
+
+    FUZZY_QUERY = text("""
+        SELECT id, similarity(immutable_unaccent(title), immutable_unaccent(:text)) AS score, count(*) OVER () AS total
+        FROM expert_prompts
+        WHERE immutable_unaccent(title) % immutable_unaccent(:text)
+          AND (CAST(:sub_specialty_id AS INTEGER) IS NULL OR sub_specialty_id = :sub_specialty_id)
+        ORDER BY score DESC, id
+        LIMIT :limit OFFSET :offset
+    """)
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        sub_specialty_id: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> SearchHits:
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+
+        # Termes réduits à \w+ : aucun opérateur tsquery ne provient de l'utilisateur
+        ts_query = " & ".join(terms[:-1] + [terms[-1] + ":*"])
+        # Le repli dépend de l'existence de résultats plein texte, pas de la page
+        # demandée : toutes les pages d'une requête viennent de la même recherche
+        hits = await self._page(
+            db, self.FULL_TEXT_QUERY, {"sub_specialty_id": sub_specialty_id, "query": ts_query}, offset, limit
+        )
+        if hits is None:
+            hits = await self._page(
+                db, self.FUZZY_QUERY, {"sub_specialty_id": sub_specialty_id, "text": " ".join(terms)}, offset, limit
+            )
+        return hits or (0, [])
+
+    @staticmethod
+    async def _page(db: AsyncSession, query: TextClause, params: Dict, offset: int, limit: int) -> Optional[SearchHits]:
+        """Page de résultats d'une requête, ou None si elle n'a aucun résultat"""
+        rows = (await db.execute(query, {**params, "offset": offset, "limit": limit})).all()
+        if rows:
+            return rows[0].total, [(row.id, round(float(row.score), 4)) for row in rows]
+        if offset == 0:
+            return None
+        # Page au-delà des résultats : renvoyer le total réel avec une page vide
+        first = (await db.execute(query, {**params, "offset": 0, "limit": 1})).first()
+        return (first.total, []) if first is not None else None
+
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")  # auto, postgres, memory
+
+
+def create_search_index() -> SearchIndex:
+    """Créer l'index de recherche (PostgreSQL si la base l'est, sauf configuration contraire)"""
+    backend = SEARCH_BACKEND
+    if backend == "auto":
+        backend = "postgres" if DATABASE_URL.startswith(("postgresql", "postgres://")) else "memory"
+    if backend == "postgres":
+        return PostgresSearchIndex()
+    return InMemorySearchIndex()
@@ -0,0 +1,40 @@
+"""
+Sérialisation JSON rapide (orjson) des réponses
+Les listes volumineuses sont encodées directement depuis les lignes ORM, sans
+construire d'objets Pydantic intermédiaires
+"""
+
+from typing import Any, Dict, Iterable, List, Sequence, Type
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+__all__ = ["ORJSONResponse", "dumps", "response_fields", "rows_to_dicts", "serialize_rows"]
+
+
+def dumps(value: Any) -> bytes:
+    """Encoder en JSON UTF-8 (datetime en ISO 8601, clés non str acceptées)"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+def response_fields(schema: Type[BaseModel]) -> List[str]:
+    """Champs d'un schéma de réponse, dans l'ordre de déclaration"""
+    return list(schema.model_fields)
+
+
+def rows_to_dicts(rows: Iterable[Any], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    return [{field: getattr(row, field) for field in fields} for row in rows]
+
+
+def serialize_rows(schema: Type[BaseModel], rows: Any) -> bytes:
+    """
+    Sérialiser une ligne ORM ou une liste de lignes avec les champs de `schema`
+
+    Les attributs sont lus tels quels : à réserver aux schémas dont tous les
+    champs correspondent à des colonnes (aucune conversion ni valeur calculée).
+    """
+    fields = response_fields(schema)
+    if isinstance(rows, list):
+        return dumps(rows_to_dicts(rows, fields))
+    return dumps(rows_to_dicts([rows], fields)[0])
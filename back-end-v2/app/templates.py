@@ -0,0 +1,121 @@
+"""
+Moteur de templates précompilés pour PIVORI Studio
+Les templates des prompts experts sont analysés une seule fois par version
+"""
+
+from typing import Dict, Any, FrozenSet, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import string
+import threading
+
+_formatter = string.Formatter()
+
+
+class CompiledTemplate:
+    """
+    Template analysé une seule fois
+
+    Les segments littéraux sont pré-découpés : le rendu se résume à une
+    jointure des littéraux et des valeurs des variables. Les champs avancés
+    de str.format (attributs, index, conversion, format) restent supportés
+    via str.format.
+    """
+
+    __slots__ = ("source", "placeholders", "_parts", "_simple")
+
+    def __init__(self, source: str):
+        """
+        Raises:
+            ValueError: Si le template est mal formé
+        """
+        self.source = source
+        parts: List[Tuple[str, Optional[str]]] = []
+        placeholders = set()
+        simple = True
+
+        for literal, field_name, format_spec, conversion in _formatter.parse(source):
+            if field_name is None:
+                parts.append((literal, None))
+                continue
+
+            root = field_name.split(".", 1)[0].split("[", 1)[0]
+            if not root or root.isdigit():
+                raise ValueError(f"Positional placeholder not supported in template: {{{field_name}}}")
+
+            placeholders.add(root)
+            if root != field_name or format_spec or conversion:
+                simple = False
+                if format_spec:
+                    # Les spécifications de format peuvent contenir des champs imbriqués
+                    for _, nested_name, _, _ in _formatter.parse(format_spec):
+                        if nested_name:
+                            placeholders.add(nested_name.split(".", 1)[0].split("[", 1)[0])
+            parts.append((literal, field_name))
+
+        self.placeholders: FrozenSet[str] = frozenset(placeholders)
+        self._parts = tuple(parts)
+        self._simple = simple
+
+    def missing(self, variables: Dict[str, Any]) -> FrozenSet[str]:
+        """Variables du template absentes de `variables`"""
+        return self.placeholders.difference(variables)
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        """
+        Injecter les variables dans le template
+
+        Raises:
+            KeyError: Si une variable du template est absente
+        """
+        if not self._simple:
+            return self.source.format(**variables)
+
+        chunks = []
+        for literal, name in self._parts:
+            if literal:
+                chunks.append(literal)
+            if name is not None:
+                chunks.append(format(variables[name]))
+        return "".join(chunks)
+
+
+class TemplateCache:
+    """Cache LRU des templates compilés, indexé par prompt et par version"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, CompiledTemplate]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, prompt_id: Hashable, version: Hashable, source: str) -> CompiledTemplate:
+        """
+        Obtenir le template compilé d'un prompt (compilé au premier appel
+        ou lorsque la version du prompt change)
+        """
+        with self._lock:
+            entry = self._entries.get(prompt_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(prompt_id)
+                return entry[1]
+
+        compiled = CompiledTemplate(source)
+
+        with self._lock:
+            self._entries[prompt_id] = (version, compiled)
+            self._entries.move_to_end(prompt_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return compiled
+
+    def invalidate(self, prompt_id: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(prompt_id, None)
+
+
+template_cache = TemplateCache()
+
+
+def get_compiled_template(prompt) -> CompiledTemplate:
+    """Obtenir le template compilé d'un ExpertPrompt (version = updated_at)"""
+    return template_cache.get(prompt.id, prompt.updated_at, prompt.template)
@@ -0,0 +1,105 @@
+"""
+Estimation locale du nombre de tokens
+Utilisée lorsque le provider ne renvoie pas l'usage réel (streaming, Gemini)
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+import hashlib
+import logging
+import math
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    import tiktoken.model
+except ImportError:  # Dépendance optionnelle
+    tiktoken = None
+
+TOKEN_ESTIMATE_CACHE_SIZE = int(os.getenv("TOKEN_ESTIMATE_CACHE_SIZE", "4096"))
+# Les textes plus courts servent directement de clé de cache, les autres par leur empreinte
+TOKEN_ESTIMATE_HASH_MIN_CHARS = 256
+
+# Encodage utilisé pour les modèles non OpenAI (approximation)
+DEFAULT_ENCODING = "cl100k_base"
+
+# Nombre moyen de caractères par token sans tokenizer
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=64)
+def _encoding_name_for_model(model: Optional[str]) -> Optional[str]:
+    if tiktoken is None:
+        return None
+    if model:
+        try:
+            # Nom seul : le chargement de l'encodage passe par _load_encoding
+            return tiktoken.model.encoding_name_for_model(model)
+        except KeyError:
+            pass
+    return DEFAULT_ENCODING
+
+
+@lru_cache(maxsize=8)
+def _load_encoding(encoding_name: str):
+    """
+    Charger un encodage tiktoken, None s'il est indisponible
+
+    Au premier usage, tiktoken télécharge le fichier BPE (sauf s'il est présent
+    dans TIKTOKEN_CACHE_DIR) : un échec (hôte hors ligne, sortie filtrée) ne doit
+    pas faire échouer les exécutions, l'approximation par caractères prend le relais.
+    """
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as exc:
+        logger.warning(f"Tokenizer '{encoding_name}' unavailable, using character estimate: {exc}")
+        return None
+
+
+def preload_encodings() -> None:
+    """Charger l'encodage par défaut au démarrage plutôt que pendant une requête"""
+    if tiktoken is not None:
+        _load_encoding(DEFAULT_ENCODING)
+
+
+_counts: "OrderedDict[Tuple[str, Optional[str]], int]" = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def _count_tokens(text: str, encoding_name: Optional[str]) -> int:
+    encoding = _load_encoding(encoding_name) if encoding_name is not None else None
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    # Cache borné en octets : les textes longs sont indexés par leur empreinte
+    text_key = text if len(text) < TOKEN_ESTIMATE_HASH_MIN_CHARS else hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = (text_key, encoding_name)
+    with _counts_lock:
+        count = _counts.get(key)
+        if count is not None:
+            _counts.move_to_end(key)
+            return count
+
+    count = len(encoding.encode(text, disallowed_special=()))
+    with _counts_lock:
+        _counts[key] = count
+        if len(_counts) > TOKEN_ESTIMATE_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return count
+
+
+def estimate_tokens(text: Optional[str], model: Optional[str] = None) -> int:
+    """
+    Estimer le nombre de tokens d'un texte
+
+    Utilise le tokenizer tiktoken lorsqu'il est installé, sinon une
+    approximation par le nombre de caractères. Les résultats sont mis
+    en cache (LRU) car les mêmes prompts reviennent souvent.
+    """
+    if not text:
+        return 0
+    return _count_tokens(text, _encoding_name_for_model(model))
@@ -3,20 +3,117 @@ Validators pour PIVORI Studio
 Validation des variables contre les schémas JSON
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Hashable
+from collections import OrderedDict
 from jsonschema import validate, ValidationError, Draft7Validator
+from prometheus_client import Counter
+import hashlib
+import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+validator_cache_requests = Counter(
+    'variables_validator_cache_requests_total',
+    'Compiled variables validator cache lookups',
+    ['result']
+)
 
-def validate_variables_against_schema(variables: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+
+class CompiledSchema:
+    """Validateur compilé et valeurs par défaut précalculées d'un schéma"""
+    
+    __slots__ = ("validator", "defaults")
+    
+    def __init__(self, schema: Dict[str, Any]):
+        self.validator = Draft7Validator(schema)
+        self.defaults = {
+            prop_name: prop_schema["default"]
+            for prop_name, prop_schema in schema.get("properties", {}).items()
+            if isinstance(prop_schema, dict) and "default" in prop_schema
+        }
+
+
+class ValidatorCache:
+    """
+    Cache LRU des schémas compilés
+    
+    Les entrées sont indexées par une clé fournie par l'appelant, par exemple
+    (prompt_id, updated_at), ou à défaut par le hash du schéma. Une clé de la
+    forme (prompt_id, version) remplace l'entrée précédente du même prompt.
+    """
+    
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CompiledSchema]" = OrderedDict()
+        self._prompt_keys: Dict[Any, Hashable] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def schema_key(schema: Dict[str, Any]) -> str:
+        payload = json.dumps(schema, sort_keys=True, default=str)
+        return "schema:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, schema: Dict[str, Any], cache_key: Optional[Hashable] = None) -> CompiledSchema:
+        key = cache_key if cache_key is not None else self.schema_key(schema)
+        
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                validator_cache_requests.labels(result='hit').inc()
+                return compiled
+        
+        validator_cache_requests.labels(result='miss').inc()
+        compiled = CompiledSchema(schema)
+        
+        with self._lock:
+            if isinstance(key, tuple):
+                # Nouvelle version d'un prompt : oublier la précédente
+                previous_key = self._prompt_keys.get(key[0])
+                if previous_key is not None and previous_key != key:
+                    self._entries.pop(previous_key, None)
+                self._prompt_keys[key[0]] = key
+            
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                if isinstance(evicted_key, tuple):
+                    self._prompt_keys.pop(evicted_key[0], None)
+        
+        return compiled
+    
+    def invalidate(self, prompt_id: Any) -> None:
+        """Oublier le schéma compilé d'un prompt"""
+        with self._lock:
+            key = self._prompt_keys.pop(prompt_id, None)
+            if key is not None:
+                self._entries.pop(key, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._prompt_keys.clear()
+
+
+validator_cache = ValidatorCache()
+
+
+def validate_variables_against_schema(
+    variables: Dict[str, Any],
+    schema: Dict[str, Any],
+    cache_key: Optional[Hashable] = None
+) -> Dict[str, Any]:
     """
     Valide les variables contre un schéma JSON et enrichit avec les valeurs par défaut
     
     Args:
         variables: Dictionnaire des variables fournies
         schema: Schéma JSON définissant les variables attendues
+        cache_key: Clé du schéma compilé, par exemple (prompt_id, updated_at).
+            À défaut, le schéma est identifié par son hash.
     
     Returns:
         Dictionnaire des variables validées et enrichies
@@ -28,9 +125,9 @@ def validate_variables_against_schema(variables: Dict[str, Any], schema: Dict[st
         # Pas de schéma = pas de validation
         return variables
     
-    # Créer un validateur
-    validator = Draft7Validator(schema)
-    errors = list(validator.iter_errors(variables))
+    # Récupérer le validateur compilé
+    compiled = validator_cache.get(schema, cache_key)
+    errors = list(compiled.validator.iter_errors(variables))
     
     if errors:
         error_messages = []
@@ -44,12 +141,11 @@ def validate_variables_against_schema(variables: Dict[str, Any], schema: Dict[st
     
     # Enrichir avec les valeurs par défaut
     enriched = variables.copy()
-    properties = schema.get("properties", {})
     
-    for prop_name, prop_schema in properties.items():
-        if prop_name not in enriched and "default" in prop_schema:
-            enriched[prop_name] = prop_schema["default"]
-            logger.info(f"Added default value for '{prop_name}': {prop_schema['default']}")
+    for prop_name, default in compiled.defaults.items():
+        if prop_name not in enriched:
+            enriched[prop_name] = default
+            logger.debug(f"Added default value for '{prop_name}': {default}")
     
     return enriched
 
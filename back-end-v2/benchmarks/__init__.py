@@ -0,0 +1 @@
+# Benchmarks de performance du backend PIVORI Studio
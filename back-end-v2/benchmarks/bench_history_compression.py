@@ -0,0 +1,171 @@
+"""
+Benchmark : compression des sorties de l'historique au repos
+
+Génère des sorties LLM synthétiques (texte structuré de 8 à 40 Ko), puis :
+- compare le taux de compression zstd sans dictionnaire et avec un dictionnaire
+  entraîné sur un échantillon des sorties ;
+- insère N lignes dans deux bases SQLite temporaires (sorties en clair vs
+  compressées par app.compression) et compare la taille des fichiers ;
+- mesure la latence médiane d'une page de la liste de l'historique (requête +
+  construction des réponses + JSON) : sorties complètes vs aperçus.
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_history_compression --rows 20000 --page-size 100
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import zstandard
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker, undefer
+
+SECTIONS = ["Contexte", "Analyse", "Points de vigilance", "Recommandations", "Prochaines étapes", "Sources"]
+SENTENCES = [
+    "Le patient présente {n} facteurs de risque identifiés lors de l'examen initial.",
+    "Selon l'article L.{n} du Code, la clause doit être notifiée dans un délai de {m} jours.",
+    "Le chiffre d'affaires progresse de {n} % sur le trimestre, porté par le segment {m}.",
+    "Il est recommandé de réévaluer la situation sous {m} semaines en fonction des résultats.",
+    "Les données disponibles ne permettent pas de conclure avec certitude sur le point {n}.",
+    "Une vérification complémentaire auprès d'un spécialiste est conseillée avant toute décision.",
+    "- Étape {n} : documenter les hypothèses retenues et les valider avec l'équipe.",
+    "| Indicateur {n} | {m} | conforme |",
+]
+
+
+def synthetic_output(rng: random.Random) -> str:
+    target = rng.randint(8000, 40000)
+    parts = []
+    size = 0
+    while size < target:
+        section = f"## {rng.choice(SECTIONS)}\n\n"
+        body = " ".join(
+            rng.choice(SENTENCES).format(n=rng.randint(1, 999), m=rng.randint(1, 90))
+            for _ in range(rng.randint(4, 12))
+        )
+        parts.append(section + body + "\n\n")
+        size += len(parts[-1])
+    return "".join(parts)
+
+
+def seed(Session, models, codec, outputs, rows: int, compress: bool, batch_size: int = 1000) -> int:
+    db = Session()
+    try:
+        user = models.User(email="bench-compression@example.com", username="bench-compression", hashed_password="x")
+        specialty = models.Specialty(name="Benchmark")
+        sub_specialty = models.SubSpecialty(specialty=specialty, name="Compression")
+        prompt = models.ExpertPrompt(sub_specialty=sub_specialty, title="Prompt", template="{text}")
+        db.add_all([user, specialty, sub_specialty, prompt])
+        db.commit()
+
+        start = datetime.utcnow() - timedelta(seconds=rows)
+        for offset in range(0, rows, batch_size):
+            batch = [
+                {
+                    "prompt_id": prompt.id,
+                    "user_id": user.id,
+                    "variables": {"text": "bench"},
+                    "output": outputs[index % len(outputs)],
+                    "llm_provider": "openai",
+                    "llm_model": "gpt-4",
+                    "tokens_used": 1000,
+                    "cost": 0.01,
+                    "execution_time": 2.0,
+                    "status": "success",
+                    "cached": False,
+                    "hedged": False,
+                    "created_at": start + timedelta(seconds=index),
+                }
+                for index in range(offset, min(offset + batch_size, rows))
+            ]
+            if compress:
+                batch = codec.encode_rows(batch)
+            db.execute(insert(models.PromptExecutionHistory), batch)
+            db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def median_ms(func, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def main(args) -> None:
+    from app import models
+    from app.compression import HistoryCodec
+    from app.pagination import keyset_page
+
+    rng = random.Random(42)
+    outputs = [synthetic_output(rng) for _ in range(args.distinct_outputs)]
+    raw = [output.encode("utf-8") for output in outputs]
+    raw_bytes = sum(len(data) for data in raw)
+
+    plain = zstandard.ZstdCompressor(level=args.level)
+    plain_bytes = sum(len(plain.compress(data)) for data in raw)
+    dictionary = zstandard.train_dictionary(args.dict_size, raw[:args.training_samples], level=args.level)
+    codec = HistoryCodec(level=args.level)
+    codec.use_dictionary(dictionary)
+    dict_bytes = sum(len(codec.compress(data)) for data in raw)
+    print(f"{len(raw)} outputs, {raw_bytes / len(raw) / 1024:.1f} KiB on average")
+    print(f"zstd level {args.level}        ratio={raw_bytes / plain_bytes:6.2f}x")
+    print(f"zstd level {args.level} + dict ratio={raw_bytes / dict_bytes:6.2f}x  (dictionary {args.dict_size // 1024} KiB)")
+
+    directory = tempfile.mkdtemp()
+    History = models.PromptExecutionHistory
+    for label, compress in (("plain", False), ("compressed", True)):
+        path = os.path.join(directory, f"bench_{label}.db")
+        engine = create_engine(f"sqlite:///{path}")
+        models.Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        user_id = seed(Session, models, codec, outputs, args.rows, compress)
+
+        db = Session()
+        try:
+            base = db.query(History).filter(History.user_id == user_id).options(undefer(History.variables_zstd))
+
+            def list_page(full_output: bool) -> bytes:
+                rows = keyset_page(base, History, None, args.page_size).all()
+                return json.dumps([
+                    {
+                        "id": row.id,
+                        "variables": codec.variables(row),
+                        "output": codec.output(row) if full_output or not row.output_compressed else row.output,
+                        "output_truncated": bool(row.output_compressed) and not full_output,
+                        "created_at": row.created_at.isoformat(),
+                    }
+                    for row in rows
+                ]).encode("utf-8")
+
+            size_mib = os.path.getsize(path) / 1024 / 1024
+            line = f"{label:>10}: {size_mib:9.1f} MiB  list={median_ms(lambda: list_page(False), args.repeat):7.2f}ms"
+            if compress:
+                base = base.options(undefer(History.output_zstd))
+                line += f"  list(full outputs)={median_ms(lambda: list_page(True), args.repeat):7.2f}ms"
+            print(line)
+        finally:
+            db.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--distinct-outputs", type=int, default=2000)
+    parser.add_argument("--training-samples", type=int, default=500)
+    parser.add_argument("--dict-size", type=int, default=112640)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,121 @@
+"""
+Benchmark : pagination de l'historique par OFFSET vs par curseur (created_at, id)
+
+Insère N lignes d'historique pour un même utilisateur (1M par défaut) dans une
+base SQLite temporaire ou dans DATABASE_URL, puis mesure la latence médiane
+d'une page à différentes profondeurs :
+- offset : ORDER BY created_at DESC LIMIT n OFFSET profondeur
+- keyset : WHERE (created_at, id) < curseur ORDER BY created_at DESC, id DESC LIMIT n
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_history_pagination --rows 1000000 --page-size 100
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+
+def seed(Session, models, rows: int, batch_size: int = 10000) -> int:
+    """Créer un utilisateur, un prompt et `rows` exécutions ; renvoyer l'id de l'utilisateur"""
+    db = Session()
+    try:
+        user = models.User(email="bench-history@example.com", username="bench-history", hashed_password="x")
+        specialty = models.Specialty(name="Benchmark")
+        sub_specialty = models.SubSpecialty(specialty=specialty, name="Historique")
+        prompts = [
+            models.ExpertPrompt(sub_specialty=sub_specialty, title=f"Prompt {index}", template="{text}")
+            for index in range(10)
+        ]
+        db.add_all([user, specialty, sub_specialty, *prompts])
+        db.commit()
+        user_id = user.id
+        prompt_ids = [prompt.id for prompt in prompts]
+
+        start = datetime.utcnow() - timedelta(seconds=rows)
+        for offset in range(0, rows, batch_size):
+            db.execute(insert(models.PromptExecutionHistory), [
+                {
+                    "prompt_id": prompt_ids[index % len(prompt_ids)],
+                    "user_id": user_id,
+                    "variables": {"text": "bench"},
+                    "output": "output",
+                    "llm_provider": "openai",
+                    "llm_model": "gpt-4",
+                    "tokens_used": 100,
+                    "cost": 0.001,
+                    "execution_time": 0.5,
+                    "status": "error" if index % 20 == 0 else "success",
+                    "cached": False,
+                    "hedged": False,
+                    # Horodatages en partie identiques pour exercer le départage par id
+                    "created_at": start + timedelta(seconds=index // 2),
+                }
+                for index in range(offset, min(offset + batch_size, rows))
+            ])
+            db.commit()
+        return user_id
+    finally:
+        db.close()
+
+
+def median_ms(func, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def main(args) -> None:
+    from app import models
+    from app.pagination import encode_cursor, keyset_page
+
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_history.db')}"
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    print(f"Seeding {args.rows} history rows into {engine.url.render_as_string(hide_password=True)}...")
+    start = time.perf_counter()
+    user_id = seed(Session, models, args.rows)
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    History = models.PromptExecutionHistory
+    db = Session()
+    try:
+        base = db.query(History).filter(History.user_id == user_id)
+        for depth in (d for d in (0, 1000, 10000, 100000, args.rows - args.page_size) if 0 <= d < args.rows):
+            def offset_page():
+                return base.order_by(History.created_at.desc()).offset(depth).limit(args.page_size).all()
+
+            cursor = None
+            if depth:
+                # Curseur de la ligne précédant la page (calculé hors mesure)
+                previous = base.order_by(History.created_at.desc(), History.id.desc()).offset(depth - 1).first()
+                cursor = encode_cursor(previous.created_at, previous.id)
+
+            def keyset():
+                return keyset_page(base, History, cursor, args.page_size).all()
+
+            print(
+                f"depth={depth:>8}  offset={median_ms(offset_page, args.repeat):9.2f}ms  "
+                f"keyset={median_ms(keyset, args.repeat):7.2f}ms"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
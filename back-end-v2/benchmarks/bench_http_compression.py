@@ -0,0 +1,221 @@
+"""
+Benchmark : compression HTTP et requêtes conditionnelles sur un lien lent
+
+Lance l'API sur une base SQLite temporaire (catalogue et historique générés),
+derrière un proxy TCP local qui limite le débit et ajoute une latence
+(profil mobile : 1,6 Mbit/s, 150 ms aller-retour par défaut). Pour chaque
+route, mesure les octets reçus et la latence médiane de bout en bout :
+- identity : sans compression ;
+- gzip / br : Accept-Encoding négocié (br si le module brotli est installé) ;
+- 304 : revalidation avec l'ETag de la réponse précédente (If-None-Match).
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_http_compression --kbps 1600 --rtt 0.15 --history 200
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import uvicorn
+
+
+class ThrottledProxy:
+    """Proxy TCP limitant le débit descendant et retardant chaque sens de rtt/2"""
+
+    def __init__(self, target_port: int, kbps: float, rtt: float):
+        self.target_port = target_port
+        self.bytes_per_second = kbps * 1000 / 8
+        self.delay = rtt / 2
+        self.downstream_bytes = 0
+
+    async def _pipe(self, reader, writer, throttle: bool) -> None:
+        try:
+            while True:
+                data = await reader.read(16384)
+                if not data:
+                    break
+                await asyncio.sleep(self.delay)
+                if throttle:
+                    self.downstream_bytes += len(data)
+                    await asyncio.sleep(len(data) / self.bytes_per_second)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer) -> None:
+        server_reader, server_writer = await asyncio.open_connection("127.0.0.1", self.target_port)
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, server_writer, throttle=False),
+                self._pipe(server_reader, client_writer, throttle=True)
+            )
+        except asyncio.CancelledError:  # Arrêt du benchmark
+            pass
+
+    async def start(self, port: int):
+        return await asyncio.start_server(self._handle, "127.0.0.1", port)
+
+
+def start_api_server(port: int) -> uvicorn.Server:
+    from app.main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+WORDS = (
+    "analyse risque contrat clause client fournisseur délai paiement pénalité conformité "
+    "données personnelles traitement sécurité audit recommandation synthèse budget marge "
+    "trésorerie prévision croissance marché concurrence stratégie produit équipe objectif "
+    "indicateur performance incident procédure contrôle responsabilité assurance litige"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + f" ({rng.randint(1, 9999)})."
+
+
+async def create_fixtures(client: httpx.AsyncClient, prompts: int, history: int) -> int:
+    """Créer un catalogue et un historique ; renvoyer l'id d'une exécution"""
+    from sqlalchemy import insert
+    from app import models
+    from app.database import SessionLocal
+
+    credentials = {"email": "bench-http@example.com", "password": "bench-password"}
+    await client.post("/api/v1/auth/register", json={**credentials, "username": "bench-http"})
+    token = (await client.post("/api/v1/auth/login", json=credentials)).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    user_id = (await client.get("/api/v1/auth/me")).json()["id"]
+
+    rng = random.Random(7)
+    prompt_id = None
+    for specialty_index in range(5):
+        specialty = (await client.post("/api/v1/specialties", json={"name": f"Spécialité {specialty_index}"})).json()
+        sub_specialty = (await client.post(
+            "/api/v1/sub-specialties",
+            json={"specialty_id": specialty["id"], "name": "Analyse"}
+        )).json()
+        for index in range(prompts // 5):
+            prompt_id = (await client.post("/api/v1/expert-prompts", json={
+                "sub_specialty_id": sub_specialty["id"],
+                "title": f"Prompt expert {specialty_index}-{index}",
+                "template": " ".join(sentence(rng) for _ in range(4)) + " Document : {text}",
+                "variables_schema": {"type": "object", "properties": {"text": {"type": "string"}}},
+                "expected_output": "Rapport structuré en sections"
+            })).json()["id"]
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.execute(insert(models.PromptExecutionHistory), [
+            {
+                "prompt_id": prompt_id,
+                "user_id": user_id,
+                "variables": {"text": sentence(rng)},
+                "output": f"## Analyse {index}\n\n" + " ".join(sentence(rng) for _ in range(25)),
+                "llm_provider": "openai",
+                "llm_model": "gpt-4",
+                "tokens_used": 900,
+                "cost": 0.01,
+                "execution_time": 2.1,
+                "status": "success",
+                "cached": False,
+                "hedged": False,
+                "output_compressed": False,
+                "created_at": now - timedelta(seconds=index),
+            }
+            for index in range(history)
+        ])
+        db.commit()
+        return db.query(models.PromptExecutionHistory.id).filter_by(user_id=user_id).first()[0]
+
+
+async def measure(client: httpx.AsyncClient, proxy: ThrottledProxy, path: str, headers: dict, repeat: int):
+    latencies, sizes, response = [], [], None
+    for _ in range(repeat):
+        before = proxy.downstream_bytes
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        sizes.append(proxy.downstream_bytes - before)
+    return statistics.median(latencies) * 1000, statistics.median(sizes), response
+
+
+async def main(args) -> None:
+    from app.http_compression import brotli
+
+    proxy = ThrottledProxy(args.port, args.kbps, args.rtt)
+    proxy_server = await proxy.start(args.proxy_port)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120) as setup_client:
+        execution_id = await create_fixtures(setup_client, args.prompts, args.history)
+        authorization = setup_client.headers["Authorization"]
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    paths = [
+        "/api/v1/expert-prompts?limit=100",
+        "/api/v1/catalog/tree?fields=id,title,template",
+        f"/api/v1/executions/history?limit={args.history}",
+        f"/api/v1/executions/{execution_id}",
+    ]
+    print(f"link: {args.kbps:.0f} kbit/s, rtt {args.rtt * 1000:.0f} ms")
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.proxy_port}",
+        headers={"Authorization": authorization},
+        timeout=120
+    ) as client:
+        for path in paths:
+            print(path)
+            for encoding in encodings:
+                latency, size, response = await measure(client, proxy, path, {"Accept-Encoding": encoding}, args.repeat)
+                line = f"  {encoding:>8}: {size / 1024:8.1f} KiB  {latency:8.1f} ms"
+                etag = response.headers.get("etag")
+                if etag:
+                    latency, size, revalidated = await measure(
+                        client, proxy, path, {"Accept-Encoding": encoding, "If-None-Match": etag}, args.repeat
+                    )
+                    line += f"   {revalidated.status_code}: {size / 1024:6.1f} KiB  {latency:7.1f} ms"
+                print(line)
+    proxy_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kbps", type=float, default=1600, help="Débit descendant du lien (kbit/s)")
+    parser.add_argument("--rtt", type=float, default=0.15, help="Latence aller-retour ajoutée (secondes)")
+    parser.add_argument("--prompts", type=int, default=100)
+    parser.add_argument("--history", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--proxy-port", type=int, default=8769)
+    args = parser.parse_args()
+
+    # Configuration lue à l'import de l'application
+    if "DATABASE_URL" not in os.environ:
+        database_path = os.path.join(tempfile.mkdtemp(), "bench_http_compression.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "none")
+    os.environ.setdefault("EMBEDDING_INDEX_DIR", tempfile.mkdtemp())
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = start_api_server(args.port)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,126 @@
+"""
+Benchmark de charge : connexions simultanées et latence des autres endpoints
+
+Lance l'API sur une base SQLite temporaire, crée des comptes, puis envoie des
+connexions concurrentes tout en sondant /health. Compare :
+- avant : bcrypt exécuté directement dans la boucle d'événements
+- après : bcrypt dans le pool de threads borné de app.passwords
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_login --users 20 --logins 400 --concurrency 50
+    BCRYPT_ROUNDS=10 python -m benchmarks.bench_login
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+
+def start_api_server(port: int) -> uvicorn.Server:
+    from app.main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentiles(latencies: list) -> str:
+    if len(latencies) < 2:
+        return "p50=    n/a  p99=    n/a"
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f"p50={quantiles[49] * 1000:7.2f}ms  p99={quantiles[98] * 1000:7.2f}ms"
+
+
+async def create_users(client: httpx.AsyncClient, users: int) -> list:
+    credentials = []
+    for index in range(users):
+        email = f"bench-{index}@example.com"
+        password = f"password-{index}"
+        await client.post(
+            "/api/v1/auth/register",
+            json={"email": email, "username": f"bench-{index}", "password": password}
+        )
+        credentials.append({"email": email, "password": password})
+    return credentials
+
+
+async def run_login_storm(client: httpx.AsyncClient, credentials: list, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    login_latencies = []
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async def login(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/v1/auth/login", json=credentials[index % len(credentials)])
+            response.raise_for_status()
+            login_latencies.append(time.perf_counter() - start)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(index) for index in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return login_latencies, probe_latencies, elapsed
+
+
+async def main(args) -> None:
+    from app import passwords
+
+    offloaded_verify = passwords.verify_password
+
+    async def inline_verify(password: str, hashed_password: str):
+        # Ancien comportement : hachage dans la boucle d'événements du serveur
+        return passwords.pwd_context.verify_and_update(password, hashed_password)
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+        credentials = await create_users(client, args.users)
+        print(f"bcrypt rounds={passwords.BCRYPT_ROUNDS}  workers={passwords.PASSWORD_HASH_WORKERS}")
+
+        for label, verify in (("before", inline_verify), ("after", offloaded_verify)):
+            passwords.verify_password = verify
+            login_latencies, probe_latencies, elapsed = await run_login_storm(
+                client, credentials, args.logins, args.concurrency
+            )
+            print(
+                f"{label:<8} logins={len(login_latencies) / elapsed:7.1f}/s  "
+                f"login {percentiles(login_latencies)}  "
+                f"/health {percentiles(probe_latencies)}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    # Base jetable : doit être configurée avant l'import de l'application
+    database_path = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+
+    start_api_server(args.port)
+    asyncio.run(main(args))
@@ -0,0 +1,118 @@
+"""
+Benchmark : client LLM construit à chaque requête vs client partagé
+
+Lance un faux serveur OpenAI local, puis compare la latence p50/p99 sous
+charge concurrente entre :
+- avant : un AsyncOpenAI neuf par appel (ancien comportement de LLMFactory)
+- après : l'instance partagée du registre LLMFactory
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_provider_clients --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+
+
+def create_mock_llm_app(latency: float) -> FastAPI:
+    """Faux serveur compatible avec l'API chat completions d'OpenAI"""
+    mock = FastAPI()
+
+    @mock.post("/v1/chat/completions")
+    async def chat_completions(payload: dict):
+        await asyncio.sleep(latency)
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "mock output"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        }
+
+    return mock
+
+
+def start_mock_server(port: int, latency: float) -> uvicorn.Server:
+    config = uvicorn.Config(create_mock_llm_app(latency), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_load(call, requests: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def report(label: str, latencies: list, elapsed: float) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{label:<8} p50={quantiles[49] * 1000:7.2f}ms  p99={quantiles[98] * 1000:7.2f}ms  "
+        f"throughput={len(latencies) / elapsed:8.1f} req/s"
+    )
+
+
+async def main(args) -> None:
+    from openai import AsyncOpenAI
+    from app.llm_providers import LLMFactory
+
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    async def per_call_client():
+        client = AsyncOpenAI(api_key="sk-benchmark", base_url=base_url)
+        try:
+            await client.chat.completions.create(
+                model="gpt-4", messages=[{"role": "user", "content": "ping"}]
+            )
+        finally:
+            await client.close()
+
+    await LLMFactory.startup()
+    provider = LLMFactory.get_provider("openai")
+
+    async def shared_client():
+        await provider.execute(prompt="ping", model="gpt-4")
+
+    for label, call in (("before", per_call_client), ("after", shared_client)):
+        start = time.perf_counter()
+        latencies = await run_load(call, args.requests, args.concurrency)
+        report(label, latencies, time.perf_counter() - start)
+
+    await LLMFactory.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latence simulée du LLM (secondes)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    start_mock_server(args.port, args.latency)
+    asyncio.run(main(args))
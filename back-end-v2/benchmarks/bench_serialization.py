@@ -0,0 +1,117 @@
+"""
+Benchmark : sérialisation des réponses de liste (temps par 1000 lignes)
+
+Construit des lignes ORM en mémoire (historique d'exécution avec sorties de
+~2 Ko, prompts experts du catalogue) et compare :
+- pydantic + json : objets de réponse Pydantic construits depuis les lignes,
+  puis jsonable_encoder + json.dumps (chemin par défaut de FastAPI) ou
+  model_dump_json ligne à ligne (ancien encodage du catalogue) ;
+- orjson direct : dictionnaires lus sur les lignes puis orjson (app.serialization).
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_serialization --rows 1000 --repeat 20
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+
+def median_ms(func, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def history_rows(models, count: int) -> list:
+    now = datetime.utcnow()
+    return [
+        models.PromptExecutionHistory(
+            id=index,
+            prompt_id=index % 50,
+            user_id=1,
+            variables={"text": f"variable {index}", "language": "fr"},
+            output=("Analyse détaillée de la demande. " * 60)[:2000],
+            llm_provider="openai",
+            llm_model="gpt-4",
+            tokens_used=850,
+            cost=0.0123,
+            execution_time=1.84,
+            status="success",
+            error_message=None,
+            cached=False,
+            hedged=False,
+            created_at=now - timedelta(seconds=index)
+        )
+        for index in range(count)
+    ]
+
+
+def prompt_rows(models, count: int) -> list:
+    now = datetime.utcnow()
+    return [
+        models.ExpertPrompt(
+            id=index,
+            sub_specialty_id=index % 20,
+            title=f"Prompt expert {index}",
+            template="Analysez {document} en tenant compte de {contexte}. " * 10,
+            variables_schema={"type": "object", "properties": {"document": {"type": "string"}}},
+            expected_output="Rapport structuré",
+            example_context=None,
+            performance_metrics=None,
+            created_at=now,
+            updated_at=now
+        )
+        for index in range(count)
+    ]
+
+
+def main(args) -> None:
+    from app import models, schemas
+    from app.serialization import dumps, rows_to_dicts, response_fields, serialize_rows
+
+    scale = 1000 / args.rows
+    history = history_rows(models, args.rows)
+    prompts = prompt_rows(models, args.rows)
+    # Champs lus sur les lignes, output_truncated étant calculé par la route
+    history_fields = [field for field in response_fields(schemas.ExecutionHistoryResponse) if field != "output_truncated"]
+
+    def history_pydantic() -> bytes:
+        items = [schemas.ExecutionHistoryResponse.model_validate(row) for row in history]
+        return json.dumps(jsonable_encoder(items)).encode("utf-8")
+
+    def history_orjson() -> bytes:
+        return dumps([{**item, "output_truncated": False} for item in rows_to_dicts(history, history_fields)])
+
+    def catalog_pydantic() -> bytes:
+        return b"[" + b",".join(
+            schemas.ExpertPromptResponse.model_validate(row).model_dump_json().encode("utf-8") for row in prompts
+        ) + b"]"
+
+    def catalog_orjson() -> bytes:
+        return serialize_rows(schemas.ExpertPromptResponse, prompts)
+
+    for label, before, after in (
+        ("executions/history", history_pydantic, history_orjson),
+        ("expert-prompts", catalog_pydantic, catalog_orjson),
+    ):
+        before_ms = median_ms(before, args.repeat) * scale
+        after_ms = median_ms(after, args.repeat) * scale
+        print(
+            f"{label:>20}: pydantic+json={before_ms:8.2f}ms/1k  orjson={after_ms:7.2f}ms/1k  "
+            f"speedup={before_ms / after_ms:5.1f}x  ({len(after()) / 1024:.0f} KiB)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark : validation des variables avec et sans cache de schémas compilés
+
+Compare, pour des schémas de 5, 50 et 500 propriétés :
+- sans cache : Draft7Validator construit et propriétés parcourues à chaque appel
+- avec cache : validate_variables_against_schema avec une clé (prompt_id, updated_at)
+
+Usage (depuis back-end-v2/) :
+    python -m benchmarks.bench_validators --iterations 2000
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from jsonschema import Draft7Validator
+
+from app.validators import validate_variables_against_schema, validator_cache
+
+
+def build_schema(properties: int) -> dict:
+    schema = {"type": "object", "properties": {}, "required": []}
+    for index in range(properties):
+        name = f"var_{index}"
+        if index % 3 == 0:
+            schema["properties"][name] = {"type": "string", "default": f"value_{index}"}
+        elif index % 3 == 1:
+            schema["properties"][name] = {"type": "integer", "minimum": 0}
+            schema["required"].append(name)
+        else:
+            schema["properties"][name] = {"type": "string", "enum": ["a", "b", "c"]}
+            schema["required"].append(name)
+    return schema
+
+
+def build_variables(schema: dict) -> dict:
+    variables = {}
+    for name, prop in schema["properties"].items():
+        if prop["type"] == "integer":
+            variables[name] = 42
+        elif "enum" in prop:
+            variables[name] = "b"
+    return variables
+
+
+def validate_uncached(variables: dict, schema: dict) -> dict:
+    """Comportement d'origine : compilation et parcours des défauts à chaque appel"""
+    validator = Draft7Validator(schema)
+    errors = list(validator.iter_errors(variables))
+    if errors:
+        raise ValueError(errors)
+    enriched = variables.copy()
+    for prop_name, prop_schema in schema.get("properties", {}).items():
+        if prop_name not in enriched and "default" in prop_schema:
+            enriched[prop_name] = prop_schema["default"]
+    return enriched
+
+
+def measure(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    updated_at = datetime.utcnow()
+    print(f"{'properties':>10}  {'uncached (µs)':>14}  {'cached (µs)':>12}  {'speedup':>8}")
+    for prompt_id, properties in enumerate((5, 50, 500), start=1):
+        schema = build_schema(properties)
+        variables = build_variables(schema)
+        validator_cache.clear()
+
+        uncached = measure(lambda: validate_uncached(variables, schema), args.iterations)
+        cached = measure(
+            lambda: validate_variables_against_schema(variables, schema, cache_key=(prompt_id, updated_at)),
+            args.iterations
+        )
+        print(f"{properties:>10}  {uncached:>14.1f}  {cached:>12.1f}  {uncached / cached:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
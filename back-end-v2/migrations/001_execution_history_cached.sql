@@ -0,0 +1,7 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 001
+-- Marquer les exécutions servies depuis le cache de réponses LLM
+-- ============================================================
+
+ALTER TABLE prompt_execution_history
+  ADD COLUMN IF NOT EXISTS cached BOOLEAN NOT NULL DEFAULT FALSE;
@@ -0,0 +1,7 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 002
+-- Indiquer si une requête couverte (hedging) a été lancée
+-- ============================================================
+
+ALTER TABLE prompt_execution_history
+  ADD COLUMN IF NOT EXISTS hedged BOOLEAN NOT NULL DEFAULT FALSE;
@@ -0,0 +1,15 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 003
+-- Index composites de la pagination par curseur de l'historique
+-- (filtres user_id, user_id + prompt_id, user_id + status ; tri created_at, id)
+-- ============================================================
+
+-- CONCURRENTLY : à exécuter hors transaction (psql sans --single-transaction)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execution_history_user_created
+  ON prompt_execution_history (user_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execution_history_user_prompt_created
+  ON prompt_execution_history (user_id, prompt_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execution_history_user_status_created
+  ON prompt_execution_history (user_id, status, created_at, id);
@@ -0,0 +1,45 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 004
+-- Recherche plein texte des prompts experts (tsvector + GIN)
+-- et recherche approchée sur le titre (pg_trgm)
+-- ============================================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE expert_prompts
+  ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+-- Titre (A) > spécialité et sous-spécialité (B) > résultat attendu (C) > template (D)
+CREATE OR REPLACE FUNCTION expert_prompts_search_update() RETURNS trigger AS $$
+DECLARE
+  specialty_names text;
+BEGIN
+  SELECT s.name || ' ' || ss.name INTO specialty_names
+  FROM sub_specialties ss
+  JOIN specialties s ON s.id = ss.specialty_id
+  WHERE ss.id = NEW.sub_specialty_id;
+
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', unaccent(coalesce(NEW.title, ''))), 'A') ||
+    setweight(to_tsvector('simple', unaccent(coalesce(specialty_names, ''))), 'B') ||
+    setweight(to_tsvector('simple', unaccent(coalesce(NEW.expected_output, ''))), 'C') ||
+    setweight(to_tsvector('simple', unaccent(coalesce(NEW.template, ''))), 'D');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS expert_prompts_search_update ON expert_prompts;
+CREATE TRIGGER expert_prompts_search_update
+  BEFORE INSERT OR UPDATE OF title, template, expected_output, sub_specialty_id
+  ON expert_prompts
+  FOR EACH ROW EXECUTE FUNCTION expert_prompts_search_update();
+
+-- Indexer les prompts existants
+UPDATE expert_prompts SET title = title WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_expert_prompts_search_vector
+  ON expert_prompts USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS ix_expert_prompts_title_trgm
+  ON expert_prompts USING GIN (title gin_trgm_ops);
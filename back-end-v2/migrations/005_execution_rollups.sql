@@ -0,0 +1,33 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 005
+-- Rollups horaires et journaliers de l'historique d'exécution
+-- (remplis ensuite par : python -m app.analytics, application arrêtée)
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS execution_rollups (
+  id SERIAL PRIMARY KEY,
+  granularity VARCHAR NOT NULL,
+  bucket_start TIMESTAMP NOT NULL,
+  user_id INTEGER NOT NULL REFERENCES users (id),
+  prompt_id INTEGER NOT NULL REFERENCES expert_prompts (id),
+  llm_provider VARCHAR NOT NULL,
+  llm_model VARCHAR NOT NULL,
+  executions INTEGER DEFAULT 0,
+  errors INTEGER DEFAULT 0,
+  cached INTEGER DEFAULT 0,
+  tokens_used INTEGER DEFAULT 0,
+  cost DOUBLE PRECISION DEFAULT 0.0,
+  execution_time DOUBLE PRECISION DEFAULT 0.0,
+  latency_sketch JSON NOT NULL,
+  CONSTRAINT _execution_rollup_key_uc
+    UNIQUE (granularity, bucket_start, user_id, prompt_id, llm_provider, llm_model)
+);
+
+CREATE INDEX IF NOT EXISTS ix_execution_rollups_id
+  ON execution_rollups (id);
+
+CREATE INDEX IF NOT EXISTS ix_execution_rollups_user_bucket
+  ON execution_rollups (user_id, granularity, bucket_start);
+
+CREATE INDEX IF NOT EXISTS ix_execution_rollups_bucket
+  ON execution_rollups (granularity, bucket_start);
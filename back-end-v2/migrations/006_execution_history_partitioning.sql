@@ -0,0 +1,64 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 006
+-- Partitionnement mensuel de prompt_execution_history sur created_at
+-- (l'application crée ensuite les partitions des mois à venir au démarrage,
+-- `python -m app.archive` archive les mois anciens)
+-- ============================================================
+
+-- À exécuter application arrêtée : la table est recopiée dans une transaction
+BEGIN;
+
+UPDATE prompt_execution_history SET created_at = now() WHERE created_at IS NULL;
+
+ALTER TABLE prompt_execution_history RENAME TO prompt_execution_history_unpartitioned;
+-- Conserver la séquence des identifiants (et sa position) pour la nouvelle table
+ALTER SEQUENCE prompt_execution_history_id_seq OWNED BY NONE;
+
+CREATE TABLE prompt_execution_history (
+  LIKE prompt_execution_history_unpartitioned INCLUDING DEFAULTS
+) PARTITION BY RANGE (created_at);
+
+-- La clé primaire d'une table partitionnée doit contenir la clé de partition
+ALTER TABLE prompt_execution_history
+  ADD PRIMARY KEY (id, created_at),
+  ADD FOREIGN KEY (prompt_id) REFERENCES expert_prompts (id),
+  ADD FOREIGN KEY (user_id) REFERENCES users (id);
+
+-- Une partition par mois, du premier mois de l'historique au mois suivant le mois courant
+DO $$
+DECLARE
+  month date := date_trunc('month', coalesce(
+    (SELECT min(created_at) FROM prompt_execution_history_unpartitioned), now()
+  ));
+BEGIN
+  WHILE month <= date_trunc('month', now()) + interval '1 month' LOOP
+    EXECUTE format(
+      'CREATE TABLE prompt_execution_history_y%sm%s PARTITION OF prompt_execution_history FOR VALUES FROM (%L) TO (%L)',
+      to_char(month, 'YYYY'), to_char(month, 'MM'), month, month + interval '1 month'
+    );
+    month := month + interval '1 month';
+  END LOOP;
+END $$;
+
+-- Filet de sécurité si l'application n'a pas créé la partition d'un mois
+CREATE TABLE prompt_execution_history_default PARTITION OF prompt_execution_history DEFAULT;
+
+INSERT INTO prompt_execution_history SELECT * FROM prompt_execution_history_unpartitioned;
+
+DROP TABLE prompt_execution_history_unpartitioned;
+ALTER SEQUENCE prompt_execution_history_id_seq OWNED BY prompt_execution_history.id;
+
+-- Index propagés à chaque partition (CONCURRENTLY n'est pas possible ici)
+CREATE INDEX ix_prompt_execution_history_id
+  ON prompt_execution_history (id);
+
+CREATE INDEX ix_execution_history_user_created
+  ON prompt_execution_history (user_id, created_at, id);
+
+CREATE INDEX ix_execution_history_user_prompt_created
+  ON prompt_execution_history (user_id, prompt_id, created_at, id);
+
+CREATE INDEX ix_execution_history_user_status_created
+  ON prompt_execution_history (user_id, status, created_at, id);
+
+COMMIT;
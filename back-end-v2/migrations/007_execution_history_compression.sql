@@ -0,0 +1,25 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 007
+-- Compression zstd des sorties et variables volumineuses de l'historique
+-- et dictionnaires de compression (python -m app.compression pour entraîner)
+-- ============================================================
+
+ALTER TABLE prompt_execution_history
+  ADD COLUMN IF NOT EXISTS output_compressed BOOLEAN DEFAULT false,
+  ADD COLUMN IF NOT EXISTS output_zstd BYTEA,
+  ADD COLUMN IF NOT EXISTS variables_zstd BYTEA;
+
+-- Variables NULL lorsqu'elles sont stockées dans variables_zstd
+ALTER TABLE prompt_execution_history ALTER COLUMN variables DROP NOT NULL;
+
+-- Valeurs déjà compressées : pas de seconde compression TOAST
+ALTER TABLE prompt_execution_history
+  ALTER COLUMN output_zstd SET STORAGE EXTERNAL,
+  ALTER COLUMN variables_zstd SET STORAGE EXTERNAL;
+
+CREATE TABLE IF NOT EXISTS compression_dictionaries (
+  dict_id BIGINT PRIMARY KEY,
+  data BYTEA NOT NULL,
+  samples INTEGER DEFAULT 0,
+  created_at TIMESTAMP DEFAULT now()
+);
@@ -0,0 +1,16 @@
+-- ============================================================
+-- PIVORI Studio Backend v2 - Migration 008
+-- Index trigrammes sur le titre sans accents : la recherche approchée
+-- compare immutable_unaccent(title), que l'index de la migration 004
+-- (sur title brut) ne couvre pas
+-- ============================================================
+
+-- unaccent() n'est que STABLE : une expression indexée exige une fonction IMMUTABLE
+CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text AS $$
+  SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+CREATE INDEX IF NOT EXISTS ix_expert_prompts_title_unaccent_trgm
+  ON expert_prompts USING GIN (immutable_unaccent(title) gin_trgm_ops);
+
+DROP INDEX IF EXISTS ix_expert_prompts_title_trgm;